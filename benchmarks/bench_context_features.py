@@ -0,0 +1,68 @@
+######################################################################
+#  CliNER - bench_context_features.py                                #
+#                                                                    #
+#  Purpose: Peak memory of pass-one feature extraction when the      #
+#               prev/next features are views vs. copied dicts        #
+######################################################################
+
+
+import os
+import sys
+import glob
+import time
+import resource
+import multiprocessing
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from features_dir.features import IOB_features_for_sentences
+
+
+
+def views(data):
+    return IOB_features_for_sentences(data)
+
+def copied(data):
+    # What every token used to hold: its own dict with the neighbours merged in
+    return [ (isProse, [ dict(f) for f in feats ])
+             for isProse,feats in IOB_features_for_sentences(data) ]
+
+
+
+def measure(func, data, queue):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    extracted = func(data)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    n = sum( [ sum( [ len(f) for f in feats ] ) for _,feats in extracted ] )
+    queue.put( (elapsed, peak - base, n) )
+
+
+
+def main():
+
+    pattern = sys.argv[1] if len(sys.argv) > 1 else \
+              os.path.join(os.getenv('CLINER_DIR'), 'examples/*.txt')
+    repeat  = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    data = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as f:
+            data += [ line.split() for line in f if line.split() ]
+    data = data * repeat
+
+    # Run each in a fresh process so peak memory is measured separately
+    for name,func in [('copied dicts', copied), ('context views', views)]:
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=measure, args=(func, data, queue))
+        p.start()
+        elapsed,peak,n = queue.get()
+        p.join()
+        print '%-14s %7.2f s   peak memory growth: %8d KB   (%d features)' % (name, elapsed, peak, n)
+
+
+
+if __name__ == '__main__':
+    main()
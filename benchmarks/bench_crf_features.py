@@ -0,0 +1,122 @@
+######################################################################
+#  CliNER - bench_crf_features.py                                    #
+#                                                                    #
+#  Purpose: Compare the old string round-trip (format_features ->    #
+#               pycrf_instances over per-token row objects) against  #
+#               building ItemSequences directly from the CSR arrays  #
+######################################################################
+
+
+import os
+import sys
+import time
+import random
+import resource
+import multiprocessing
+
+import numpy as np
+import scipy.sparse as sp
+import pycrfsuite
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from machine_learning import crf
+
+
+
+# Previous implementation (string path), kept here for comparison
+def format_features(rows, labels=None):
+    retVal = []
+    for i,line in enumerate(rows):
+        for j,features in enumerate(line):
+            inds  = features.nonzero()[1]
+            values = []
+            if labels:
+                values.append( str(labels[i][j]) )
+            for k in inds:
+                values.append( '%d=%d' %  (k, features[0,k]) )
+            retVal.append("\t".join(values).strip())
+        retVal.append('')
+    return retVal
+
+def pycrf_instances(fi, labeled):
+    xseq = []
+    yseq = []
+    begin = 1 if labeled else 0
+    for line in fi:
+        line = line.strip('\n')
+        if not line:
+            if labeled:
+                yield xseq, tuple(yseq)
+            else:
+                yield xseq
+            xseq = []
+            yseq = []
+            continue
+        fields = line.split('\t')
+        xseq.append(fields[begin:])
+        if labeled:
+            yseq.append(fields[0])
+
+
+
+def string_path(M, Y, offsets):
+    rows = list(M)
+    X = [ rows[i:j] for i, j in zip([0] + offsets, offsets) ]
+    for xseq, yseq in pycrf_instances(format_features(X, Y), labeled=True):
+        pycrfsuite.ItemSequence(xseq)
+
+def direct_path(M, Y, offsets):
+    for xseq, yseq in crf.item_sequences(M, offsets, Y):
+        pass
+
+
+
+def synthetic_corpus(n_sents, n_feats=200000, feats_per_tok=60, seed=0):
+    """ Random sentences of sparse token features, as pass one produces them """
+    rng = random.Random(seed)
+    lengths = [ rng.randint(3, 25) for _ in range(n_sents) ]
+    n_toks  = sum(lengths)
+    indptr  = np.arange(0, (n_toks+1)*feats_per_tok, feats_per_tok)
+    indices = np.array([ rng.randint(0, n_feats-1) for _ in range(n_toks*feats_per_tok) ])
+    data    = np.ones(n_toks*feats_per_tok)
+    M = sp.csr_matrix((data, indices, indptr), shape=(n_toks, n_feats))
+    M.sum_duplicates()
+
+    Y = [ [ rng.randint(0,2) for _ in range(n) ] for n in lengths ]
+    offsets = list(np.cumsum(lengths))
+    return M, Y, offsets
+
+
+
+def measure(func, M, Y, offsets, queue):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    func(M, Y, offsets)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put( (elapsed, peak - base) )
+
+
+
+def main():
+
+    n_sents = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    print 'building synthetic corpus of %d sentences' % n_sents
+    M, Y, offsets = synthetic_corpus(n_sents)
+
+    # Run each path in a fresh process so peak memory is measured separately
+    for name,func in [('string path', string_path), ('direct path', direct_path)]:
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=measure, args=(func, M, Y, offsets, queue))
+        p.start()
+        elapsed,peak = queue.get()
+        p.join()
+        print '%s: %7.2f s   peak memory growth: %8d KB' % (name, elapsed, peak)
+
+
+
+if __name__ == '__main__':
+    main()
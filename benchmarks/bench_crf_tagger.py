@@ -0,0 +1,74 @@
+######################################################################
+#  CliNER - bench_crf_tagger.py                                      #
+#                                                                    #
+#  Purpose: Compare per-note pass one CRF latency when a Tagger is   #
+#               re-materialized per call vs. kept open by the Model  #
+######################################################################
+
+
+import os
+import sys
+import time
+import random
+
+import numpy as np
+import scipy.sparse as sp
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from machine_learning import crf
+from model import Model
+
+
+
+def synthetic_sentences(n_sents, n_feats=50000, feats_per_tok=10, seed=0):
+    """ Random sparse binary token features (one CSR row per token), with labels """
+    rng = random.Random(seed)
+    Y = [ [ rng.randint(0,2) for _ in range(rng.randint(3, 25)) ] for _ in range(n_sents) ]
+    n_toks  = sum(len(y) for y in Y)
+    indptr  = np.arange(0, (n_toks+1)*feats_per_tok, feats_per_tok)
+    indices = np.array([ rng.randint(0, n_feats-1) for _ in range(n_toks*feats_per_tok) ])
+    X = sp.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n_toks, n_feats))
+    X.sum_duplicates()
+    offsets = list(np.cumsum([ len(y) for y in Y ]))
+    return X, Y, offsets
+
+
+
+def main():
+
+    n_notes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    print 'training synthetic CRF model'
+    X, Y, _ = synthetic_sentences(1000)
+    clf = crf.train(X, Y, False)
+
+    # One "note" is ~60 sentences, tagged twice (prose and nonprose)
+    notes = [ synthetic_sentences(30, seed=i+1) for i in range(n_notes) ]
+
+    # Before: re-materialize the Tagger on every call
+    start = time.time()
+    for X,_,offsets in notes:
+        crf.predict(clf, X, offsets)
+        crf.predict(clf, X, offsets)
+    before = (time.time() - start) / n_notes
+
+    # After: one long-lived Tagger per classifier, owned by the Model
+    model = Model()
+    model.first_prose_clf    = clf
+    model.first_nonprose_clf = clf
+    start = time.time()
+    for X,_,offsets in notes:
+        crf.predict(model.first_tagger('prose'   , model.first_prose_clf   ), X, offsets)
+        crf.predict(model.first_tagger('nonprose', model.first_nonprose_clf), X, offsets)
+    after = (time.time() - start) / n_notes
+
+    print 'model size:            %8d bytes' % len(clf)
+    print 'per-note latency before: %8.2f ms' % (before * 1000)
+    print 'per-note latency after:  %8.2f ms' % (after  * 1000)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+######################################################################
+#  CliNER - bench_flatten.py                                         #
+#                                                                    #
+#  Purpose: Show how per-note training data assembly scales with    #
+#               the number of notes: reduce(concat, ...) vs flatten  #
+######################################################################
+
+
+import os
+import sys
+import time
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from model import flatten
+
+
+
+# Previous implementation, kept here for comparison
+def concat(a,b):
+    return a+b
+
+
+
+def synthetic_notes(n_notes, sents_per_note=60):
+    """ Per-note lists of tokenized sentences (shared sentence objects) """
+    sent = ['the', 'patient', 'was', 'seen', 'today', '.']
+    return [ [ sent for _ in range(sents_per_note) ] for _ in range(n_notes) ]
+
+
+
+def timed(func, arg):
+    start = time.time()
+    func(arg)
+    return time.time() - start
+
+
+
+def main():
+
+    # reduce(concat) is quadratic; stop timing it past this many notes
+    reduce_limit = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    print '%8s  %14s  %14s' % ('notes', 'reduce(concat)', 'flatten')
+    for n_notes in [100, 1000, 5000, 10000, 20000, 50000]:
+        notes = synthetic_notes(n_notes)
+
+        new = timed(flatten, notes)
+        if n_notes <= reduce_limit:
+            old = '%12.3f s' % timed(lambda l: reduce(concat, l), notes)
+        else:
+            old = 'skipped'
+
+        print '%8d  %14s  %12.3f s' % (n_notes, old, new)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+######################################################################
+#  CliNER - bench_import_time.py                                     #
+#                                                                    #
+#  Purpose: Time how long CliNER's modules and commands take to      #
+#               start, each in a fresh interpreter                   #
+######################################################################
+
+
+import os
+import sys
+import time
+import subprocess
+
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+
+
+# (label, arguments to python), all run from cliner/
+targets = [ ('import notes.note'        , ['-c', 'import notes.note'                ]),
+            ('import word_features'     , ['-c', 'import features_dir.word_features']),
+            ('import sentence_features' , ['-c', 'import features_dir.sentence_features']),
+            ('import interface_umls'    , ['-c', 'import sys; sys.path.append("features_dir/umls_dir"); import interface_umls']),
+            ('import model'             , ['-c', 'import model'                     ]),
+            ('format.py --help'         , ['format.py'  , '--help'                  ]),
+            ('evaluate.py --help'       , ['evaluate.py', '--help'                  ]),
+            ('cli.py --help'            , ['cli.py'     , '--help'                  ]) ]
+
+
+
+def startup_time(args, repeat):
+
+    # Best of several runs (the first one also warms the OS file cache)
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.call([sys.executable] + args, cwd=home,
+                            stdout=devnull, stderr=devnull)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+
+def main():
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    baseline = startup_time(['-c', 'pass'], repeat)
+    print '%-26s %6.3f s' % ('python -c pass', baseline)
+
+    for label,args in targets:
+        print '%-26s %6.3f s' % (label, startup_time(args, repeat))
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+######################################################################
+#  CliNER - bench_model_load.py                                      #
+#                                                                    #
+#  Purpose: Compare the legacy pickled model with the model          #
+#               directory format on size and cold load time          #
+######################################################################
+
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import cPickle as pickle
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from model import Model
+from bench_vectorizer import pairs, read_notes
+
+
+# Run in a fresh interpreter, so nothing is already imported or cached
+LOAD_SCRIPT = '''
+import sys, time
+sys.path.append(%r)
+from model import Model
+start = time.time()
+model = Model.load(sys.argv[1])
+print time.time() - start
+'''
+
+
+
+def cold_load(model_path, repeat):
+    times = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', LOAD_SCRIPT % home,
+                                       model_path])
+        times.append( float(out.split()[-1]) )
+    return min(times)
+
+
+
+def size_of(path):
+    if os.path.isdir(path):
+        return sum( [ os.path.getsize(f) for f in glob.glob(path + '/*') ] )
+    return os.path.getsize(path)
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", dest="txt",  help="Training text files")
+    parser.add_argument("-c", dest="con",  help="Training concept files")
+    parser.add_argument("-f", dest="format", default='i2b2')
+    parser.add_argument("-n", dest="repeat", type=int, default=3)
+    parser.add_argument("-no-crf", dest="nocrf", action="store_true")
+    args = parser.parse_args()
+
+    model = Model(is_crf=not args.nocrf)
+    model.train(read_notes(pairs(args.txt, args.con), args.format))
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        pickled = os.path.join(tmp_dir, 'legacy.model')
+        with open(pickled, 'wb') as m_file:
+            pickle.dump(model, m_file)
+
+        directory = os.path.join(tmp_dir, 'compact.model')
+        model.save(directory)
+
+        # Report on stderr (stdout carries training progress messages)
+        print >>sys.stderr, '%-22s %12s %10s' % ('format', 'size', 'load')
+        for name,path in [('pickle (protocol 0)', pickled), ('model directory', directory)]:
+            size = size_of(path)
+            load = cold_load(path, args.repeat)
+            print >>sys.stderr, '%-22s %10.1fMB %9.3fs' % (name, size / 2.0**20, load)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+######################################################################
+#  CliNER - bench_pos_tagging.py                                     #
+#                                                                    #
+#  Purpose: Time POS tagging sentence-by-sentence against batched,   #
+#               memoized tagging (SentenceFeatures.pos_cache)        #
+######################################################################
+
+
+import os
+import sys
+import glob
+import time
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from features_dir import resources
+from features_dir.utilities import is_prose_sentence
+from features_dir.sentence_features import nltk_tagger, POSTagCache
+
+
+
+def read_lines(pattern):
+    lines = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as f:
+            lines += [ line.split() for line in f if line.split() ]
+    return lines
+
+
+
+def main():
+
+    pattern = sys.argv[1] if len(sys.argv) > 1 else \
+              os.path.join(os.getenv('CLINER_DIR'), 'examples/*.txt')
+    repeat  = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    # Stand-in for a batch of notes
+    data = [ s for s in read_lines(pattern) if is_prose_sentence(s) ] * repeat
+
+    # Don't time loading the tagger
+    resources.preload(['pos_tagger'])
+
+    start = time.time()
+    expected = [ tuple([ pos for _,pos in nltk_tagger.tag(s) ]) for s in data ]
+    print '%-12s %6d sentences %8.2f s' % ('per sentence', len(data), time.time() - start)
+
+    cache = POSTagCache(nltk_tagger)
+    start = time.time()
+    tags = cache.tag_sents(data)
+    print '%-12s %6d sentences %8.2f s   hit rate %.3f' % ('batched', len(data), time.time() - start, cache.hit_rate())
+
+    assert tags == expected
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+######################################################################
+#  CliNER - bench_stitching.py                                       #
+#                                                                    #
+#  Purpose: Time reassembly of predicted labels for one long note:   #
+#               list.pop(0) stitching vs. index-based stitching      #
+######################################################################
+
+
+import os
+import sys
+import time
+import random
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from features_dir.utilities import is_prose_sentence
+from notes.note import reverse_IOB_labels, reverse_concept_labels
+from model import translate_IOB_labels, stitch_lines, concept_classifications
+
+
+
+# Previous implementations, kept here for comparison
+def old_first_stitch(data, plist, nlist):
+    prose_iobs    = []
+    nonprose_iobs = []
+    iobs          = []
+    trans = lambda l: reverse_IOB_labels[int(l)]
+    for sentence in data:
+        if is_prose_sentence(sentence):
+            prose_iobs.append( plist.pop(0) )
+            prose_iobs[-1] = map(trans, prose_iobs[-1])
+            iobs.append( prose_iobs[-1] )
+        else:
+            nonprose_iobs.append( nlist.pop(0) )
+            nonprose_iobs[-1] = map(trans, nonprose_iobs[-1])
+            iobs.append( nonprose_iobs[-1] )
+    return iobs
+
+def old_second_stitch(data, inds_list, out):
+    o = list(out)
+    classifications = []
+    for lineno,inds in enumerate(inds_list):
+        if not inds: continue
+        for ind in inds:
+            concept = reverse_concept_labels[o.pop(0)]
+            start = 0
+            for i in range(ind):
+                start += len( data[lineno][i].split() )
+            length = len(data[lineno][ind].split())
+            classifications.append( (concept,lineno+1,start,start+length-1) )
+    return classifications
+
+
+
+def synthetic_note(n_lines, seed=0):
+    """ A long note: tokenized lines, their chunks, and fake predictions """
+    rng = random.Random(seed)
+    words = ['the', 'patient', 'denies', 'chest', 'pain', 'Date', ':', '10', 'mg']
+    data = []
+    for _ in range(n_lines):
+        line = [ rng.choice(words) for _ in range(rng.randint(3, 40)) ]
+        line.append( rng.choice(['.', ':', 'daily']) )
+        data.append(line)
+
+    prose = [ is_prose_sentence(line) for line in data ]
+    plist = [ [ rng.randint(0,2) for w in line ] for line,p in zip(data,prose) if     p ]
+    nlist = [ [ rng.randint(0,2) for w in line ] for line,p in zip(data,prose) if not p ]
+    plinenos = [ i for i,p in enumerate(prose) if     p ]
+    nlinenos = [ i for i,p in enumerate(prose) if not p ]
+
+    chunks = [ [ ' '.join(line[i:i+2]) for i in range(0, len(line), 2) ] for line in data ]
+    inds_list = [ range(0, len(c), 2) for c in chunks ]
+    out = [ rng.randint(0,3) for inds in inds_list for _ in inds ]
+
+    return data, plist, nlist, plinenos, nlinenos, chunks, inds_list, out
+
+
+
+def timed(func, *args):
+    start = time.time()
+    retVal = func(*args)
+    return time.time() - start, retVal
+
+
+
+def main():
+
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    data, plist, nlist, plinenos, nlinenos, chunks, inds_list, out = synthetic_note(n_lines)
+
+
+    # Pass one
+    old_t,old = timed(old_first_stitch, data, list(plist), list(nlist))
+    new_t,new = timed(lambda: stitch_lines(len(data),
+                                [ (plinenos, translate_IOB_labels(plist)),
+                                  (nlinenos, translate_IOB_labels(nlist)) ]))
+    assert old == new
+    print 'pass one stitching (%d lines):  %.4f s -> %.4f s' % (n_lines, old_t, new_t)
+
+
+    # Pass two
+    old_t,old = timed(old_second_stitch, chunks, inds_list, out)
+    new_t,new = timed(concept_classifications, chunks, inds_list, out)
+    assert old == new
+    print 'pass two stitching (%d concepts): %.4f s -> %.4f s' % (len(out), old_t, new_t)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+######################################################################
+#  CliNER - bench_token_cache.py                                     #
+#                                                                    #
+#  Purpose: Time feature extraction with and without the per-token   #
+#               feature cache in WordFeatures                        #
+######################################################################
+
+
+import os
+import sys
+import glob
+import time
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from features_dir.features import IOB_features_for_sentences
+from features_dir.word_features import WordFeatures
+
+
+
+def read_lines(pattern):
+    lines = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as f:
+            lines += [ line.split() for line in f if line.split() ]
+    return lines
+
+
+
+def main():
+
+    pattern = sys.argv[1] if len(sys.argv) > 1 else \
+              os.path.join(os.getenv('CLINER_DIR'), 'examples/*.txt')
+    repeat  = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    # Stand-in for a batch of notes
+    data = read_lines(pattern) * repeat
+    n_tokens = sum( [ len(line) for line in data ] )
+
+    cache = WordFeatures.cache
+    for name,maxsize in [('no cache', 0), ('LRU cache', cache.maxsize)]:
+        cache.clear()
+        cache.maxsize = maxsize
+
+        start = time.time()
+        IOB_features_for_sentences(data)
+        elapsed = time.time() - start
+
+        print '%-10s %8d tokens %8.2f s   hit rate %.3f' % (name, n_tokens, elapsed, cache.hit_rate())
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+######################################################################
+#  CliNER - bench_umls_candidates.py                                 #
+#                                                                    #
+#  Purpose: Count (and time) the UMLS candidate spans of every       #
+#               n-gram against walking the concept trie              #
+######################################################################
+
+
+import os
+import sys
+import glob
+import time
+
+import marisa_trie
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner', 'features_dir', 'umls_dir' )
+if home not in sys.path: sys.path.append(home)
+
+import interpret_umls
+from interface_umls import resources
+
+
+
+def read_lines(pattern):
+    lines = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as f:
+            lines += [ line.split() for line in f if line.split() ]
+    return lines
+
+
+
+def main():
+
+    pattern = sys.argv[1] if len(sys.argv) > 1 else \
+              os.path.join(os.getenv('CLINER_DIR'), 'examples/*.txt')
+
+    data = read_lines(pattern)
+
+    # The real concept trie if it has been built, otherwise a stand-in
+    #   made of some of the notes' own words and bigrams
+    path = os.path.join(os.getenv('CLINER_DIR'), 'umls_tables/umls-concept.trie')
+    if os.path.isfile(path):
+        trie = marisa_trie.Trie().load(path)
+    else:
+        words = set()
+        for s in data:
+            for i in range(len(s)):
+                for n in (1,2):
+                    w = ' '.join(s[i:i+n])
+                    if hash(w) % 10 == 0:
+                        words.add( w.decode('ascii', 'ignore') )
+        trie = marisa_trie.Trie(words)
+    resources.loaded['umls_trie'] = trie
+
+    WINDOW_SIZE = 7
+
+    start = time.time()
+    every = 0
+    found = 0
+    for s in data:
+        for i in range(len(s)):
+            for j in range(i, min(i+WINDOW_SIZE, len(s))):
+                every += 1
+                if unicode(' '.join(s[i:j+1]), 'ascii', 'ignore') in trie:
+                    found += 1
+    print '%-12s %8d candidates %8.2f s' % ('all n-grams', every, time.time() - start)
+
+    start = time.time()
+    spans = sum( len(interpret_umls.concept_spans(s, WINDOW_SIZE)) for s in data )
+    print '%-12s %8d candidates %8.2f s' % ('trie walk', spans, time.time() - start)
+
+    print 'n-grams that are concepts:', found
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+######################################################################
+#  CliNER - bench_vectorizer.py                                      #
+#                                                                    #
+#  Purpose: Compare DictVectorizer and feature hashing models on     #
+#               size, load time and exact-span F1                    #
+######################################################################
+
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+
+home = os.path.join( os.getenv('CLINER_DIR'), 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+import helper
+from model import Model
+from notes.note import Note
+from evaluate import getConceptSpans, evaluate, generateResultsForExactSpans
+
+
+
+def read_notes(pairs, format):
+    notes = []
+    for txt,con in pairs:
+        note = Note(format)
+        note.read(txt, con)
+        notes.append(note)
+    return notes
+
+
+
+def exact_f1(model, test_pairs, format, tmp_dir):
+
+    tp = fn = fp = 0
+    for txt,gold in test_pairs:
+
+        # Predict, then read the predictions back like evaluate.py does
+        note = Note(format)
+        note.read(txt)
+        labels = model.predict(note)
+
+        pred = os.path.join(tmp_dir, 'pred.' + note.getExtension())
+        with open(pred, 'w') as f:
+            print >>f, note.write(labels)
+
+        cnote = Note(format)
+        rnote = Note(format)
+        cnote.read(txt, pred)
+        rnote.read(txt, gold)
+
+        referenceSpans = getConceptSpans(rnote.getIOBLabels(), rnote.conlist())
+        predictedSpans = getConceptSpans(cnote.getIOBLabels(), cnote.conlist())
+        results = evaluate(referenceSpans, predictedSpans, exactMatch=True)
+
+        tp += results["True Positives"]
+        fn += results["False Negatives"]
+        fp += results["False Positives"]
+
+    return generateResultsForExactSpans(tp, fn, fp)["F Score"]
+
+
+
+def pairs(txt_glob, con_glob):
+    txts = helper.map_files(glob.glob(txt_glob))
+    cons = helper.map_files(glob.glob(con_glob))
+    return [ (txts[k],cons[k]) for k in sorted(txts) if k in cons ]
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", dest="txt",  help="Training text files")
+    parser.add_argument("-c", dest="con",  help="Training concept files")
+    parser.add_argument("-T", dest="test_txt", help="Held-out text files")
+    parser.add_argument("-C", dest="test_con", help="Held-out gold concept files")
+    parser.add_argument("-f", dest="format", default='i2b2')
+    parser.add_argument("-hash", dest="hash_dim", type=int, default=2**20)
+    args = parser.parse_args()
+
+    train_pairs = pairs(args.txt, args.con)
+    test_pairs  = pairs(args.test_txt, args.test_con)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        # Report on stderr (stdout carries per-note progress messages)
+        print >>sys.stderr, '%-22s %12s %10s %8s' % ('vectorizer', 'model size', 'load', 'F1')
+        for name,hash_dim in [('DictVectorizer', None), ('hashing (%d)' % args.hash_dim, args.hash_dim)]:
+
+            # Train and save the same way train.py does
+            model = Model(hash_dim=hash_dim)
+            model.train(read_notes(train_pairs, args.format))
+            model_path = os.path.join(tmp_dir, 'bench.model')
+            model.save(model_path)
+
+            size = sum( [ os.path.getsize(f) for f in glob.glob(model_path + '/*') ] )
+
+            start = time.time()
+            model = Model.load(model_path)
+            load = time.time() - start
+
+            f1 = exact_f1(model, test_pairs, args.format, tmp_dir)
+
+            print >>sys.stderr, '%-22s %10.1fMB %9.2fs %8.2f' % (name, size / 2.0**20, load, f1)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+
+if __name__ == '__main__':
+    main()
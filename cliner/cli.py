@@ -39,8 +39,13 @@ supported_formats_help = "Data format ( " + ' | '.join(Note.supportedFormats())
               default=False)
 @click.option('--crf/--no-crf'  , help='Flag that enables crfsuite'   ,
               default=True)
+@click.option('--jobs'          , help='Feature extraction processes.',
+              type=int, default=1)
+@click.option('--hash-dim'      , help='Feature hashing dimensions.'  ,
+              type=int, default=None)
+@click.option('--features'      , help='Directory to reuse features from.')
 @click.argument('input')
-def train(annotations, model, format, grid, crf, input):
+def train(annotations, model, format, grid, crf, jobs, hash_dim, features, input):
 
     # training data needs concept file annotations
     if not annotations:
@@ -70,6 +75,12 @@ def train(annotations, model, format, grid, crf, input):
         cmd += ['-g']
     if not crf:
         cmd += ['-no-crf']
+    if jobs > 1:
+        cmd += ['-j', str(jobs)]
+    if hash_dim:
+        cmd += ['-hash', str(hash_dim)]
+    if features:
+        cmd += ['-features', features]
 
     # Execute train.py
     subprocess.call(cmd)
@@ -82,8 +93,14 @@ def train(annotations, model, format, grid, crf, input):
 @click.option('--out'   , help='The directory to write the output')
 @click.option('--model' , help='Model used to predict on files'   )
 @click.option('--format', help=supported_formats_help             )
+@click.option('--jobs'  , help='Feature extraction processes.'    ,
+              type=int, default=1)
+@click.option('--processes', help='Files predicted in parallel.'  ,
+              type=int, default=1)
+@click.option('--batch-size', help='Notes classified together.'   ,
+              type=int, default=1)
 @click.argument('input')
-def predict(model, out, format, input):
+def predict(model, out, format, jobs, processes, batch_size, input):
 
     # Base directory
     BASE_DIR = os.environ.get('CLINER_DIR')
@@ -103,6 +120,12 @@ def predict(model, out, format, input):
         cmd += ['-m',  model]
     if format:
         cmd += ['-f', format]
+    if jobs > 1:
+        cmd += ['-j', str(jobs)]
+    if processes > 1:
+        cmd += ['-p', str(processes)]
+    if batch_size > 1:
+        cmd += ['-b', str(batch_size)]
 
     # Execute train.py
     subprocess.call(cmd)
@@ -0,0 +1,178 @@
+######################################################################
+#  CliNER - feature_keys.py                                          #
+#                                                                    #
+#  Purpose: Intern feature keys (e.g. ('word','pain')) as integers,  #
+#               so extractors and vectorizers pass small ints around #
+######################################################################
+
+
+import os
+
+
+
+class FeatureVocabulary:
+
+    """
+    Process-wide table of feature keys <-> integer ids.
+
+    Ids only mean something inside one process (and its forked children,
+    for the keys that existed at the fork). Anything that is saved keeps
+    the keys themselves; feature dictionaries coming back from worker
+    processes are translated with remap().
+
+    >>> v = FeatureVocabulary()
+    >>> v.id('word', 'pain') == v.intern( ('word','pain') )
+    True
+    >>> v.keys[ v.context('prev', v.id('word','pain')) ]
+    ('prev_word', 'pain')
+    """
+
+    def __init__(self):
+        self.ids  = {}      # key -> id
+        self.keys = []      # id  -> key
+
+        # Caches over ids (cheaper than building and hashing tuples)
+        self.names    = {}  # name -> {value -> id}
+        self.contexts = {}  # tag  -> {id -> id of the tagged key}
+
+        # Worker bookkeeping (see new_keys)
+        self.reported = 0
+
+        # Called with n whenever ids from n on are forgotten (see truncate)
+        self.listeners = []
+
+
+    def __len__(self):
+        return len(self.keys)
+
+
+    def __getstate__(self):
+        # Caches are rebuilt on demand
+        return { 'ids':self.ids, 'keys':self.keys, 'names':{}, 'contexts':{},
+                 'reported':self.reported, 'listeners':[] }
+
+
+    def intern(self, key):
+        i = self.ids.get(key)
+        if i is None:
+            i = len(self.keys)
+            self.ids[key] = i
+            self.keys.append(key)
+        return i
+
+
+    def id(self, name, value):
+
+        # Same as intern( (name,value) ), without building the tuple on a hit
+        values = self.names.get(name)
+        if values is None:
+            values = self.names[name] = {}
+        i = values.get(value)
+        if i is None:
+            i = values[value] = self.intern( (name,value) )
+        return i
+
+
+    def context(self, tag, i):
+
+        # Id of ('<tag>_<name>', value), given the id of (name, value)
+        tagged = self.contexts.get(tag)
+        if tagged is None:
+            tagged = self.contexts[tag] = {}
+        c = tagged.get(i)
+        if c is None:
+            name,value = self.keys[i]
+            c = tagged[i] = self.intern( (tag + '_' + name, value) )
+        return c
+
+
+    def on_truncate(self, forget):
+        # forget(n) drops whatever its owner keeps for ids n and up
+        self.listeners.append(forget)
+
+
+    def truncate(self, n):
+
+        """
+        FeatureVocabulary::truncate()
+
+        Purpose: Forget every key from id n on (ex. the unseen features that
+                 pile up while predicting), so the vocabulary stays bounded
+
+        @param n. Number of keys to keep
+        @return   None
+
+        >>> v = FeatureVocabulary()
+        >>> a = v.id('word','a'); b = v.context('prev', v.id('word','b'))
+        >>> v.truncate(1)
+        >>> v.keys, v.id('word','b'), v.context('prev', 1)
+        ([('word', 'a'), ('word', 'b'), ('prev_word', 'b')], 1, 2)
+        """
+
+        if n >= len(self.keys):
+            return
+
+        for key in self.keys[n:]:
+            del self.ids[key]
+        del self.keys[n:]
+
+        for values in self.names.values():
+            for value,i in values.items():
+                if i >= n:
+                    del values[value]
+        for tagged in self.contexts.values():
+            for i,c in tagged.items():
+                if i >= n or c >= n:
+                    del tagged[i]
+
+        self.reported = min(self.reported, n)
+        for forget in self.listeners:
+            forget(n)
+
+
+    def intern_dict(self, features):
+        intern = self.intern
+        return dict( [ (intern(k),v) for k,v in features.iteritems() ] )
+
+
+    def new_keys(self):
+
+        """
+        FeatureVocabulary::new_keys()
+
+        Purpose: Keys added since the last call (for a worker to send back)
+
+        @return  A tuple: (pid, id of the first new key, list of new keys)
+        """
+
+        start = self.reported
+        self.reported = len(self.keys)
+        return os.getpid(), start, self.keys[start:]
+
+
+    def translation(self, tables, (pid, start, keys)):
+
+        """
+        FeatureVocabulary::translation()
+
+        Purpose: Extend a worker's id -> id table with its newly reported keys
+
+        @param tables. A dictionary of pid -> (worker id -> local id) tables
+        @return        The table for that worker
+        """
+
+        table = tables.setdefault(pid, {})
+        for k,key in enumerate(keys):
+            table[start + k] = self.intern(key)
+        return table
+
+
+    def remap(self, features, table):
+        # Ids not in the table were shared with the worker when it forked
+        get = table.get
+        return dict( [ (get(i,i),v) for i,v in features.iteritems() ] )
+
+
+
+# The vocabulary for this process
+vocabulary = FeatureVocabulary()
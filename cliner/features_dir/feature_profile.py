@@ -0,0 +1,106 @@
+######################################################################
+#  CliNER - feature_profile.py                                       #
+#                                                                    #
+#  Purpose: Measure the time each feature takes to extract, and how  #
+#               many feature values it produces                      #
+######################################################################
+
+
+import time
+
+
+
+class FeatureProfile:
+
+    """
+    Running totals of (calls, seconds, feature values) for each feature.
+
+    >>> p = FeatureProfile()
+    >>> p.add( ('IOB_prose_word','word'), 0.5, 1 )
+    >>> p.add( ('IOB_prose_word','word'), 0.25, 1 )
+    >>> p.totals[ ('IOB_prose_word','word') ]
+    [2, 0.75, 2]
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+
+    def add(self, feature, seconds, count):
+        totals = self.totals.get(feature)
+        if totals is None:
+            totals = self.totals[feature] = [0, 0.0, 0]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += count
+
+
+    def merge(self, totals):
+        for feature,(calls,seconds,count) in totals.items():
+            mine = self.totals.setdefault(feature, [0, 0.0, 0])
+            mine[0] += calls
+            mine[1] += seconds
+            mine[2] += count
+
+
+    def report(self):
+
+        """
+        FeatureProfile::report()
+
+        @return  A table (string), slowest feature first
+        """
+
+        lines = [ '%-24s %-18s %10s %10s %12s %10s' % ('group', 'feature', 'calls',
+                                                     'seconds', 'values', 'us/call') ]
+        ranked = sorted(self.totals.items(), key=lambda item: -item[1][1])
+        for (group,name),(calls,seconds,count) in ranked:
+            lines.append( '%-24s %-18s %10d %10.3f %12d %10.1f'
+                          % (group, name, calls, seconds, count, 1e6*seconds/calls) )
+        return '\n'.join(lines)
+
+
+
+# Set to a FeatureProfile to measure features built from then on
+profile = None
+
+
+
+def timed(group, name, func, size=len):
+
+    """
+    timed()
+
+    Purpose: Wrap a feature function (func(x, features)) to be profiled
+
+    @param group. The feature group (ex. 'IOB_prose_word')
+    @param name.  The feature name  (ex. 'word')
+    @param func.  A function that adds its features to its second argument
+    @param size.  Counts the feature values in that second argument
+    @return       func itself when not profiling, otherwise a timed wrapper
+
+    Word-level features are cached per token, so their calls (and time)
+    are only those of tokens not already in the cache.
+    """
+
+    if profile is None:
+        return func
+
+    totals  = profile
+    feature = (group, name)
+    def wrapper(x, features):
+        before = size(features)
+        start  = time.time()
+        func(x, features)
+        totals.add(feature, time.time() - start, size(features) - before)
+    return wrapper
+
+
+
+def collect():
+    # Totals since the last call (for a worker process to send back)
+    if profile is None:
+        return None
+    totals = profile.totals
+    profile.totals = {}
+    return totals
@@ -0,0 +1,238 @@
+######################################################################
+#  CliNER - feature_store.py                                         #
+#                                                                    #
+#  Purpose: On-disk store of extracted features (one entry per note) #
+#               so repeated training runs skip unchanged notes       #
+######################################################################
+
+
+import os
+import glob
+import hashlib
+import cPickle as pickle
+from itertools import chain
+
+from read_config import enabled_modules, enabled_features
+from feature_keys import vocabulary
+from sentence_features import ContextFeatures
+from features import IOB_features_for_sentences, concept_features_for_sentences
+
+
+# Bump whenever the layout of a stored entry changes
+FORMAT_VERSION = 1
+
+
+
+def config_fingerprint(features):
+
+    """
+    config_fingerprint()
+
+    Purpose: Hash everything besides the note that decides its features
+
+    @param features. Which features are used (see read_config.enabled_features)
+    @return          A hex string
+
+    Covers config.txt (which modules are enabled), the feature set and the
+    source of every feature extraction module, so changing any of them
+    invalidates the whole store.
+
+    >>> config_fingerprint(enabled_features()) == config_fingerprint(enabled_features())
+    True
+    """
+
+    h = hashlib.sha1()
+    h.update('%d\n' % FORMAT_VERSION)
+    h.update(repr(sorted(enabled_modules().items())))
+    h.update(repr(sorted( [ (str(g),map(str,names)) for g,names in features.items() ] )))
+
+    features_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = glob.glob(os.path.join(features_dir,'*.py')) + \
+              glob.glob(os.path.join(features_dir,'*','*.py'))
+    for path in sorted(sources):
+        with open(path, 'rb') as f:
+            h.update(os.path.relpath(path, features_dir))
+            h.update(f.read())
+
+    return h.hexdigest()
+
+
+
+class FeatureStore:
+
+    """
+    Extracted features of whole notes, in a directory of files named by a
+    hash of the note (its sentences, chunks and concept indices, so both
+    the text and the annotations) and of config_fingerprint().
+
+    Entries are written to a temporary file and renamed into place, so any
+    number of processes can read (and fill) one store at the same time.
+    Feature keys are stored, not interned ids, since ids only mean
+    something inside one process.
+    """
+
+    def __init__(self, directory, features=None):
+        if features is None:
+            features = enabled_features()
+
+        self.directory = directory
+        self.enabled   = features
+        self.config    = config_fingerprint(features)
+        self.hits      = 0
+        self.misses    = 0
+
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process made it first
+                if not os.path.isdir(directory):
+                    raise
+
+
+    def key(self, note):
+        h = hashlib.sha1(self.config)
+        h.update(repr(note.getTokenizedSentences()))
+        h.update(repr(note.getChunkedText()))
+        h.update(repr(note.getConceptIndices()))
+        return h.hexdigest()
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.features')
+
+
+    def get(self, key):
+
+        """
+        FeatureStore::get()
+
+        @param key. From FeatureStore::key()
+        @return     (IOB features, concept features) for the note, or None
+        """
+
+        try:
+            with open(self.path(key), 'rb') as f:
+                entry = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return None
+        return decode(entry)
+
+
+    def put(self, key, IOB_features, concept_features):
+
+        """
+        FeatureStore::put()
+
+        @param key.              From FeatureStore::key()
+        @param IOB_features.     A list of (isProse, features_list) for each sentence
+        @param concept_features. A list of lists of concept feature dictionaries
+        @return                  None
+        """
+
+        path = self.path(key)
+        tmp_file = '%s.%d' % (path, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(encode(IOB_features, concept_features), f, -1)
+        os.rename(tmp_file, path)
+
+
+    def features(self, notes, n_jobs=1):
+
+        """
+        FeatureStore::features()
+
+        Purpose: Features for every note, extracting only those not stored
+                 (with the store's feature set)
+
+        @param notes.  A list of Note objects
+        @param n_jobs. Number of worker processes for feature extraction
+        @return        A tuple: IOB features     (1:1 with the notes' sentences)
+                                concept features (1:1 with the notes' chunked lines)
+        """
+
+        keys    = [ self.key(note) for note in notes ]
+        entries = [ self.get(key)  for key  in keys  ]
+
+        missing = [ i for i,entry in enumerate(entries) if entry is None ]
+        self.hits   += len(notes) - len(missing)
+        self.misses += len(missing)
+
+        # Extract the rest together, then split them up by note
+        if missing:
+            data   = list(chain.from_iterable( notes[i].getTokenizedSentences() for i in missing ))
+            chunks = list(chain.from_iterable( notes[i].getChunkedText()        for i in missing ))
+            inds   = list(chain.from_iterable( notes[i].getConceptIndices()     for i in missing ))
+
+            IOB_features     = IOB_features_for_sentences(data, n_jobs, self.enabled)
+            concept_features = list(concept_features_for_sentences(chunks, inds, n_jobs,
+                                                                   self.enabled))
+
+            a = b = 0
+            for i in missing:
+                n = len(notes[i].getTokenizedSentences())
+                m = len(notes[i].getChunkedText())
+                entries[i] = (IOB_features[a:a+n], concept_features[b:b+m])
+                self.put(keys[i], *entries[i])
+                a += n
+                b += m
+
+        return ( list(chain.from_iterable( IOB for IOB,_ in entries )),
+                 list(chain.from_iterable( con for _,con in entries )) )
+
+
+
+def encode(IOB_features, concept_features):
+
+    # Each distinct key is written once; dictionaries refer to it by position
+    local = {}
+    keys  = []
+    def pairs(features):
+        out = []
+        for k,v in features.iteritems():
+            j = local.get(k)
+            if j is None:
+                j = local[k] = len(keys)
+                keys.append(vocabulary.keys[k])
+            out.append( (j,v) )
+        return out
+
+    IOB = []
+    for isProse,features_list in IOB_features:
+        # Store the views' shared dictionaries, and how to rebuild the views
+        if features_list and isinstance(features_list[0], ContextFeatures):
+            context = features_list[0].context
+            features_list = features_list[0].features_list
+        else:
+            context = None
+        IOB.append( (isProse, [ pairs(f) for f in features_list ], context) )
+
+    concept = [ [ pairs(f) for f in features_list ]
+                for features_list in concept_features ]
+
+    return FORMAT_VERSION, keys, IOB, concept
+
+
+
+def decode(entry):
+
+    version,keys,IOB,concept = entry
+    if version != FORMAT_VERSION:
+        return None
+
+    ids = [ vocabulary.intern(k) for k in keys ]
+    def features(pairs):
+        return dict( [ (ids[j],v) for j,v in pairs ] )
+
+    IOB_features = []
+    for isProse,stored,context in IOB:
+        features_list = [ features(pairs) for pairs in stored ]
+        if context:
+            features_list = [ ContextFeatures(features_list, i, context)
+                              for i in range(len(features_list)) ]
+        IOB_features.append( (isProse, features_list) )
+
+    concept_features = [ [ features(pairs) for pairs in stored ]
+                         for stored in concept ]
+
+    return IOB_features, concept_features
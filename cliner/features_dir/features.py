@@ -11,8 +11,13 @@ __author__ = 'Willie Boag'
 __date__   = 'Jan. 27, 2014'
 
 
+from multiprocessing import Pool
+
 from wordshape import getWordShapes
 from utilities import is_prose_sentence
+from feature_keys import vocabulary
+import feature_profile
+import resources
 
 from sentence_features import SentenceFeatures
 
@@ -24,10 +29,10 @@ class FeatureWrapper:
 
 
     # Instantiate an FeatureWrapper object
-    def __init__(self, data=None):
+    def __init__(self, data=None, features=None):
 
         # Sentence-level features
-        self.feat_sent = SentenceFeatures(data)
+        self.feat_sent = SentenceFeatures(data, features)
 
 
 
@@ -82,3 +87,144 @@ class FeatureWrapper:
         features_list = self.feat_sent.concept_features_for_sentence(sentence,chunk_inds)
         return features_list
 
+
+
+######################################################################
+#  Extraction over many sentences (optionally in worker processes)   #
+######################################################################
+
+
+def IOB_features_for_sentences(data, n_jobs=1, features=None):
+    """
+    IOB_features_for_sentences()
+
+    Purpose: Extract first pass features for every sentence of data
+
+    @param data.     A list of split sentences
+    @param n_jobs.   Number of worker processes to extract features with
+    @param features. Which features to use (default: read_config.enabled_features())
+    @return          A list of (isProse, features_list) tuples (1:1 with data)
+
+    Sentences are split into contiguous chunks so that each worker sees
+    its sentences in file order (GENIA features rely on this). Results
+    are merged back in the original order, so output does not depend on
+    n_jobs.
+
+    >>> IOB_features_for_sentences([['Hello', 'World', '.']])[0][0]
+    True
+    """
+    if n_jobs <= 1 or len(data) <= 1:
+        return _IOB_features_for_chunk(data, features)
+
+    chunks = _contiguous_chunks(data, n_jobs)
+    return _map_chunks(_IOB_features_for_chunk, chunks, n_jobs, _remap_IOB_features,
+                       features)
+
+
+
+def concept_features_for_sentences(data, inds_list, n_jobs=1, features=None):
+    """
+    concept_features_for_sentences()
+
+    Purpose: Extract second pass features for every chunk of every sentence
+
+    @param data.      A list of list of chunks
+    @param inds_list. A list of list of chunk indices (1:1 with data)
+    @param n_jobs.    Number of worker processes to extract features with
+    @param features.  Which features to use (default: read_config.enabled_features())
+    @return           An iterable of lists of feature dictionaries (1:1 with data)
+
+    When run serially, features are generated lazily, one sentence at a time.
+
+    >>> len(list(concept_features_for_sentences([['a', 'test']], [[1]]))[0])
+    1
+    """
+    pairs = zip(data, inds_list)
+
+    if n_jobs <= 1 or len(pairs) <= 1:
+        feat_obj = FeatureWrapper(features=features)
+        return ( feat_obj.concept_features(s,inds) for s,inds in pairs )
+
+    chunks = _contiguous_chunks(pairs, n_jobs)
+    return _map_chunks(_concept_features_for_chunk, chunks, n_jobs, _remap_concept_features,
+                       features)
+
+
+
+def _IOB_features_for_chunk(data, features):
+    feat_obj = FeatureWrapper(data, features)
+    return [ feat_obj.extract_IOB_features(line) for line in data ]
+
+
+def _concept_features_for_chunk(pairs, features):
+    feat_obj = FeatureWrapper(features=features)
+    return [ feat_obj.concept_features(s,inds) for s,inds in pairs ]
+
+
+
+def _init_worker():
+    # Ids below this were shared with the parent when the worker forked
+    vocabulary.reported = len(vocabulary)
+
+    # So were the parent's profile totals
+    feature_profile.collect()
+
+
+def _run_in_worker((func, chunk, features)):
+    # Send back the keys this worker interned, so the parent can translate ids
+    #   (and, when profiling, the time spent on each feature)
+    result = func(chunk, features)
+    return vocabulary.new_keys(), feature_profile.collect(), result
+
+
+def _remap_IOB_features(results, table):
+    for isProse,features_list in results:
+        # ContextFeatures views of one sentence share their base dictionaries
+        if features_list and hasattr(features_list[0], 'features_list'):
+            base = features_list[0].features_list
+            base[:] = [ vocabulary.remap(f, table) for f in base ]
+        else:
+            features_list[:] = [ vocabulary.remap(f, table) for f in features_list ]
+    return results
+
+
+def _remap_concept_features(results, table):
+    return [ [ vocabulary.remap(f, table) for f in features_list ]
+             for features_list in results ]
+
+
+
+def _contiguous_chunks(seq, n_jobs):
+    # A few chunks per worker keeps the pool busy when chunk costs differ
+    n_chunks = min(len(seq), n_jobs * 4)
+    size = (len(seq) + n_chunks - 1) / n_chunks
+    return [ seq[i:i+size] for i in range(0, len(seq), size) ]
+
+
+def _map_chunks(func, chunks, n_jobs, remap, features):
+    # imap preserves chunk order, so results are deterministic
+    #   (that also means each worker's results arrive in the order it made
+    #    them, so its newly interned keys can be translated incrementally)
+    # Load the tagger and stemmers once, here, rather than in every worker
+    #   (not the UMLS database: a connection must not be shared across fork;
+    #    the UMLS trie and index are read-only maps, so they can be)
+    resources.preload(['pos_tagger', 'porter_stemmer', 'lancaster_stemmer'])
+    resources.preload([ name for name in ('umls_trie', 'umls_index')
+                        if name in resources.loaders ])
+    pool = Pool(n_jobs, _init_worker)
+    try:
+        results = []
+        tables  = {}
+        jobs = [ (func,c,features) for c in chunks ]
+        for new_keys,totals,chunk_result in pool.imap(_run_in_worker, jobs):
+            table = vocabulary.translation(tables, new_keys)
+            results += remap(chunk_result, table)
+            if totals:
+                feature_profile.profile.merge(totals)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
@@ -26,5 +26,9 @@ class GeniaCache:
         return self.cache[ str(key) ]
 
     def __del__(self):
-        pickle.dump( self.cache, open( self.filename, "wb" ) )
+        # Write then rename, so that concurrent processes (ex. feature
+        #   extraction workers) never leave a half-written cache behind
+        tmp_file = '%s.%d' % (self.filename, os.getpid())
+        pickle.dump( self.cache, open( tmp_file, "wb" ) )
+        os.rename( tmp_file, self.filename )
 
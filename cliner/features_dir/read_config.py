@@ -46,5 +46,42 @@ def enabled_modules():
 
 
 
-# Read from config file when module is imported
-print enabled_modules()
+# Every group of features, and the features it uses unless config.txt
+#   lists others (ex. a line "IOB_prose_word  word length mitre")
+feature_groups = [ 'IOB_prose_word'    , 'IOB_nonprose_word'    , 'concept_word'    ,
+                   'IOB_prose_sentence', 'IOB_nonprose_sentence', 'concept_sentence' ]
+
+default_features = {
+    'IOB_prose_word'        : [ 'Generic#', 'last_two_letters', 'word', 'length',
+                                'mitre', 'stem_porter', 'stem_lancaster', 'word_shape' ],
+    'IOB_nonprose_word'     : [ 'word_shape', 'mitre', 'QANN' ],
+    'concept_word'          : [ 'word', 'metric_unit' ],
+    'IOB_prose_sentence'    : [ 'unigram_context', 'pos', 'pos_context', 'prev', 'prev2',
+                                'next', 'next2', 'GENIA', 'UMLS' ],
+    'IOB_nonprose_sentence' : [ 'prev', 'next', 'unigram_context', 'UMLS' ],
+    'concept_sentence'      : [ 'UMLS' ],
+}
+
+
+
+def enabled_features():
+    """
+    enabled_features()
+
+    @return a dictionary of {feature group, list of feature names} pairs.
+
+    Groups that config.txt does not mention get their default_features.
+
+    >>> sorted(enabled_features()) == sorted(feature_groups)
+    True
+    """
+    features = dict( [ (g,list(names)) for g,names in default_features.items() ] )
+
+    filename = os.path.join( os.getenv('CLINER_DIR'), 'config.txt' )
+    with open(filename, 'r') as f:
+        for line in f.readlines():
+            words = line.split()
+            if words and words[0] in feature_groups:
+                features[words[0]] = words[1:]
+
+    return features
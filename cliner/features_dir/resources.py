@@ -0,0 +1,108 @@
+######################################################################
+#  CliNER - resources.py                                             #
+#                                                                    #
+#  Purpose: Registry of heavy resources (POS tagger, stemmers, UMLS  #
+#               database and trie), each loaded on first use         #
+######################################################################
+
+
+# name -> function that builds the resource
+loaders = {}
+
+# name -> resource (only the ones built so far)
+loaded = {}
+
+
+
+def register(name, loader):
+
+    """
+    register()
+
+    Purpose: Declare a resource, without loading it
+
+    @param name.   A unique name (ex. 'pos_tagger')
+    @param loader. A function of no arguments that builds the resource
+    @return        A lazy handle on the resource (see Lazy)
+
+    >>> calls = []
+    >>> h = register('doctest_resource', lambda: calls.append(1) or 'abc')
+    >>> calls, is_loaded('doctest_resource')
+    ([], False)
+    >>> h.upper(), h.upper(), calls
+    ('ABC', 'ABC', [1])
+    >>> unload('doctest_resource')
+    """
+
+    loaders[name] = loader
+    return Lazy(name)
+
+
+
+def get(name):
+
+    """
+    get()
+
+    Purpose: The resource, loading it if this is the first request
+
+    @param name. A registered resource name
+    @return      The resource
+    """
+
+    try:
+        return loaded[name]
+    except KeyError:
+        if name not in loaders:
+            raise KeyError('Unknown resource: %s' % name)
+        resource = loaded[name] = loaders[name]()
+        return resource
+
+
+
+def is_loaded(name):
+    return name in loaded
+
+
+
+def preload(names):
+
+    """
+    preload()
+
+    Purpose: Load resources now (ex. before forking workers, so that they
+                 share one copy instead of each loading their own)
+
+    @param names. A list of registered resource names
+    @return       None
+    """
+
+    for name in names:
+        get(name)
+
+
+
+def unload(name):
+    loaded.pop(name, None)
+
+
+
+class Lazy:
+
+    """
+    Stand-in for a registered resource.
+
+    Attribute access is forwarded to the resource, loading it on first
+    use, so module-level handles such as `porter_st.stem(word)` read the
+    same as they did when the resource was built at import time.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attr):
+        return getattr(get(self._name), attr)
+
+    def __repr__(self):
+        return '<lazy resource %r%s>' % (self._name,
+                                         '' if is_loaded(self._name) else ' (not loaded)')
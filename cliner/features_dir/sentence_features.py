@@ -10,12 +10,14 @@
 __author__ = 'Willie Boag'
 __date__   = 'Apr. 27, 2014'
 
-from utilities import load_pos_tagger
+from collections import Mapping, OrderedDict
+
+from utilities import load_pos_tagger, is_prose_sentence
 
 from wordshape import getWordShapes
 
 # What modules are available
-from read_config import enabled_modules
+from read_config import enabled_modules, enabled_features
 
 # Import feature modules
 enabled = enabled_modules()
@@ -26,307 +28,360 @@ if enabled['UMLS']:
     from umls_dir.umls_features import UMLSFeatures
 
 from word_features import WordFeatures
+from feature_keys import vocabulary
+import feature_profile
+import resources
 
-nltk_tagger = load_pos_tagger()
+# Loaded on first use
+nltk_tagger = resources.register('pos_tagger', load_pos_tagger)
 
-class SentenceFeatures:
 
 
-    # Feature Enabling
+class POSTagCache:
 
-    enabled_concept_features = frozenset( ["UMLS"])
+    """
+    Bounded, least-recently-used memo of POS tags, keyed by sentence.
 
+    Clinical notes repeat whole template lines verbatim, so each distinct
+    token sequence is tagged once. tag_sents() sends every sentence it has
+    not seen before to the tagger in a single batch call.
 
+    >>> class Tagger:
+    ...     calls = 0
+    ...     def tag_sents(self, sents):
+    ...         self.calls += 1
+    ...         return [ [ (w,w.upper()) for w in s ] for s in sents ]
+    >>> cache = POSTagCache(Tagger(), maxsize=2)
+    >>> cache.tag_sents([['a','b'], ['c'], ['a','b']])
+    [('A', 'B'), ('C',), ('A', 'B')]
+    >>> cache.tag(['c'])
+    ('C',)
+    >>> cache.tagger.calls, cache.hits, cache.misses
+    (1, 2, 2)
+    """
 
-    # Instantiate an Sentence object
-    def __init__(self, data):
+    def __init__(self, tagger, maxsize=2**15):
+        self.tagger  = tagger
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits    = 0
+        self.misses  = 0
 
 
-        # Word-level features module
-        self.feat_word = WordFeatures()
+    def tag_sents(self, sentences):
 
-        # Only run GENIA tagger if module is available
-        if data and enabled['GENIA']:
-            tagger = enabled['GENIA']
-            self.feat_genia = GeniaFeatures(tagger,data)
+        """
+        POSTagCache::tag_sents()
 
-        # Only create UMLS cache if module is available
-        if enabled['UMLS']:
-            self.feat_umls = UMLSFeatures()
+        Purpose: POS tag many sentences with (at most) one call to the tagger
 
+        @param sentences. A list of sentences (each a list of strings)
+        @return           A list of tuples of POS tags (1:1 with sentences)
+        """
 
-        self.enabled_IOB_nonprose_sentence_features = []
-        #self.enabled_IOB_nonprose_sentence_features.append('pos')
-        #self.enabled_IOB_nonprose_sentence_features.append('pos_context')
-        self.enabled_IOB_nonprose_sentence_features.append('prev')
-        self.enabled_IOB_nonprose_sentence_features.append('next')
-        self.enabled_IOB_nonprose_sentence_features.append('unigram_context')
-        self.enabled_IOB_nonprose_sentence_features.append('UMLS')
+        keys = [ tuple(sentence) for sentence in sentences ]
 
-        self.enabled_IOB_prose_sentence_features = []
-        self.enabled_IOB_prose_sentence_features.append('unigram_context')
-        self.enabled_IOB_prose_sentence_features.append('pos')
-        self.enabled_IOB_prose_sentence_features.append('pos_context')
-        self.enabled_IOB_prose_sentence_features.append('prev')
-        self.enabled_IOB_prose_sentence_features.append('prev2')
-        self.enabled_IOB_prose_sentence_features.append('next')
-        self.enabled_IOB_prose_sentence_features.append('next2')
-        self.enabled_IOB_prose_sentence_features.append('GENIA')
-        self.enabled_IOB_prose_sentence_features.append('UMLS')
+        # Look up each distinct sentence once
+        found   = {}
+        missing = []
+        for k in OrderedDict.fromkeys(keys):
+            tags = self.entries.pop(k, None)
+            if tags is None:
+                missing.append(k)
+            else:
+                found[k] = tags
 
+        # Tag the rest all together
+        if missing:
+            batch = self.tagger.tag_sents( [ list(k) for k in missing ] )
+            for k,pairs in zip(missing, batch):
+                found[k] = tuple( [ pos for _,pos in pairs ] )
 
+        self.misses += len(missing)
+        self.hits   += len(keys) - len(missing)
 
-    def IOB_prose_features(self, sentence):
-        """
-        IOB_prose_features
+        # (Re)insert at the most recently used end
+        if self.maxsize > 0:
+            for k in OrderedDict.fromkeys(keys):
+                if len(self.entries) >= self.maxsize:
+                    self.entries.popitem(last=False)
+                self.entries[k] = found[k]
 
-        @param sentence. A list of strings
-        @return          A list of dictionaries of features
+        return [ found[k] for k in keys ]
 
-        """
-        features_list = []
 
-        # Get a feature set for each word in the sentence
-        for i,word in enumerate(sentence):
-            features_list.append(self.feat_word.IOB_prose_features(sentence[i]))
+    def tag(self, sentence):
+        return self.tag_sents([sentence])[0]
 
-        # Feature: Bag of Words unigram conext (window=3)
-        if 'unigram_context' in self.enabled_IOB_prose_sentence_features:
-            window = 3
-            n = len(sentence)
 
-            # Previous unigrams
-            for i in range(n):
-                end = min(i, window)
-                unigrams = sentence[i-end:i]
-                for j,u in enumerate(unigrams):
-                    features_list[i][('prev_unigrams-%d'%j,u)] = 1
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
 
-            # Next     unigrams
-            for i in range(n):
-                end = min(i + window, n-1)
-                unigrams = sentence[i+1:end+1]
-                for j,u in enumerate(unigrams):
-                    features_list[i][('next_unigrams-%d'%j,u)] = 1
 
-        # Only POS tag once
-        if 'pos' in self.enabled_IOB_prose_sentence_features:
-            pos_tagged = nltk_tagger.tag(sentence)
+    def clear(self):
+        self.entries.clear()
+        self.hits   = 0
+        self.misses = 0
 
-        # Allow for particular features to be enabled
-        for feature in self.enabled_IOB_prose_sentence_features:
 
 
-            # Feature: Part of Speech
-            if feature == 'pos':
-                for (i,(_,pos)) in enumerate(pos_tagged):
-                    features_list[i].update( { ('pos',pos) : 1} )
+class NumberedNames(dict):
 
+    # 'prefix-0', 'prefix-1', ... formatted once, on first use
+    def __init__(self, prefix):
+        self.prefix = prefix
 
-            # Feature: POS context
-            if 'pos_context' in self.enabled_IOB_prose_sentence_features:
-                window = 3
-                n = len(sentence)
+    def __missing__(self, j):
+        self[j] = '%s-%d' % (self.prefix, j)
+        return self[j]
 
-                # Previous POS
-                for i in range(n):
-                    end = min(i, window)
-                    for j,p in enumerate(pos_tagged[i-end:i]):
-                        pos = p[1]
-                        features_list[i][('prev_pos_context-%d'%j,pos)] = 1
+prev_unigrams    = NumberedNames('prev_unigrams')
+next_unigrams    = NumberedNames('next_unigrams')
+prev_pos_context = NumberedNames('prev_pos_context')
 
-                # Next POS
-                for i in range(n):
-                    end = min(i + window, n-1)
-                    for j,p in enumerate(pos_tagged[i+1:i+end+1]):
-                        pos = p[1]
-                        features_list[i][('prev_pos_context-%d'%j,pos)] = 1
 
 
-            # GENIA features
-            if (feature == 'GENIA') and enabled['GENIA']:
+class ContextFeatures(Mapping):
 
-                # Get GENIA features
-                genia_feat_list = self.feat_genia.features(sentence)
+    """
+    A token's features plus its neighbours' features, without copying them.
 
-                '''
-                print '\t', sentence
+    Neighbour features are read straight out of the other tokens' feature
+    dictionaries and renamed on the fly (e.g. ('word','x') of the previous
+    token is seen as ('prev_word','x')). A neighbour past the edge of the
+    sentence is replaced by a boundary marker such as ('prev','*').
+    All keys are interned ids (see feature_keys).
 
-                print '\n\n'
-                for gf in genia_feat_list:
-                    print '\t', gf
-                    print
-                print '\n\n'
-                '''
+    >>> intern = vocabulary.intern
+    >>> features_list = [ {intern(('word','a')):1},
+    ...                   {intern(('word','b')):1, intern(('length',None)):4} ]
+    >>> context = [ ('prev',-1,1), ('next2',2,2.0) ]
+    >>> f = ContextFeatures(features_list, 1, context)
+    >>> sorted( [ (vocabulary.keys[k],v) for k,v in f.items() ] )
+    [(('length', None), 4), (('next2', '*'), 1), (('prev_word', 'a'), 1), (('word', 'b'), 1)]
+    >>> ContextFeatures(features_list, 0, context)[ intern(('next2','**')) ]
+    1
+    """
 
-                for i,feat_dict in enumerate(genia_feat_list):
-                    features_list[i].update(feat_dict)
+    def __init__(self, features_list, i, context):
 
+        # context: a list of (name, offset, divisor) for each neighbour
+        self.features_list = features_list
+        self.i             = i
+        self.context       = context
 
-            # Feature: UMLS Word Features (only use prose ones)
-            if (feature == "UMLS") and enabled['UMLS']:
-                umls_features = self.feat_umls.IOB_prose_features(sentence)
-                for i in range(len(sentence)):
-                    features_list[i].update( umls_features[i] )
 
-        # Used for 'prev' and 'next' features
-        ngram_features = [{} for i in range(len(features_list))]
-        if "prev" in self.enabled_IOB_prose_sentence_features:
-            prev = lambda f: {("prev_"+k[0], k[1]): v for k,v in f.items()}
-            prev_list = map(prev, features_list)
-            for i in range(len(features_list)):
-                if i == 0:
-                    ngram_features[i][("prev", "*")] = 1
-                else:
-                    ngram_features[i].update(prev_list[i-1])
-
-        if "prev2" in self.enabled_IOB_prose_sentence_features:
-            prev2 = lambda f: {("prev2_"+k[0], k[1]): v/2.0 for k,v in f.items()}
-            prev_list = map(prev2, features_list)
-            for i in range(len(features_list)):
-                if i == 0:
-                    ngram_features[i][("prev2", "*")] = 1
-                elif i == 1:
-                    ngram_features[i][("prev2", "*")] = 1
-                else:
-                    ngram_features[i].update(prev_list[i-2])
-
-        if "next" in self.enabled_IOB_prose_sentence_features:
-            next = lambda f: {("next_"+k[0], k[1]): v for k,v in f.items()}
-            next_list = map(next, features_list)
-            for i in range(len(features_list)):
-                if i < len(features_list) - 1:
-                    ngram_features[i].update(next_list[i+1])
-                else:
-                    ngram_features[i][("next", "*")] = 1
-
-        if "next2" in self.enabled_IOB_prose_sentence_features:
-            next2 = lambda f: {("next2_"+k[0], k[1]): v/2.0 for k,v in f.items()}
-            next_list = map(next2, features_list)
-            for i in range(len(features_list)):
-                if i < len(features_list) - 2:
-                    ngram_features[i].update(next_list[i+2])
-                elif i == len(features_list) - 2:
-                    ngram_features[i][("next2", "**")] = 1
-                else:
-                    ngram_features[i][("next2", "*")] = 1
-
-        merged = lambda d1, d2: dict(d1.items() + d2.items())
-        features_list = [merged(features_list[i], ngram_features[i])
-            for i in range(len(features_list))]
-
-        '''
-        for f in features_list:
-            print sorted(f.items())
-            print
-        print '\n\n\n'
-        '''
+    def neighbours(self):
 
-        return features_list
+        # (name, neighbour's features or None, divisor, boundary marker)
+        n = len(self.features_list)
+        for name,offset,divisor in self.context:
+            j = self.i + offset
+            if 0 <= j < n:
+                yield name, self.features_list[j], divisor, None
+            elif j == n and offset == 2:
+                yield name, None, divisor, vocabulary.id(name, "**")
+            else:
+                yield name, None, divisor, vocabulary.id(name, "*")
 
 
-    def IOB_nonprose_features(self, sentence):
-        """
-        IOB_nonprose_features
-        
-        @param sentence. A list of strings
-        @return          A list of dictionaries of features
-        
-        """
-        
-        # Get a feature set for each word in the sentence
-        features_list = []
-        for i,word in enumerate(sentence):
-            word_feats = self.feat_word.IOB_nonprose_features(sentence[i])
-            features_list.append( word_feats )
+    def iteritems(self):
+        for item in self.features_list[self.i].iteritems():
+            yield item
+        context = vocabulary.context
+        for name,features,divisor,marker in self.neighbours():
+            if features is None:
+                yield marker, 1
+                continue
+            tagged = vocabulary.contexts.get(name, {})
+            for k,v in features.iteritems():
+                c = tagged.get(k)
+                if c is None:
+                    c = context(name,k)
+                yield c, (v if divisor == 1 else v/divisor)
+
+
+    def __iter__(self):
+        for k,v in self.iteritems():
+            yield k
+
+
+    def __len__(self):
+        return len(self.features_list[self.i]) + \
+               sum( [ len(features) if features is not None else 1
+                      for _,features,_,_ in self.neighbours() ] )
+
+
+    def __getitem__(self, key):
+        name_value = vocabulary.keys[key]
+        for name,features,divisor,marker in self.neighbours():
+            if features is None:
+                if key == marker:
+                    return 1
+            elif name_value[0].startswith(name + "_"):
+                k = vocabulary.ids.get( (name_value[0][len(name)+1:], name_value[1]) )
+                if k in features:
+                    return features[k] if divisor == 1 else features[k]/divisor
+        return self.features_list[self.i][key]
+
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+class SentenceFeatures:
 
 
-        # Feature: Bag of Words unigram conext (window=3)
-        if 'unigram_context' in self.enabled_IOB_nonprose_sentence_features:
-            window = 3
-            n = len(sentence)
+    # Feature registries: feature name -> method that adds it to the
+    #   features of a sentence's tokens (which features are used is decided
+    #   by the model's config; see read_config.default_features)
+    IOB_prose_registry = {
+        'unigram_context' : '_unigram_context',
+        'pos'             : '_pos',
+        'pos_context'     : '_pos_context',
+        'GENIA'           : '_genia',
+        'UMLS'            : '_prose_umls',
+    }
 
-            # Previous unigrams
-            for i in range(n):
-                end = min(i, window)
-                unigrams = sentence[i-end:i]
-                for j,u in enumerate(unigrams):
-                    features_list[i][('prev_unigrams-%d'%j,u)] = 1
+    IOB_nonprose_registry = {
+        'unigram_context' : '_nonprose_unigram_context',
+        'pos'             : '_pos',
+        'pos_context'     : '_pos_context',
+        'UMLS'            : '_nonprose_umls',
+    }
 
-            # Next     unigrams
-            for i in range(n):
-                end = min(i + window, n-1)
-                unigrams = sentence[i+1:end+1]
-                for u in unigrams:
-                    features_list[i][('next_unigrams-%d'%j,u)] = 1
+    concept_registry = {
+        'UMLS'            : '_concept_umls',
+    }
 
+    # Neighbours' features (name, offset, divisor), seen through ContextFeatures
+    IOB_prose_context    = [ ('prev',-1,1), ('prev2',-2,2.0), ('next',1,1), ('next2',2,2.0) ]
+    IOB_nonprose_context = [ ('prev',-1,1), ('next',1,1) ]
 
-        # Feature: UMLS Word Features (only use nonprose ones)
-        if enabled['UMLS'] and 'UMLS' in self.enabled_IOB_nonprose_sentence_features:
-            umls_features = self.feat_umls.IOB_nonprose_features(sentence)
-            for i in range(len(sentence)):
-                features_list[i].update( umls_features[i] )
 
+    # POS tags of sentences seen so far (shared by all instances)
+    pos_cache = POSTagCache(nltk_tagger)
 
-        #return features_list
 
-        if 'pos' in self.enabled_IOB_nonprose_sentence_features:
-            pos_tagged = nltk_tagger.tag(sentence)
 
-        # Allow for particular features to be enabled
-        for feature in self.enabled_IOB_nonprose_sentence_features:
+    # Instantiate an Sentence object
+    def __init__(self, data, features=None):
+
+        # Which features to use (ex. the ones a model was trained with)
+        if features is None:
+            features = enabled_features()
 
-            # Feature: Part of Speech
-            if feature == 'pos':
-                for (i,(_,pos)) in enumerate(pos_tagged):
-                    features_list[i][ ('pos',pos) ] = 1
+        # Word-level features module
+        self.feat_word = WordFeatures(features)
+
+        # Only run GENIA tagger if module is available
+        if data and enabled['GENIA']:
+            tagger = enabled['GENIA']
+            self.feat_genia = GeniaFeatures(tagger,data)
 
+        # Only create UMLS cache if module is available
+        if enabled['UMLS']:
+            self.feat_umls = UMLSFeatures()
 
-            # Feature: POS context
-            if 'pos_context' in self.enabled_IOB_nonprose_sentence_features:
-                window = 3
-                n = len(sentence)
 
-                # Previous POS
-                for i in range(n):
-                    end = min(i, window)
-                    for j,p in enumerate(pos_tagged[i-end:i]):
-                        pos = p[1]
-                        features_list[i][('prev_pos_context-%d'%j,pos)] = 1
+        self.enabled_IOB_prose_sentence_features    = list(features['IOB_prose_sentence'   ])
+        self.enabled_IOB_nonprose_sentence_features = list(features['IOB_nonprose_sentence'])
+        self.enabled_concept_features               = list(features['concept_sentence'     ])
 
-                # Next POS
-                for i in range(n):
-                    end = min(i + window, n-1)
-                    for j,p in enumerate(pos_tagged[i+1:i+end+1]):
-                        pos = p[1]
-                        features_list[i][('prev_pos_context-%d'%j,pos)] = 1
+        # Functions to run for each sentence (looked up once, here)
+        self.IOB_prose_pipeline    = self.pipeline('IOB_prose_sentence'   , features,
+                                                   self.IOB_prose_registry   , self.IOB_prose_context   )
+        self.IOB_nonprose_pipeline = self.pipeline('IOB_nonprose_sentence', features,
+                                                   self.IOB_nonprose_registry, self.IOB_nonprose_context)
+        self.concept_pipeline      = self.pipeline('concept_sentence'     , features,
+                                                   self.concept_registry     , []                       )
 
+        # Used for 'prev' and 'next' features
+        self.IOB_prose_context    = [ c for c in self.IOB_prose_context
+                                      if c[0] in self.enabled_IOB_prose_sentence_features    ]
+        self.IOB_nonprose_context = [ c for c in self.IOB_nonprose_context
+                                      if c[0] in self.enabled_IOB_nonprose_sentence_features ]
 
+        # POS tag the whole batch up front, in one call to the tagger (kept
+        #   here too, since the batch may hold more sentences than pos_cache)
+        self.pos_tags = {}
+        prose_pos = set(['pos', 'pos_context']) & set(self.enabled_IOB_prose_sentence_features)
+        if data and prose_pos:
+            prose = [ s for s in data if is_prose_sentence(s) ]
+            self.pos_tags = dict( zip( map(tuple,prose), self.pos_cache.tag_sents(prose) ) )
 
-        ngram_features = [{} for _ in range(len(features_list))]
-        if "prev" in self.enabled_IOB_nonprose_sentence_features:
-            prev = lambda f: {("prev_"+k[0], k[1]): v for k,v in f.items()}
-            prev_list = map(prev, features_list)
-            for i in range(len(features_list)):
-                if i == 0:
-                    ngram_features[i][("prev", "*")] = 1
-                else:
-                    ngram_features[i].update(prev_list[i-1])
+        # Likewise, look up the whole batch's words in UMLS at once
+        IOB_umls = 'UMLS' in self.enabled_IOB_prose_sentence_features + \
+                             self.enabled_IOB_nonprose_sentence_features
+        if data and enabled['UMLS'] and IOB_umls:
+            self.feat_umls.prefetch(data)
 
-        if "next" in self.enabled_IOB_nonprose_sentence_features:
-            next = lambda f: {("next_"+k[0], k[1]): v for k,v in f.items()}
-            next_list = map(next, features_list)
-            for i in range(len(features_list)):
-                if i == len(features_list) - 1:
-                    ngram_features[i][("next", "*")] = 1
-                else:
-                    ngram_features[i].update(next_list[i+1])
 
+    def pipeline(self, group, features, registry, context):
+        pipeline = []
+        context  = [ c[0] for c in context ]
+        for name in features[group]:
+            if name in context:
+                continue
+            if name not in registry:
+                raise Exception('Unknown feature %s in %s' % (name, group))
 
-        merged = lambda d1, d2: dict(d1.items() + d2.items())
-        features_list = [merged(features_list[i], ngram_features[i])
-            for i in range(len(features_list))]
+            # Only use GENIA and UMLS if the module is available
+            if name in enabled and not enabled[name]:
+                continue
 
+            func = getattr(self, registry[name])
+            pipeline.append( feature_profile.timed(group, name, func, count_features) )
+        return pipeline
+
+
+
+    def IOB_prose_features(self, sentence):
+        """
+        IOB_prose_features
+
+        @param sentence. A list of strings
+        @return          A list of dictionaries of features
+
+        """
+
+        # Get a feature set for each word in the sentence
+        features_list = [ self.feat_word.IOB_prose_features(w) for w in sentence ]
+
+        # Sentence-level features
+        for add in self.IOB_prose_pipeline:
+            add(sentence, features_list)
+
+        # Views onto the neighbours' features (nothing is copied)
+        if self.IOB_prose_context:
+            context = self.IOB_prose_context
+            features_list = [ ContextFeatures(features_list, i, context)
+                              for i in range(len(features_list)) ]
+
+        return features_list
+
+
+    def IOB_nonprose_features(self, sentence):
+        """
+        IOB_nonprose_features
+        
+        @param sentence. A list of strings
+        @return          A list of dictionaries of features
+        
+        """
+        
+        # Get a feature set for each word in the sentence
+        features_list = [ self.feat_word.IOB_nonprose_features(w) for w in sentence ]
+
+        # Sentence-level features
+        for add in self.IOB_nonprose_pipeline:
+            add(sentence, features_list)
+
+        # Views onto the neighbours' features (nothing is copied)
+        if self.IOB_nonprose_context:
+            context = self.IOB_nonprose_context
+            features_list = [ ContextFeatures(features_list, i, context)
+                              for i in range(len(features_list)) ]
 
         return features_list
 
@@ -349,17 +404,122 @@ class SentenceFeatures:
         for ind in chunk_inds:
             features_list.append( self.feat_word.concept_features_for_chunk(sentence,ind) )
 
+        # Sentence-level features
+        for add in self.concept_pipeline:
+            add((sentence, chunk_inds), features_list)
 
-        # Allow for particular features to be enabled
-        for feature in self.enabled_concept_features:
+        return features_list
 
-            # Features: UMLS features
-            if (feature == "UMLS") and enabled['UMLS']:
-                umls_features = self.feat_umls.concept_features_for_chunks(sentence, chunk_inds)
-                for i in range(len(chunk_inds)):
-                    features_list[i].update( umls_features[i] )
 
 
-        return features_list
+    ##################################################################
+    #  Features (see the registries): each adds to features_list     #
+    ##################################################################
+
+
+    # Feature: Bag of Words unigram conext (window=3)
+    def _unigram_context(self, sentence, features_list):
+        window = 3
+        n = len(sentence)
+
+        # Previous unigrams
+        for i in range(n):
+            end = min(i, window)
+            unigrams = sentence[i-end:i]
+            for j,u in enumerate(unigrams):
+                features_list[i][vocabulary.id(prev_unigrams[j],u)] = 1
+
+        # Next     unigrams
+        for i in range(n):
+            end = min(i + window, n-1)
+            unigrams = sentence[i+1:end+1]
+            for j,u in enumerate(unigrams):
+                features_list[i][vocabulary.id(next_unigrams[j],u)] = 1
+
+
+    # Feature: Bag of Words unigram conext (window=3), as nonprose has it
+    #   (next unigrams all reuse the last index j of the previous unigrams)
+    def _nonprose_unigram_context(self, sentence, features_list):
+        window = 3
+        n = len(sentence)
+
+        # Previous unigrams
+        for i in range(n):
+            end = min(i, window)
+            unigrams = sentence[i-end:i]
+            for j,u in enumerate(unigrams):
+                features_list[i][vocabulary.id(prev_unigrams[j],u)] = 1
+
+        # Next     unigrams
+        for i in range(n):
+            end = min(i + window, n-1)
+            unigrams = sentence[i+1:end+1]
+            for u in unigrams:
+                features_list[i][vocabulary.id(next_unigrams[j],u)] = 1
+
+
+    # POS tags of a sentence (from this batch, if it is in it)
+    def pos_tag(self, sentence):
+        tags = self.pos_tags.get(tuple(sentence))
+        if tags is None:
+            tags = self.pos_cache.tag(sentence)
+        return tags
+
+
+    # Feature: Part of Speech
+    def _pos(self, sentence, features_list):
+        for i,pos in enumerate(self.pos_tag(sentence)):
+            features_list[i][ vocabulary.id('pos',pos) ] = 1
+
+
+    # Feature: POS context
+    def _pos_context(self, sentence, features_list):
+        pos_tags = self.pos_tag(sentence)
+        window = 3
+        n = len(sentence)
+
+        # Previous POS
+        for i in range(n):
+            end = min(i, window)
+            for j,pos in enumerate(pos_tags[i-end:i]):
+                features_list[i][vocabulary.id(prev_pos_context[j],pos)] = 1
+
+        # Next POS
+        for i in range(n):
+            end = min(i + window, n-1)
+            for j,pos in enumerate(pos_tags[i+1:i+end+1]):
+                features_list[i][vocabulary.id(prev_pos_context[j],pos)] = 1
+
+
+    # GENIA features
+    def _genia(self, sentence, features_list):
+        genia_feat_list = self.feat_genia.features(sentence)
+        for i,feat_dict in enumerate(genia_feat_list):
+            features_list[i].update( vocabulary.intern_dict(feat_dict) )
+
+
+    # Feature: UMLS Word Features (only use prose ones)
+    def _prose_umls(self, sentence, features_list):
+        umls_features = self.feat_umls.IOB_prose_features(sentence)
+        for i in range(len(sentence)):
+            features_list[i].update( vocabulary.intern_dict(umls_features[i]) )
+
+
+    # Feature: UMLS Word Features (only use nonprose ones)
+    def _nonprose_umls(self, sentence, features_list):
+        umls_features = self.feat_umls.IOB_nonprose_features(sentence)
+        for i in range(len(sentence)):
+            features_list[i].update( vocabulary.intern_dict(umls_features[i]) )
 
 
+    # Features: UMLS features
+    def _concept_umls(self, (sentence, chunk_inds), features_list):
+        umls_features = self.feat_umls.concept_features_for_chunks(sentence, chunk_inds)
+        for i in range(len(chunk_inds)):
+            features_list[i].update( vocabulary.intern_dict(umls_features[i]) )
+
+
+
+def count_features(features_list):
+    # Feature values in a list of feature dictionaries (for feature_profile)
+    return sum( [ len(features) for features in features_list ] )
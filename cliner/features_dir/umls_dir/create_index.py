@@ -0,0 +1,96 @@
+#create_index.py creates a string -> (cui, sty) index for umls lookups.
+import marisa_trie
+import sys
+import os
+
+
+def create_index():
+
+    """
+    create_index()
+
+    Purpose: Build (or load) the string -> (cui, sty) index of MRCON and MRSTY
+
+    @return  A marisa BytesTrie (memory-mapped), or None if the tables are missing
+
+    Once built, string and cui lookups are answered from the index instead
+    of the database. The file is memory-mapped read-only, so every process
+    using it shares one copy through the page cache.
+    """
+
+    prefix = os.environ['CLINER_DIR']
+    filename = os.path.join( prefix, 'umls_tables/umls-concept.index' )
+
+    if not os.path.isfile(filename):
+        mrcon_path = os.path.join( prefix, 'umls_tables/MRCON' )
+        mrsty_path = os.path.join( prefix, 'umls_tables/MRSTY' )
+        if not (os.path.isfile(mrcon_path) and os.path.isfile(mrsty_path)):
+            return None
+        build_index( mrcon_path, mrsty_path, filename )
+
+    t = marisa_trie.BytesTrie()
+    t.mmap(filename)
+    return t
+
+
+
+def build_index( mrcon_path , mrsty_path , filename ):
+
+    """
+    build_index()
+
+    Purpose: Write the index of the given tables
+
+    @param mrcon_path. The MRCON table file
+    @param mrsty_path. The MRSTY table file
+    @param filename.   Where to save the index
+    @return            None
+
+    Each string maps to 'cui|sty' for each of its distinct (cui, sty) pairs,
+    or to 'cui|' for a cui with no semantic type.
+    """
+
+    print "\ncreating concept-index"
+
+    print "reading semantic types"
+    stys = {}
+    with open( mrsty_path , "r" ) as f:
+        for line in f:
+            l = line[0:-1].split('|')
+            if len(l) < 3: continue
+            stys.setdefault( l[0], [] ).append( l[2] )
+
+    print "reading concepts"
+    records = set()
+    with open( mrcon_path , "r" ) as f:
+        for line in f:
+            l = line[0:-1].split('|')
+            if len(l) < 7: continue
+
+            cui,concept = l[0],l[6]
+
+            # Strings the database would match (sqlite stores utf-8)
+            try:
+                concept = concept.decode('utf-8')
+            except UnicodeDecodeError:
+                continue
+
+            for sty in stys.get( cui, [''] ):
+                records.add( (concept, '%s|%s' % (cui,sty)) )
+
+    print "creating index"
+    t = marisa_trie.BytesTrie(records)
+
+    # Write then rename, so that readers never map a half-written index
+    tmp_file = '%s.%d' % (filename, os.getpid())
+    t.save(tmp_file)
+    os.rename(tmp_file, filename)
+
+    print "concept-index created"
+
+
+if __name__ == '__main__':
+    t = create_index()
+    if t is None:
+        print "\nNo MRCON/MRSTY tables to use for creating the concept-index\n"
+        sys.exit(1)
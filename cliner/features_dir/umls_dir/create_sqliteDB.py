@@ -1,99 +1,206 @@
 #database.py creates a .db file for performing umls searches.
 import sqlite3
+import argparse
+import time
 import os
 import sys
-import os
+from itertools import islice
 
-def create_db():
 
-    print "\ncreating umls.db"
-    #connect to the .db file we are creating.
-    db_path = os.path.join(os.environ['CLINER_DIR'],'umls_tables/umls.db')
-    conn = sqlite3.connect( db_path )
-    conn.text_factory = str
+# Columns of each table, in the order the tables are loaded
+tables = [ ( 'MRSTY', [ 'CUI', 'TUI', 'STY', 'EMPTY' ]                                   ),
+           ( 'MRCON', [ 'CUI', 'LAT', 'TS', 'LUI', 'STT', 'SUI', 'STR', 'LRL', 'EMPTY' ] ),
+           ( 'MRREL', [ 'CUI1', 'REL', 'CUI2', 'RELA', 'SAB', 'SL', 'MG', 'EMPTY' ]      ) ]
 
-    print "opening files"
-    #load data in files.
-    try:
-        mrsty_path = os.path.join(os.environ['CLINER_DIR'],'umls_tables/MRSTY')
-        MRSTY_TABLE_FILE = open( mrsty_path, "r" )
-    except IOError:
-        print "\nNo file to use for creating MRSTY table\n"
-        conn.close()
-        sys.exit()
-
-    try:
-        mrcon_path = os.path.join(os.environ['CLINER_DIR'],'umls_tables/MRCON')
-        MRCON_TABLE_FILE = open( mrcon_path , "r" )
-    except IOError:
-        print "\nNo file to use for creating MRCON table\n"
-        conn.close()
-        sys.exit()
-
-    try:
-        mrrel_path = os.path.join(os.environ['CLINER_DIR'],'umls_tables/MRREL')
-        MRREL_TABLE_FILE = open( mrrel_path , "r" )
-    except IOError:
-        print "\nNo file to use for creating MRREL table\n"
-        conn.close()
-        sys.exit()
+# The only columns CliNER queries (see interface_umls.py)
+queried_columns = { 'MRSTY' : [ 'CUI', 'STY' ],
+                    'MRCON' : [ 'CUI', 'STR' ],
+                    'MRREL' : []               }
 
-    print "creating tables"
-    c = conn.cursor()
+# Tables with a language column
+language_column = { 'MRCON' : 'LAT' }
+
+indices = [ "CREATE INDEX IF NOT EXISTS mrsty_cui_map ON MRSTY(CUI)"     ,
+            "CREATE INDEX IF NOT EXISTS mrcon_str_map ON MRCON(STR)"     ,
+            "CREATE INDEX IF NOT EXISTS mrcon_cui_map ON MRCON(CUI)"     ,
+            "CREATE INDEX IF NOT EXISTS mrrel_cui2_map ON MRREL( CUI2 )" ,
+            "CREATE INDEX IF NOT EXISTS mrrel_cui1_map on MRREL( CUI1 ) ",
+            "CREATE INDEX IF NOT EXISTS mrrel_rel_map on MRREL( REL )"   ]
+
+# Rows inserted per transaction
+BATCH_SIZE = 100000
 
-    #create tables.
-    c.execute( "CREATE TABLE MRCON( CUI, LAT, TS, LUI, STT, SUI, STR, LRL, EMPTY ) ;" )
-    c.execute( "CREATE TABLE MRSTY( CUI, TUI, STY, EMPTY ) ;" )
-    c.execute( "CREATE TABLE MRREL( CUI1, REL, CUI2, RELA, SAB, SL, MG, EMPTY ) ;" )
 
-    print "inserting data into MRSTY table"
-    for line in MRSTY_TABLE_FILE:
+def create_db(languages=None, queried_only=False, tables_dir=None):
+
+    """
+    create_db()
 
-        try:
-            c.execute( "INSERT INTO MRSTY( CUI, TUI, STY, EMPTY) values( ?, ?, ?, ?)" , tuple(line[0:-1].split('|')) )
-        except sqlite3.ProgrammingError:
-            continue
+    Purpose: Build umls.db from the MRSTY, MRCON and MRREL tables
+
+    @param languages.    Only load MRCON rows in these languages (ex. ['ENG']), or all of them
+    @param queried_only. Only load the columns CliNER queries (the rest are left NULL)
+    @param tables_dir.   Where the tables are, and umls.db goes ($CLINER_DIR/umls_tables)
+    @return              None
+
+    Rows are inserted with executemany, BATCH_SIZE per transaction. The
+    database is built as umls.db.partial and only renamed to umls.db once
+    complete. How far each table got is committed along with its rows, so
+    running this again after an interruption picks up where it stopped
+    (with the same options).
+    """
+
+    if tables_dir is None:
+        tables_dir = os.path.join(os.environ['CLINER_DIR'],'umls_tables')
+
+    print "\ncreating umls.db"
+    db_path  = os.path.join(tables_dir,'umls.db')
+    tmp_path = db_path + '.partial'
+
+    print "opening files"
+    for name,_ in tables:
+        if not os.path.isfile( os.path.join(tables_dir,name) ):
+            print "\nNo file to use for creating %s table\n" % name
+            sys.exit()
+
+    #connect to the .db file we are creating.
+    conn = sqlite3.connect( tmp_path )
+    conn.text_factory = str
 
-    MRSTY_TABLE_FILE.close()
+    # Bulk loading: no waiting on the disk, and a large page cache. The
+    #   rollback journal stays on, so an interrupted batch is undone
+    #   rather than leaving a corrupt file.
+    conn.execute( "PRAGMA synchronous = OFF" )
+    conn.execute( "PRAGMA cache_size = -262144" )
+    conn.execute( "PRAGMA temp_store = MEMORY" )
 
-    print "inserting data into MRCON table"
-    for line in MRCON_TABLE_FILE:
+    print "creating tables"
+    c = conn.cursor()
+    c.execute( "CREATE TABLE IF NOT EXISTS load_progress( name PRIMARY KEY, lines, done ) ;" )
+    for name,columns in tables:
+        c.execute( "CREATE TABLE IF NOT EXISTS %s( %s ) ;" % (name, ', '.join(columns)) )
+    conn.commit()
 
-        try:
-            c.execute( "INSERT INTO MRCON( CUI, LAT, TS, LUI, STT, SUI, STR, LRL, EMPTY ) values ( ?, ?, ? ,?, ?,?,?,?,?);", tuple(line[0:-1].split('|')) )
-        except sqlite3.ProgrammingError:
-            continue
-    
-    MRCON_TABLE_FILE.close()
+    for name,columns in tables:
+        if queried_only:
+            keep = [ i for i,col in enumerate(columns) if col in queried_columns[name] ]
+        else:
+            keep = range(len(columns))
 
-    print "inserting data into MRREL table"
-    for line in MRREL_TABLE_FILE:
-        
-        try:
-            c.execute( "INSERT INTO MRREL(  CUI1, REL, CUI2, RELA, SAB, SL, MG, EMPTY ) values( ?, ?, ?, ?,?, ? ,? ,? )" , tuple(line[0:-1].split('|')) )
-        except sqlite3.ProgrammingError:
-            continue
+        if name in language_column and languages:
+            language = (columns.index(language_column[name]), set(languages))
+        else:
+            language = None
 
-    MRREL_TABLE_FILE.close()
+        load_table( conn, name, columns, os.path.join(tables_dir,name), keep, language )
 
     print "creating indices"
 
     #create indices for faster queries
-    c.execute( "CREATE INDEX mrsty_cui_map ON MRSTY(CUI)")
-    c.execute( "CREATE INDEX mrcon_str_map ON MRCON(STR)")
-    c.execute( "CREATE INDEX mrcon_cui_map ON MRCON(CUI)")
-    c.execute( "CREATE INDEX mrrel_cui2_map ON MRREL( CUI2 )" )
-    c.execute( "CREATE INDEX mrrel_cui1_map on MRREL( CUI1 ) " )
-    c.execute( "CREATE INDEX mrrel_rel_map on MRREL( REL )" )
+    for index in indices:
+        c.execute( index )
+
+    c.execute( "DROP TABLE load_progress ;" )
 
     #save changes to .db
     conn.commit()
 
-    print "\nsqlite database created"
-
     #close connection
     conn.close()
 
-if __name__ == "__main__":
-    create_db()
+    os.rename( tmp_path, db_path )
+
+    print "\nsqlite database created"
+
 
+def load_table( conn , name , columns , path , keep , language ):
+
+    """
+    load_table()
+
+    Purpose: Insert the rows of one pipe-delimited table file
+
+    @param conn.     Connection to the database being built
+    @param name.     Table name (ex. 'MRCON')
+    @param columns.  The table's columns
+    @param path.     The table file
+    @param keep.     Indices of the columns to load (the rest are NULL)
+    @param language. (column index, set of languages) to filter rows by, or None
+    @return          None
+    """
+
+    c = conn.cursor()
+
+    # Resume from an interrupted build?
+    progress = c.execute( "SELECT lines, done FROM load_progress WHERE name = ? ;", (name,) ).fetchone()
+    lines,done = progress if progress else (0,0)
+    if done:
+        print "%s table already loaded" % name
+        return
+    if not keep:
+        print "skipping %s table (no columns queried)" % name
+        c.execute( "INSERT OR REPLACE INTO load_progress VALUES( ?, ?, 1 ) ;", (name,lines) )
+        conn.commit()
+        return
+
+    print "inserting data into %s table" % name
+    insert = "INSERT INTO %s( %s ) values( %s )" % (name, ', '.join(columns), ', '.join('?'*len(columns)))
+    keep   = set(keep)
+
+    start  = time.time()
+    loaded = 0
+    with open( path , "r" ) as f:
+        # Lines already loaded
+        for line in islice(f, lines):
+            pass
+
+        while True:
+            batch = list(islice(f, BATCH_SIZE))
+            if not batch: break
+
+            rows = []
+            for line in batch:
+                row = line[0:-1].split('|')
+
+                # Malformed line (the wrong number of fields)
+                if len(row) != len(columns):
+                    continue
+                if language and row[language[0]] not in language[1]:
+                    continue
+
+                if len(keep) < len(columns):
+                    row = [ (val if i in keep else None) for i,val in enumerate(row) ]
+                rows.append( row )
+
+            # The rows and how far into the file they go, together
+            c.executemany( insert, rows )
+            lines += len(batch)
+            c.execute( "INSERT OR REPLACE INTO load_progress VALUES( ?, ?, 0 ) ;", (name,lines) )
+            conn.commit()
+
+            loaded += len(rows)
+            elapsed = time.time() - start
+            print "\t%d rows (%d rows/s)" % (loaded, loaded / max(elapsed, 1e-6))
+
+    c.execute( "INSERT OR REPLACE INTO load_progress VALUES( ?, ?, 1 ) ;", (name,lines) )
+    conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-lang",
+        dest = "languages",
+        help = "Only load MRCON strings in these languages (ex. ENG)",
+        nargs = "+",
+        default = None
+    )
+
+    parser.add_argument("-queried-only",
+        dest = "queried_only",
+        help = "Only load the columns CliNER queries",
+        action = "store_true"
+    )
+
+    args = parser.parse_args()
+    create_db(args.languages, args.queried_only)
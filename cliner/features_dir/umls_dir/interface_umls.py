@@ -7,10 +7,21 @@
 
 import copy
 import sqlite3
+from collections import OrderedDict
 import create_sqliteDB
 import os
+import sys
 
 import create_trie
+import create_index
+
+sys.path.append((os.environ["CLINER_DIR"] + "/cliner/features_dir"))
+
+# The same registry as the rest of features_dir (which preloads from it)
+try:
+    from features_dir import resources
+except ImportError:
+    import resources
 
 
 
@@ -42,11 +53,10 @@ def SQLConnect():
 ############################################
 
 
-# Global database connection
-c = SQLConnect()
-
-# Global trie
-trie = create_trie.create_trie()
+# Global database connection, trie and index (opened on first query)
+c     = resources.register('umls_db'   , SQLConnect                )
+trie  = resources.register('umls_trie' , create_trie.create_trie   )
+index = resources.register('umls_index', create_index.create_index )
 
 
 
@@ -56,8 +66,19 @@ trie = create_trie.create_trie()
 ############################################
 
 
+# Results of recent batch lookups (string -> rows), so the single-string
+#   lookups that follow them are answered without a query (oldest first)
+prefetched_stys = OrderedDict()
+prefetched_cuis = OrderedDict()
+PREFETCH_SIZE   = 2**16
+
+
 def string_lookup( string ):
     """ Get sty for a given string """
+    if resources.get('umls_index') is not None:
+        return [ (sty,) for cui,sty in index_lookup(string) if sty ]
+    if string in prefetched_stys:
+        return list(prefetched_stys[string])
     try:
         c.execute( "SELECT sty FROM MRCON a, MRSTY b WHERE a.cui = b.cui AND str = ?; " , (string,) )
         return c.fetchall()
@@ -67,6 +88,10 @@ def string_lookup( string ):
 
 def cui_lookup( string ):
     """ get cui for a given string """
+    if resources.get('umls_index') is not None:
+        return [ (cui,) for cui in set( cui for cui,sty in index_lookup(string) ) ]
+    if string in prefetched_cuis:
+        return list(prefetched_cuis[string])
     try:
         # Get cuis
         c.execute( "SELECT cui FROM MRCON WHERE str = ?;" , (string,) )
@@ -75,6 +100,81 @@ def cui_lookup( string ):
         return []
 
 
+def index_lookup( string ):
+    """ (cui, sty) pairs for a given string, from the index """
+    try:
+        key = unicode(string)
+    except UnicodeDecodeError:
+        return []
+    return [ tuple(record.decode('utf-8').split('|',1))
+             for record in resources.get('umls_index').get(key, []) ]
+
+
+def string_lookups( strings ):
+    """ Get sty for each of the given strings (string -> string_lookup(string)) """
+    if resources.get('umls_index') is not None:
+        return dict( [ (s,string_lookup(s)) for s in set(strings) ] )
+    query = "SELECT q.str, b.sty FROM lookup q, MRCON a, MRSTY b WHERE a.str = q.str AND a.cui = b.cui;"
+    return batch_lookup( strings, query, prefetched_stys )
+
+
+def cui_lookups( strings ):
+    """ Get cuis for each of the given strings (string -> cui_lookup(string)) """
+    if resources.get('umls_index') is not None:
+        return dict( [ (s,cui_lookup(s)) for s in set(strings) ] )
+    query = "SELECT q.str, a.cui FROM lookup q, MRCON a WHERE a.str = q.str;"
+    return batch_lookup( strings, query, prefetched_cuis )
+
+
+def batch_lookup( strings, query, prefetched ):
+
+    # Strings not looked up recently (and that sqlite can take)
+    results = {}
+    todo    = []
+    for string in set(strings):
+        if string in prefetched:
+            results[string] = prefetched[string]
+        else:
+            results[string] = []
+            if bindable(string):
+                todo.append( (string,) )
+
+    # One query for all of them, joined against a temporary table
+    if todo:
+        c.execute( "CREATE TEMP TABLE IF NOT EXISTS lookup( str PRIMARY KEY );" )
+        c.execute( "DELETE FROM lookup;" )
+        c.executemany( "INSERT INTO lookup( str ) VALUES ( ? );" , todo )
+        c.execute( query )
+        for string,value in c.fetchall():
+            results[string].append( (value,) )
+
+    # Keep (up to PREFETCH_SIZE of) the new results, making room by dropping
+    #   the oldest ones rather than everything an earlier batch looked up
+    new = [ s for s in results if s not in prefetched ][:PREFETCH_SIZE]
+    for _ in range(len(prefetched) + len(new) - PREFETCH_SIZE):
+        prefetched.popitem(last=False)
+    for string in new:
+        prefetched[string] = results[string]
+
+    return results
+
+
+def bindable( string ):
+    # sqlite refuses 8-bit bytestrings (string_lookup() returns [] for them)
+    if isinstance(string, unicode):
+        return True
+    try:
+        string.decode('ascii')
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
 def concept_exists(string):
     """ Fast query for set membership in trie """
-    return string in trie
+    return string in resources.get('umls_trie')
+
+
+def concept_prefix_exists(string):
+    """ Does any concept in the trie start with the given string? """
+    return resources.get('umls_trie').has_keys_with_prefix(string)
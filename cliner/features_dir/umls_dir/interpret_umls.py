@@ -2,6 +2,71 @@ import cPickle as pickle
 import interface_umls
 
 
+def prefetch( umls_string_cache , words , sentences=[] ):
+
+    """
+    Look up, all at once, what the functions below will ask the database
+    for: each word (umls_semantic_type_word, get_cui) and each concept span
+    of up to WINDOW_SIZE words of each sentence (umls_semantic_context_of_words,
+    umls_semantic_type_sentence) that isn't cached yet.
+
+    Found spans and cuis go straight into the cache; everything else is
+    kept by interface_umls for the single-string lookups that follow.
+    """
+
+    #Defines the largest string span for the sentence.
+    WINDOW_SIZE = 7
+
+    spans = set()
+    for sentence in sentences:
+        for i,j in concept_spans( sentence , WINDOW_SIZE ):
+            rawstring = ' '.join(sentence[i:j+1])
+            spans.add( rawstring )
+            spans.add( rawstring.strip() )
+    spans = [ s for s in spans if not umls_string_cache.has_key(s) ]
+
+    # umls_semantic_type_word() always queries
+    concepts = interface_umls.string_lookups( list(spans) + list(words) )
+    for rawstring in spans:
+        if concepts[rawstring]:
+            umls_string_cache.add_map( rawstring , concepts[rawstring] )
+
+    words = [ w for w in set(words) if not umls_string_cache.has_key( w + '--cuis' ) ]
+    cuis  = interface_umls.cui_lookups( words )
+    for word in words:
+        umls_string_cache.add_map( word + '--cuis' , [ c[0] for c in set(cuis[word]) ] )
+
+
+def concept_spans( sentence , max_length ):
+
+    """
+    (start,end) token spans, of up to max_length words, whose string is a
+    UMLS concept (in the concept trie), in order of start then end.
+
+    Each span is grown one word at a time from its start, and stops as
+    soon as no concept begins with the words so far, so only a handful of
+    the sentence's n-grams are ever considered.
+    """
+
+    spans = []
+    for i in range(len(sentence)):
+        for j in range(i, min(i+max_length, len(sentence))):
+            try:
+                rawstring = unicode(' '.join(sentence[i:j+1]))
+            except UnicodeDecodeError:
+                # The trie only holds ascii strings
+                break
+
+            if interface_umls.concept_exists(rawstring):
+                spans.append( (i,j) )
+
+            # No longer concept starts with these words?
+            if not interface_umls.concept_prefix_exists(rawstring + u' '):
+                break
+
+    return spans
+
+
 def umls_semantic_type_word( umls_string_cache , sentence ):
     # Already cached?
     if False and umls_string_cache.has_key( sentence ):
@@ -29,10 +94,16 @@ def umls_semantic_context_of_words( umls_string_cache, sentence ):
     # Each sublist functions as the mappings for each word. 
     for i in sentence: 
         umls_context_list.append( [] )
+
+    # Only substrings that are UMLS concepts can have a mapping
+    candidates = set( concept_spans( sentence , WINDOW_SIZE - 1 ) )
  
     # finds the span for each substring of length 1 to currentWindowSize. 
     for currentWindowSize in range( 1 , WINDOW_SIZE ):
         for ti in range( 0 , ( len(sentence) - currentWindowSize ) + 1 ): 
+            if (ti, ti+currentWindowSize-1) not in candidates:
+                continue
+
             rawstring = "" 
             for tj in range( ti , ti + currentWindowSize): 
                 rawstring += ( sentence[tj] + " " ) 
@@ -100,21 +171,15 @@ def umls_semantic_type_sentence( cache , sentence ):
     longestSpanLength = 0
     longestSpans = []       # List of (start,end) tokens
 
-    for i in range(len(sentence)):
-        maxVal = min(i+WINDOW_SIZE, len(sentence))
-        for j in range(i,maxVal):
-            # Lookup key
-            span = sentence[i:j+1]
-            rawstring = unicode(' '.join(span))
-
-            # string does have an associated UMLS concept?
-            if interface_umls.concept_exists(rawstring):
-                if   len(span) == longestSpanLength:
-                    longestSpans.append( (i,j) )
-                # new longest span size
-                elif len(span) >  longestSpanLength:
-                    longestSpans = [ (i,j) ]
-                    longestSpanLength = len(span)
+    # spans that have an associated UMLS concept
+    for i,j in concept_spans( sentence , WINDOW_SIZE ):
+        span = sentence[i:j+1]
+        if   len(span) == longestSpanLength:
+            longestSpans.append( (i,j) )
+        # new longest span size
+        elif len(span) >  longestSpanLength:
+            longestSpans = [ (i,j) ]
+            longestSpanLength = len(span)
 
     # lookup UMLS concept for a given (start,end) span
     def span2concept(span):
@@ -1,4 +1,13 @@
+######################################################################
+#  CliNER - umls_cache.py                                            #
+#                                                                    #
+#  Purpose: Persistent cache of UMLS lookups, shared by every        #
+#               process through an SQLite file                       #
+######################################################################
+
+
 import cPickle as pickle
+import sqlite3
 import sys
 import os
 
@@ -6,25 +15,140 @@ sys.path.append((os.environ["CLINER_DIR"] + "/cliner/features_dir"))
 
 from utilities import load_pickled_obj
 
+
+
 class UmlsCache:
-    def __init__(self):
-        try:
-            prefix = os.environ['CLINER_DIR']
-            self.filename = os.path.join( prefix, 'umls_tables/umls_cache' )
 
-            self.cache = load_pickled_obj(self.filename)
+    """
+    Key-value cache of UMLS lookups (string -> whatever was looked up).
+
+    Entries live in an SQLite table, so lookups are point queries rather
+    than loading everything up front, and new entries are appended in small
+    transactions rather than rewriting the whole cache. Any number of
+    processes can read and write the same file at once. Once there are
+    more than maxsize entries, the oldest ones are dropped.
+
+    >>> import tempfile, shutil
+    >>> tmp_dir = tempfile.mkdtemp()
+    >>> cache = UmlsCache(os.path.join(tmp_dir, 'cache.db'), maxsize=2)
+    >>> cache.add_map('pain', [('T184',)])
+    >>> cache.has_key('pain'), cache.get_map('pain')
+    (True, [('T184',)])
+    >>> cache.flush()
+    >>> cache.add_map('aspirin', None); cache.add_map('fever', [])
+    >>> cache.flush()
+    >>> other = UmlsCache(os.path.join(tmp_dir, 'cache.db'))
+    >>> other.has_key('pain'), other.has_key('aspirin'), other.get_map('fever')
+    (False, True, [])
+    >>> shutil.rmtree(tmp_dir)
+    """
+
+    def __init__(self, filename=None, maxsize=2**22, flush_every=1000):
+
+        if filename is None:
+            prefix   = os.environ['CLINER_DIR']
+            filename = os.path.join( prefix, 'umls_tables/umls_cache.db' )
+
+        self.filename    = filename
+        self.maxsize     = maxsize
+        self.flush_every = flush_every
+
+        # Entries seen by this process, and the ones not yet written
+        self.local   = {}
+        self.pending = {}
+
+        # Opened on first use (and again in a forked child)
+        self.db  = None
+        self.pid = None
+
+
+    def connect(self):
+
+        if self.db is not None and self.pid == os.getpid():
+            return self.db
+
+        new = not os.path.exists(self.filename)
+
+        db = sqlite3.connect(self.filename, timeout=60)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, value BLOB)')
+        db.commit()
+
+        self.db  = db
+        self.pid = os.getpid()
+
+        # Carry over the old pickled cache, once
+        legacy = os.path.join( os.path.dirname(self.filename), 'umls_cache' )
+        if new and os.path.isfile(legacy):
+            self.write( load_pickled_obj(legacy) )
+
+        return db
+
+
+    def lookup(self, string):
+        # (found, value): check this process first, then the file
+        if string in self.local:
+            return True, self.local[string]
+
+        row = self.connect().execute('SELECT value FROM cache WHERE key = ?',
+                                     (encode_key(string),)).fetchone()
+        if row is None:
+            return False, None
+
+        value = pickle.loads(str(row[0]))
+        self.local[string] = value
+        return True, value
 
-        except IOError:
-            self.cache = {}
 
     def has_key( self , string ):
-        return self.cache.has_key( string )
+        return self.lookup(string)[0]
 
     def add_map( self , string, mapping ):
-        self.cache[string] = mapping
+        self.local[string]   = mapping
+        self.pending[string] = mapping
+        if len(self.pending) >= self.flush_every:
+            self.flush()
 
     def get_map( self , string ):
-        return self.cache[string]
+        found,value = self.lookup(string)
+        if not found:
+            raise KeyError(string)
+        return value
+
+
+    def flush(self):
+        if self.pending:
+            pending = self.pending
+            self.pending = {}
+            self.write(pending)
+
+
+    def write(self, entries):
+
+        # One transaction for all of the entries
+        db = self.connect()
+        with db:
+            db.executemany('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)',
+                           [ (encode_key(k), sqlite3.Binary(pickle.dumps(v, -1)))
+                             for k,v in entries.iteritems() ])
+
+            # Rows are numbered in the order they were written: keep the newest
+            db.execute('DELETE FROM cache WHERE rowid <= (SELECT MAX(rowid) FROM cache) - ?',
+                       (self.maxsize,))
+
 
     def __del__(self):
-        pickle.dump( self.cache, open( self.filename, "wb" ) )
+        # Write whatever is left (the file itself is always consistent)
+        try:
+            self.flush()
+        except Exception:
+            # Interpreter shutdown (modules already torn down)
+            pass
+
+
+
+def encode_key(string):
+    if isinstance(string, unicode):
+        string = string.encode('utf-8')
+    return sqlite3.Binary(string)
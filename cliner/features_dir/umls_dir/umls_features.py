@@ -27,6 +27,23 @@ class UMLSFeatures:
 
 
 
+    def prefetch(self, sentences):
+
+        """
+        UMLSFeatures::prefetch()
+
+        Purpose: Look up the words of a batch of sentences (ex. a whole note)
+                 in a few queries, before their features are built one by one
+
+        @ param sentences.  A list of lists of words
+        @return             None
+        """
+
+        words = [ word for sentence in sentences for word in sentence ]
+        interpret_umls.prefetch( self.umls_lookup_cache, words )
+
+
+
     def IOB_prose_features(self, sentence):
 
         """
@@ -38,6 +55,8 @@ class UMLSFeatures:
 
         features_list = []
 
+        interpret_umls.prefetch( self.umls_lookup_cache, sentence )
+
         for word in sentence:
             features_list.append( self.features_for_word(word) )
 
@@ -56,6 +75,8 @@ class UMLSFeatures:
 
         features_list = []
 
+        interpret_umls.prefetch( self.umls_lookup_cache, sentence )
+
         for word in sentence:
             features_list.append( self.features_for_word(word) )
 
@@ -177,6 +198,10 @@ class UMLSFeatures:
 
 
     def concept_features_for_chunks(self, sentence, inds):
+        # Everything the chunks below look up, in a few queries
+        words = [ word for ind in inds for word in sentence[ind].split() ]
+        interpret_umls.prefetch( self.umls_lookup_cache, words, [sentence] )
+
         retVal = []
         for ind in inds:
             retVal.append( self.concept_features_for_chunk(sentence, ind) )
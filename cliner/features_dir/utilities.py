@@ -51,8 +51,6 @@ def load_pos_tagger(path_to_obj=pos_tagger_path):
 
     if os.path.isfile(path_to_obj):
 
-        print "loading tagger..."
-
         tagger = load_pickled_obj(path_to_obj)
 
     else:
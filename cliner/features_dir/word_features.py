@@ -15,25 +15,211 @@ __date__   = 'Apr 27, 2014'
 import re
 import os
 import sys
+from collections import OrderedDict
 
 from wordshape import getWordShapes
-from nltk import LancasterStemmer, PorterStemmer
+from feature_keys import vocabulary
+from read_config import enabled_features
+import feature_profile
+import resources
+
+
+def _lancaster_stemmer():
+    from nltk import LancasterStemmer
+    return LancasterStemmer()
+
+def _porter_stemmer():
+    from nltk import PorterStemmer
+    return PorterStemmer()
+
+# Built on first use (importing nltk is slow)
+lancaster_st = resources.register('lancaster_stemmer', _lancaster_stemmer)
+porter_st    = resources.register('porter_stemmer'   , _porter_stemmer   )
+
+
+# Word-level tests (compiled once, at import)
+digit_regex              = re.compile(r"[0-9]")
+test_result_regex        = re.compile(r"^[A-Za-z]+( )*(-|--|:|was|of|\*|>|<|more than|less than)( )*[0-9]+(%)*")
+test_outcome_regex       = re.compile(r"^[A-Za-z]+ was (positive|negative)")
+measurement_regex        = re.compile(r"^[0-9]*( )?(unit(s)|cc|L|mL|dL)$")
+directive_regex          = re.compile(r"^(q\..*|q..|PRM|bid|prm|p\..*)$")
+date_regex               = re.compile(r'^(\d\d\d\d-\d\d-\d|\d\d?-\d\d?-\d\d\d\d?|\d\d\d\d-\d\d?-\d\d?)$')
+volume_regex             = re.compile(r"^[0-9]*( )?(ml|mL|dL)$")
+weight_regex             = re.compile(r"^[0-9]*( )?(mg|g|mcg|milligrams|grams)$")
+size_regex               = re.compile(r"^[0-9]*( )?(mm|cm|millimeters|centimeters)$")
+prognosis_location_regex = re.compile(r"^(c|C)[0-9]+(-(c|C)[0-9]+)*$")
+problem_form_regex       = re.compile(r".*(ic|is)$")
+
+
+
+class RegexMatcher:
+
+    """
+    Several regexes evaluated together, in a single pass over a word.
+
+    Each pattern becomes an optional lookahead at the start of one combined
+    regex, so matches() gives the same answers as calling re.search() with
+    every pattern separately.
+
+    >>> m = RegexMatcher([ ('digit', r'[0-9]'), ('upper', r'^[A-Z]+$'), ('end', r'x$') ])
+    >>> m.matches('AB')
+    ['upper']
+    >>> m.matches('a1x')
+    ['digit', 'end']
+    """
+
+    def __init__(self, patterns):
+
+        # patterns: a list of (name, regex string) pairs
+        self.names = [ name for name,_ in patterns ]
+
+        lookaheads = [ r'(?:(?=(?P<m%d>[\s\S]*?(?:%s)))|)' % (i,pattern)
+                       for i,(_,pattern) in enumerate(patterns) ]
+        self.regex  = re.compile( ''.join(lookaheads) )
+        self.groups = [ self.regex.groupindex['m%d' % i] for i in range(len(patterns)) ]
+
+
+    def matches(self, word):
+
+        """
+        RegexMatcher::matches()
+
+        @param word. A string
+        @return      Names of the patterns found in word (in pattern order)
+        """
+
+        m = self.regex.match(word)
+        return [ name for name,g in zip(self.names,self.groups) if m.start(g) != -1 ]
+
+
+
+
+
+# (group, feature names) -> small int, for telling feature sets apart in the cache
+cache_tags = {}
+
+def cache_tag(group, names):
+    return cache_tags.setdefault( (group, tuple(names)), len(cache_tags) )
+
+
+
+class TokenFeatureCache:
+
+    """
+    Bounded, least-recently-used cache of per-token feature dictionaries.
+
+    Keys are (feature set, word). Callers always get a copy of the cached
+    dictionary, because sentence-level features are added to it in place.
+    Nothing is shared between processes: each pool worker fills its own
+    (forked workers start from a copy of the parent's).
+
+    >>> cache = TokenFeatureCache(maxsize=2)
+    >>> f = lambda w: {('word',w):1}
+    >>> cache.get(('s','a'), f, 'a')
+    {('word', 'a'): 1}
+    >>> cache.get(('s','a'), f, 'a')['extra'] = 1
+    >>> cache.get(('s','a'), f, 'a')
+    {('word', 'a'): 1}
+    >>> _ = cache.get(('s','b'), f, 'b'); _ = cache.get(('s','c'), f, 'c')
+    >>> ('s','a') in cache.entries, cache.hits, cache.misses
+    (False, 2, 3)
+    """
+
+    def __init__(self, maxsize=2**14):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits    = 0
+        self.misses  = 0
+
+
+    def get(self, key, func, word):
+
+        # Disabled
+        if self.maxsize <= 0:
+            return func(word)
+
+        try:
+            # Hit: move to the most recently used end
+            features = self.entries.pop(key)
+            self.hits += 1
+        except KeyError:
+            features = func(word)
+            self.misses += 1
+            if len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+        self.entries[key] = features
+
+        return features.copy()
+
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
+
+
+    def clear(self):
+        self.entries.clear()
+        self.hits   = 0
+        self.misses = 0
+
 
-lancaster_st = LancasterStemmer()
-porter_st = PorterStemmer()
 
 class WordFeatures:
 
-    enabled_IOB_prose_word_features = frozenset( ['Generic#', 'last_two_letters', 'word', 'length', 'mitre', 'stem_porter', 'stem_lancaster', 'word_shape', 'metric_unit' ] )
+    # Feature registry: feature name -> method that adds it to a token's
+    #   features (which features are used is decided by the model's config;
+    #   see read_config.default_features)
+    registry = {
+        'word'             : '_word',
+        'stem_porter'      : '_stem_porter',
+        'stem_lancaster'   : '_stem_lancaster',
+        'Generic#'         : '_generic',
+        'last_two_letters' : '_last_two_letters',
+        'prefix'           : '_prefix',
+        'length'           : '_length',
+        'mitre'            : '_mitre',
+        'word_shape'       : '_word_shape',
+        'QANN'             : '_QANN',
+        'metric_unit'      : '_metric_unit',
+        'date'             : '_date',
+        'directive'        : '_directive',
+    }
+
+
+    # Token features are shared by every WordFeatures object in the process
+    #   (and hold interned ids, so go when those ids are forgotten)
+    cache = TokenFeatureCache()
+    vocabulary.on_truncate(lambda n: WordFeatures.cache.clear())
+
+
+    def __init__(self, features=None):
+
+        # Which features to use (ex. the ones a model was trained with)
+        if features is None:
+            features = enabled_features()
 
-    enabled_IOB_nonprose_word_features = frozenset( ['word', 'word_shape', 'mitre', 'QANN' ] )
+        self.enabled_IOB_prose_word_features    = frozenset(features['IOB_prose_word'   ])
+        self.enabled_IOB_nonprose_word_features = frozenset(features['IOB_nonprose_word'])
+        self.enabled_concept_features           = frozenset(features['concept_word'     ])
 
-    #enabled_concept_features = frozenset( ['word', 'prefix', 'stem_porter', 'stem_lancaster', 'previous_word_stem', 'next_word_stem'] )
-    enabled_concept_features = frozenset( ['word', 'prefix', 'stem_porter', 'stem_lancaster', 'previous_word_stem', 'next_word_stem', 'word_shape', 'metric_unit', 'mitre', 'directive', 'date'] )
+        # Functions to run for each token (looked up once, here)
+        self.IOB_prose_pipeline    = self.pipeline('IOB_prose_word'   , features)
+        self.IOB_nonprose_pipeline = self.pipeline('IOB_nonprose_word', features)
+        self.concept_pipeline      = self.pipeline('concept_word'     , features)
 
+        # Cached features are only shared between identical feature sets
+        self.cache_tags = dict( [ (g, cache_tag(g, features[g]))
+                                  for g in ['IOB_prose_word', 'IOB_nonprose_word', 'concept_word'] ] )
 
-    def __init__(self):
-        pass
+
+    def pipeline(self, group, features):
+        pipeline = []
+        for name in features[group]:
+            if name not in self.registry:
+                raise Exception('Unknown feature %s in %s' % (name, group))
+            func = getattr(self, self.registry[name])
+            pipeline.append( feature_profile.timed(group, name, func) )
+        return pipeline
 
 
     def IOB_prose_features(self, word):
@@ -43,53 +229,25 @@ class WordFeatures:
         Purpose: Creates a dictionary of prose  features for the given word.
         
         @param word. A string
-        @return      A dictionary of features
+        @return      A dictionary of features (keyed by interned ids)
 
         >>> wf = WordFeatures()
         >>> wf.IOB_prose_features('test') is not None
         True
         """
-        # Feature: <dummy>
-        features = {('dummy', None): 1}  # always have >0 dimensions
-
-        # Allow for particular features to be enabled
-        for feature in self.enabled_IOB_prose_word_features:
-
-            if feature == "word":
-                features[(feature, word.lower())] = 1
+        key = (self.cache_tags['IOB_prose_word'], word)
+        return self.cache.get( key, self._IOB_prose_features, word )
 
-            if feature == "stem_lancaster":
-                features[ (feature, lancaster_st.stem(word.lower())) ] = 1
 
-            # Feature: Generic# stemmed word
-            if feature == 'Generic#':
-                generic = re.sub('[0-9]','0',word)
-                features[ ('Generic#',generic) ] = 1
-
-            # Feature: Last two leters of word
-            if feature == 'last_two_letters':
-                features[ ('last_two_letters',word[-2:]) ] = 1
-
-
-            if feature == "length":
-                features[(feature, None)] = len(word)
-
-            if feature == "stem_porter":
-                features[(feature, porter_st.stem(word))] = 1
-
-
-            if feature == "mitre":
-                for f in self.mitre_features:
-                    if re.search(self.mitre_features[f], word):
-                        features[(feature, f)] = 1
+    def _IOB_prose_features(self, word):
+        # Feature: <dummy>
+        features = {('dummy', None): 1}  # always have >0 dimensions
 
-            if feature == "word_shape":
-                wordShapes = getWordShapes(word)
-                for shape in wordShapes:
-                    features[(feature, shape)] = 1
+        for add in self.IOB_prose_pipeline:
+            add(word, features)
 
-
-        return features
+        # Interned feature ids (see feature_keys)
+        return vocabulary.intern_dict(features)
 
 
     def IOB_nonprose_features(self, word):
@@ -99,43 +257,31 @@ class WordFeatures:
         Purpose: Creates a dictionary of nonprose features for the given word.
         
         @param word. A string
-        @return      A dictionary of features
+        @return      A dictionary of features (keyed by interned ids)
 
         >>> wf = WordFeatures()
         >>> wf.IOB_nonprose_features('test') is not None
         True
         """
-        
-        features = {}
+        key = (self.cache_tags['IOB_nonprose_word'], word)
+        return self.cache.get( key, self._IOB_nonprose_features, word )
 
-        # Feature: The word, itself
-        features[('word', word.lower())] = 1
 
-        # Allow for particular features to be enabled
-        for feature in self.enabled_IOB_nonprose_word_features:
+    def _IOB_nonprose_features(self, word):
 
-            # Feature: Mitre
-            if feature == "mitre":
-                for f in self.mitre_features:
-                    if re.search(self.mitre_features[f], word):
-                        features[('mitre', f)] = 1
+        features = {}
 
-            # Feature: Word Shape
-            if feature == "word_shape":
-                wordShapes = getWordShapes(word)
-                for shape in wordShapes:
-                    features[('word_shape', shape)] = 1
+        # Feature: The word, itself
+        features[('word', word.lower())] = 1
 
-            # Feature: QANN features
-            if feature == 'QANN':
-                qann_feats = self.QANN_features(word)
-                features.update(qann_feats)
+        for add in self.IOB_nonprose_pipeline:
+            add(word, features)
 
-        return features
+        # Interned feature ids (see feature_keys)
+        return vocabulary.intern_dict(features)
 
 
 
-    # Note: most of this function is currently commented out so the doctests should be fixed if this is ever changed
     def concept_features_for_word(self, word):
 
         """
@@ -144,87 +290,95 @@ class WordFeatures:
         Purpose: Creates a dictionary of concept features for the given word.
  
         @param  word. A word to generate features for
-        @return       A dictionary of features
+        @return       A dictionary of features (keyed by interned ids)
 
         >>> wf = WordFeatures()
         >>> wf.concept_features_for_word('test') is not None
         True
         """
+        key = (self.cache_tags['concept_word'], word)
+        return self.cache.get( key, self._concept_features_for_word, word )
+
+
+    def _concept_features_for_word(self, word):
 
         features = {}
 
-        # Allow for particular features to be enabled
-        for feature in self.enabled_concept_features:
+        for add in self.concept_pipeline:
+            add(word, features)
 
-            # Feature: Uncased Word
-            if feature == "word":
-                features[ ("word",word.lower()) ] = 1
-
-
-            '''
-            # Feature: Porter Stem
-            if feature == "stem_porter":
-                st = nltk.stem.PorterStemmer()
-                features[ ("stem_poter", st.stem(word)) ] = 1
-
-            # Feature: Lancaster Stem
-            if feature == "stem_lancaster":
-                st = nltk.stem.LancasterStemmer()
-                features[ ("stem_lancaster", st.stem(word)) ] = 1
-            '''
-
-            '''
-            # Feature: First Four Letters
-            if feature == "prefix":
-                prefix = word[:4].lower()
-                features[ ("prefix",prefix) ] = 1
-            '''
-
-            '''
-            # Use: None
-            # Feature: Length
-            if feature == "length":
-                features[ ("length",None) ] = len(word)
-            '''
-
-            # Feature: Metric Unit
-            if feature == "metric_unit":
-                unit = None
-                if self.is_weight(word):
-                    unit = 'weight'
-                elif self.is_size(word):
-                    unit = 'size'
-                elif self.is_volume(word):
-                    unit = 'volume'
-                features[('metric_unit',unit)] = 1
-
-            '''
-            # Feature: Date
-            if feature == 'date':
-                if self.is_date(word):
-                    features[('date',None)] = 1
-
-            # Feature: Directive
-            if feature == 'directive':
-                if self.is_directive(word):
-                    features[('directive',None)] = 1
-
-            # Feature: Mitre
-            if feature == "mitre":
-                for f in self.mitre_features:
-                    if re.search(self.mitre_features[f], word):
-                        features[('mitre', f)] = 1
-
-            # Feature: Word Shape
-            if feature == "word_shape":
-                wordShapes = getWordShapes(word)
-                for shape in wordShapes:
-                    features[('word_shape', shape)] = 1
-            '''
+        # Interned feature ids (see feature_keys)
+        return vocabulary.intern_dict(features)
 
 
 
-        return features
+    ##################################################################
+    #  Features (see registry): each adds its (name,value) keys       #
+    ##################################################################
+
+
+    # Feature: Uncased word
+    def _word(self, word, features):
+        features[('word', word.lower())] = 1
+
+    # Feature: Porter stem
+    def _stem_porter(self, word, features):
+        features[('stem_porter', porter_st.stem(word))] = 1
+
+    # Feature: Lancaster stem (of the uncased word)
+    def _stem_lancaster(self, word, features):
+        features[('stem_lancaster', lancaster_st.stem(word.lower()))] = 1
+
+    # Feature: Generic# stemmed word
+    def _generic(self, word, features):
+        features[('Generic#', digit_regex.sub('0',word))] = 1
+
+    # Feature: Last two leters of word
+    def _last_two_letters(self, word, features):
+        features[('last_two_letters', word[-2:])] = 1
+
+    # Feature: First four letters
+    def _prefix(self, word, features):
+        features[('prefix', word[:4].lower())] = 1
+
+    # Feature: Length
+    def _length(self, word, features):
+        features[('length', None)] = len(word)
+
+    # Feature: Mitre
+    def _mitre(self, word, features):
+        for f in self.mitre_matcher.matches(word):
+            features[('mitre', f)] = 1
+
+    # Feature: Word shape
+    def _word_shape(self, word, features):
+        for shape in getWordShapes(word):
+            features[('word_shape', shape)] = 1
+
+    # Feature: QANN features
+    def _QANN(self, word, features):
+        features.update(self.QANN_features(word))
+
+    # Feature: Metric unit
+    def _metric_unit(self, word, features):
+        unit = None
+        if self.is_weight(word):
+            unit = 'weight'
+        elif self.is_size(word):
+            unit = 'size'
+        elif self.is_volume(word):
+            unit = 'volume'
+        features[('metric_unit', unit)] = 1
+
+    # Feature: Date
+    def _date(self, word, features):
+        if self.is_date(word):
+            features[('date', None)] = 1
+
+    # Feature: Directive
+    def _directive(self, word, features):
+        if self.is_directive(word):
+            features[('directive', None)] = 1
 
 
     #FIXME The documentation for this is incorrect, not 100% sure how it works.
@@ -234,11 +388,11 @@ class WordFeatures:
         concept_features_for_chunk()
 
         @param  word. A chunk from the sentence
-        @return       A dictionary of features
+        @return       A dictionary of features (keyed by interned ids)
 
         """
 
-        features = {'dummy':1}
+        features = {vocabulary.intern('dummy'):1}
 
         # Word-level features for each word of the chunk
         for w in sentence[ind].split():
@@ -297,6 +451,21 @@ class WordFeatures:
         "DATESEPERATOR": r"^[-/]$",
     }
 
+    # Every mitre pattern in a single pass (same order as mitre_features)
+    mitre_matcher = RegexMatcher( mitre_features.items() )
+
+    # QANN word tests in a single pass
+    qann_matcher = RegexMatcher( [
+        ('test_result' , '%s|%s' % (test_result_regex.pattern, test_outcome_regex.pattern)),
+        ('measurement' , measurement_regex.pattern ),
+        ('directive'   , directive_regex.pattern   ),
+        ('date'        , date_regex.pattern        ),
+        ('volume'      , volume_regex.pattern      ),
+        ('weight'      , weight_regex.pattern      ),
+        ('size'        , size_regex.pattern        ),
+        ('problem_form', problem_form_regex.pattern),
+    ] )
+
     # Try to get QANN features
     def QANN_features(self, word):
         """
@@ -314,35 +483,20 @@ class WordFeatures:
                                                                       
         features = {}
 
-        # Feature: test result
-        if self.is_test_result(word):    features[('test_result',None)] = 1
-
-        # Feature: measurements
-        if self.is_measurement(word):    features[('measurement',None)] = 1
+        # All of the is_*() tests at once
+        found = self.qann_matcher.matches(word)
 
-        # Feature: directive
-        if self.is_directive(word):      features[('directive',  None)] = 1
-
-        # Feature: date
-        if self.is_date(word):           features[('date',       None)] = 1
-
-        # Feature: volume
-        if self.is_volume(word):         features[('volume',     None)] = 1
-
-        # Feature: weight
-        if self.is_weight(word):         features[('weight',     None)] = 1
-
-        # Feature: size
-        if self.is_size(word):           features[('size',       None)] = 1
+        # Feature: test result, measurements, directive, date, volume, weight, size
+        for name in found:
+            if name == 'problem_form': break
+            features[(name,None)] = 1
 
         # Feature: prognosis location
-        if self.is_prognosis_location:   features[('prog_location', None)] = 1
+        #   (always on: is_prognosis_location has never been called here)
+        features[('prog_location', None)] = 1
 
         # Feature: problem form
-        if self.has_problem_form(word):  features[('problem_form',     None)] = 1
-
-        # Feature: concept class
-        if self.is_weight(word):         features[('weight',     None)] = 1
+        if 'problem_form' in found:      features[('problem_form',     None)] = 1
 
         return features
 
@@ -370,9 +524,8 @@ class WordFeatures:
         >>> print wf.is_test_result(' ')
         None
         """
-        regex = r"^[A-Za-z]+( )*(-|--|:|was|of|\*|>|<|more than|less than)( )*[0-9]+(%)*"
-        if not re.search(regex, context):
-            return re.search(r"^[A-Za-z]+ was (positive|negative)", context)
+        if not test_result_regex.search(context):
+            return test_outcome_regex.search(context)
         return True
 
     def is_measurement(self, word):
@@ -404,8 +557,7 @@ class WordFeatures:
         >>> wf.is_measurement('units') is not None
         True
         """
-        regex = r"^[0-9]*( )?(unit(s)|cc|L|mL|dL)$"
-        return re.search(regex, word)
+        return measurement_regex.search(word)
 
     def is_directive(self, word):
         """
@@ -434,8 +586,7 @@ class WordFeatures:
         >>> wf.is_directive('BID') is not None 
         False
         """
-        regex = r"^(q\..*|q..|PRM|bid|prm|p\..*)$"
-        return re.search(regex, word)
+        return directive_regex.search(word)
 
     def is_date(self, word):
         """
@@ -458,8 +609,7 @@ class WordFeatures:
         >>> wf.is_date('0') is not None
         False
         """
-        regex= r'^(\d\d\d\d-\d\d-\d|\d\d?-\d\d?-\d\d\d\d?|\d\d\d\d-\d\d?-\d\d?)$'
-        return re.search(regex,word)
+        return date_regex.search(word)
 
     def is_volume(self, word):
         """
@@ -482,8 +632,7 @@ class WordFeatures:
         >>> wf.is_volume('ml') is not None
         True
         """
-        regex = r"^[0-9]*( )?(ml|mL|dL)$"
-        return re.search(regex, word)
+        return volume_regex.search(word)
 
     def is_weight(self, word):
         """
@@ -510,8 +659,7 @@ class WordFeatures:
         >>> wf.is_weight('grams') is not None
         True
         """
-        regex = r"^[0-9]*( )?(mg|g|mcg|milligrams|grams)$"
-        return re.search(regex, word)
+        return weight_regex.search(word)
 
     def is_size(self, word):
         """
@@ -538,8 +686,7 @@ class WordFeatures:
         >>> wf.is_size('millimeters') is not None  
         True
         """
-        regex = r"^[0-9]*( )?(mm|cm|millimeters|centimeters)$"
-        return re.search(regex, word)
+        return size_regex.search(word)
 
     def is_prognosis_location(self, word):
         """
@@ -560,8 +707,7 @@ class WordFeatures:
         >>> wf.is_prognosis_location('c-9-C5') is not None
         False
         """
-        regex = r"^(c|C)[0-9]+(-(c|C)[0-9]+)*$"
-        return re.search(regex, word)
+        return prognosis_location_regex.search(word)
 
     def has_problem_form(self, word):
         """
@@ -586,8 +732,7 @@ class WordFeatures:
         >>> wf.has_problem_form('ice') is not None
         False
         """
-        regex = r".*(ic|is)$"
-        return re.search(regex, word)
+        return problem_form_regex.search(word)
 
     def get_def_class(self, word):
         """
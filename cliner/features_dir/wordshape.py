@@ -417,5 +417,214 @@ def wordShapeChris1 (s):
 
 
 # gets Chris1, Dan1, Jenny1, Chris2 and Dan2 word shapes
+#   (same result as calling each wordShape* function, in a single scan)
 def getWordShapes(word):
-    return [wordShapeChris1(word), wordShapeDan1(word), wordShapeJenny1(word), wordShapeChris2(word, False, None), wordShapeDan2(word, None)]
+    return fusedWordShapes(word)
+
+
+# gets the word shapes of many words (each distinct word is only shaped once;
+#   repeated words share the same list, so don't modify the returned lists)
+def getWordShapesBatch(words):
+    shapes = {}
+    for word in words:
+        if word not in shapes:
+            shapes[word] = fusedWordShapes(word)
+    return [shapes[word] for word in words]
+
+
+greek_prefixes = tuple(greek)
+
+# per-character class, computed once per distinct character:
+#   (isdigit, islower, isupper, istitle, ascii letter, Jenny1 mark, Chris2 mark, Dan2 mark)
+#   (str and unicode characters are kept apart, since e.g. '\xe9' != u'\xe9')
+char_classes = {}
+unicode_char_classes = {}
+
+def classifyChar(c, table):
+    digit = c.isdigit()
+    lower = c.islower()
+    upper = c.isupper()
+    title = c.istitle()
+    letter = re.search(r"^[A-Za-z]+$", c) is not None
+
+    if digit:
+        jenny = chris2 = dan2 = 'd'
+    elif lower:
+        jenny = chris2 = dan2 = 'x'
+    elif upper:
+        jenny = chris2 = dan2 = 'X'
+    else:
+        jenny = c
+        chris2 = 'X' if title else c
+        dan2 = 'x' if c == '_' else c
+
+    table[c] = (digit, lower, upper, title, letter, jenny, chris2, dan2)
+    return table[c]
+
+
+def fusedWordShapes(s):
+    length = len(s)
+    table = unicode_char_classes if isinstance(s, unicode) else char_classes
+
+    # Dan1
+    allDigit = allUpper = allLower = mixed = True
+
+    # Chris1
+    number = True
+    seenDigit = seenNonDigit = False
+    seenLower = seenUpper = False
+    allCaps = allLowerC1 = True
+    initCap = dash = period = False
+
+    # Jenny1, Chris2 and Dan2 marks
+    jenny = []
+    chris2 = []
+    dan2 = []
+
+    for i in range(0, length):
+        c = s[i]
+        cls = table.get(c)
+        if cls is None:
+            cls = classifyChar(c, table)
+        digit, lower, upper, title, letter = cls[:5]
+
+        if not digit:
+            allDigit = False
+        if not lower:
+            allLower = False
+        if not upper:
+            allUpper = False
+        if (i == 0 and not upper) or (i >= 1 and not lower):
+            mixed = False
+
+        if digit:
+            seenDigit = True
+        else:
+            seenNonDigit = True
+            if not (c == '.' or c == ',' or (i == 0 and (c == '-' or c == '+'))):
+                number = False
+
+        if c == '-':
+            dash = True
+        elif c == '.':
+            period = True
+        if title:
+            seenUpper = True
+            allLowerC1 = False
+            seenLower = True
+            allCaps = False
+        elif upper:
+            seenUpper = True
+            allLowerC1 = False
+        elif letter:
+            seenLower = True
+            allCaps = False
+        if i == 0 and (upper or title):
+            initCap = True
+
+        jenny.append(cls[5])
+        chris2.append(cls[6])
+        dan2.append(cls[7])
+
+    # A greek-letter prefix marks every character of the word
+    if s.startswith(greek_prefixes):
+        jenny = chris2 = ['g'] * length
+
+    if allDigit:
+        dan1 = "ALL-DIGITS"
+    elif allUpper:
+        dan1 = "ALL-UPPER"
+    elif allLower:
+        dan1 = "ALL-LOWER"
+    elif mixed:
+        dan1 = "MIXED-CASE"
+    else:
+        dan1 = "OTHER"
+
+    chris1 = chris1Shape(length, number, seenDigit, seenNonDigit, seenLower, seenUpper,
+                         allCaps, allLowerC1, initCap, dash, period)
+
+    if length <= BOUNDARY_SIZE * 2:
+        chris2 = ''.join(chris2)
+    else:
+        seenSet = set([])
+        for m in chris2[BOUNDARY_SIZE:length - BOUNDARY_SIZE]:
+            seenSet.add(m)
+        chris2 = ''.join(chris2[:BOUNDARY_SIZE]) + ''.join(seenSet) + ''.join(chris2[length - BOUNDARY_SIZE:])
+
+    return [chris1, dan1, collapsedShape(jenny, length), chris2, collapsedShape(dan2, length)]
+
+
+# "WT-" and marks with repeats collapsed (as in wordShapeJenny1 / wordShapeDan2)
+def collapsedShape(marks, length):
+    sb = "WT-"
+    lastM = '~'
+    for m in marks:
+        if m != lastM:
+            sb += m
+        lastM = m
+    if length <= 3:
+        sb += ':' + str(length)
+    return sb
+
+
+# the classification step of wordShapeChris1
+def chris1Shape(length, number, seenDigit, seenNonDigit, seenLower, seenUpper,
+                allCaps, allLower, initCap, dash, period):
+    if length == 0:
+        return "SYMBOL"
+
+    cardinal = False
+    if not seenDigit:
+        number = False
+    elif not seenNonDigit:
+        cardinal = True
+
+    if cardinal:
+        if (length < 4):
+            return "CARDINAL13"
+        elif (length == 4):
+            return "CARDINAL4"
+        else:
+            return "CARDINAL5PLUS"
+    elif number:
+        return "NUMBER"
+
+    if length == 2 and initCap and period:
+        return "ACRONYM1"
+    elif seenUpper and allCaps and not seenDigit and period:
+        return "ACRONYM"
+    elif seenDigit and dash and not seenUpper and not seenLower:
+        return "DIGIT-DASH"
+    elif initCap and seenLower and seenDigit and dash:
+        return "CAPITALIZED-DIGIT-DASH"
+    elif initCap and seenLower and seenDigit:
+        return "CAPITALIZED-DIGIT"
+    elif initCap and seenLower & dash:
+        return "CAPITALIZED-DASH"
+    elif initCap and seenLower:
+        return "CAPITALIZED"
+    elif seenUpper and allCaps and seenDigit and dash:
+        return "ALLCAPS-DIGIT-DASH"
+    elif seenUpper and allCaps and seenDigit:
+        return "ALLCAPS-DIGIT"
+    elif seenUpper and allCaps and dash:
+        return "ALLCAPS"
+    elif seenUpper and allCaps:
+        return "ALLCAPS"
+    elif seenLower and allLower and seenDigit and dash:
+        return "LOWERif wordShaper ==-DIGIT-DASH"
+    elif seenLower and allLower and seenDigit:
+        return "LOWERif wordShaper ==-DIGIT"
+    elif seenLower and allLower and dash:
+        return "LOWERif wordShaper ==-DASH"
+    elif seenLower and allLower:
+        return "LOWERif wordShaper =="
+    elif seenLower and seenDigit:
+        return "MIXEDif wordShaper ==-DIGIT"
+    elif seenLower:
+        return "MIXEDif wordShaper =="
+    elif seenDigit:
+        return "SYMBOL-DIGIT"
+    else:
+        return "SYMBOL"
@@ -12,95 +12,115 @@ import os
 import tempfile
 import pycrfsuite
 
-count = 0
-
 tmp_dir = '/tmp'
 
-def format_features(rows, labels=None):
 
-    retVal = []
 
-    # For each line
-    for i,line in enumerate(rows):
+class ModelFile:
 
-        # For each word in the line
-        for j,features in enumerate(line):
+    """
+    A trained crfsuite model kept in its own file.
 
-            # Nonzero dimensions
-            inds  = features.nonzero()[1]
+    Stands in for the model string returned by train(); crfsuite opens
+    the file directly instead of going through a temporary copy.
+    """
 
-            # If label exists
-            values = []
-            if labels:
-                values.append( str(labels[i][j]) )
+    def __init__(self, path):
+        self.path = path
 
-            # Value for each dimension
-            for k in inds:
-                values.append( '%d=%d' %  (k, features[0,k]) )
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
 
-            retVal.append("\t".join(values).strip())
 
-        # Sentence boundary seperator
-        retVal.append('')
 
-    '''
-    # Sanity check
-    global count
-    if labels:
-        out_f = 'a.txt' + str(count)
-        start =  0 # 2
-    else:
-        out_f = 'b.txt' + str(count)
-        start = 0
-    count += 1
-    with open(out_f, 'w') as f:
-        for line in retVal:
-            print >>f, line[start:]
-    '''
+def token_attributes(indices, data, attribute_names):
 
-    return retVal
+    """
+    token_attributes()
 
+    Purpose: crfsuite attributes for one token's nonzero feature dimensions
 
+    @param indices.         A list of column indices
+    @param data.            A list of values (1:1 with indices)
+    @param attribute_names. Names already built ((column, value) -> name), added to
+    @return                 A list of attribute name strings ('<column>=<value>',
+                              identical to the names trained models already contain)
+    """
 
+    names = []
+    for k,v in zip(indices, data):
 
-def pycrf_instances(fi, labeled):
-    xseq = []
-    yseq = []
+        # Only nonzero dimensions
+        if v == 0: continue
+
+        name = attribute_names.get((k,v))
+        if name is None:
+            name = '%d=%d' % (k,v)
+            attribute_names[(k,v)] = name
+        names.append(name)
+
+    return names
 
-    # Skip first element
-    if labeled:
-        begin = 1
-    else:
-        begin = 0
 
-    for line in fi:
-        line = line.strip('\n')
-        if not line:
-            # An empty line presents an end of a sequence.
-            if labeled:
-                yield xseq, tuple(yseq)
-            else:
-                yield xseq
 
-            xseq = []
-            yseq = []
-            continue
+def item_sequences(X, offsets, labels=None):
+
+    """
+    item_sequences()
+
+    Purpose: Build pycrfsuite ItemSequences straight from a CSR matrix
+
+    @param X.       A scipy CSR matrix (one row per token)
+    @param offsets. Cumulative sentence lengths (sentence i ends at row offsets[i])
+    @param labels.  (optional) A list of list of labels (1:1 with sentences)
+    @return         A generator of ItemSequences
+                      (or of (ItemSequence, label strings) pairs if labeled)
+    """
+
+    indptr  = X.indptr
+    indices = X.indices
+    data    = X.data
+
+    # Attribute names built so far (only for this call, so nothing outlives it)
+    attribute_names = {}
+
+    # For each line
+    start = 0
+    for i,end in enumerate(offsets):
+
+        # This sentence's slice of the CSR arrays
+        bounds = indptr[start:end+1].tolist()
+        lo,hi  = bounds[0], bounds[-1]
+        inds   = indices[lo:hi].tolist()
+        vals   = data[lo:hi].tolist()
 
-        # Split the line with TAB characters.
-        fields = line.split('\t')
+        # Each word's features are a contiguous run of the slice
+        xseq = [ token_attributes(inds[a-lo:b-lo], vals[a-lo:b-lo], attribute_names)
+                 for a,b in zip(bounds[:-1], bounds[1:]) ]
+        xseq = pycrfsuite.ItemSequence(xseq)
 
-        # Append the item to the item sequence.
-        feats = fields[begin:]
-        xseq.append(feats)
+        if labels:
+            yield xseq, [ str(y) for y in labels[i] ]
+        else:
+            yield xseq
+
+        start = end
 
-        # Append the label to the label sequence.
-        if labeled:
-            yseq.append(fields[0])
 
 
 
 def train(X, Y, do_grid):
 
+    """
+    train()
+
+    @param X.       A scipy CSR matrix of features (one row per token)
+    @param Y.       A list of list of labels (one list per sentence)
+    @param do_grid. A boolean indicating whether to perform a grid search
+    @return         A trained crfsuite model (as a string)
+    """
+
     # Sanity Check detection: features & label
     #with open('a','w') as f:
     #    for xline,yline in zip(X,Y):
@@ -109,13 +129,15 @@ def train(X, Y, do_grid):
     #        print >>f
 
 
-    # Format features fot crfsuite
-    feats = format_features(X,Y)
+    # Sentence boundaries
+    offsets = []
+    for labels in Y:
+        offsets.append( len(labels) + (offsets[-1] if offsets else 0) )
 
 
     # Create a Trainer object.
     trainer = pycrfsuite.Trainer(verbose=False)
-    for xseq, yseq in pycrf_instances(feats, labeled=True):
+    for xseq, yseq in item_sequences(X, offsets, Y):
         trainer.append(xseq, yseq)
 
 
@@ -145,10 +167,23 @@ def train(X, Y, do_grid):
 
 
 
-def predict(clf, X):
+def open_tagger(clf):
+
+    """
+    open_tagger()
 
-    # Format features fot crfsuite
-    feats = format_features(X)
+    Purpose: Materialize a trained model string as a pycrfsuite Tagger
+
+    @param clf.  A trained crfsuite model (string returned by train(),
+                   or a ModelFile)
+    @return      An opened pycrfsuite.Tagger
+    """
+
+    # Already on disk
+    if isinstance(clf, ModelFile):
+        tagger = pycrfsuite.Tagger()
+        tagger.open(clf.path)
+        return tagger
 
     # Dump the model into a temp file
     os_handle,tmp_file = tempfile.mkstemp(dir=tmp_dir)
@@ -163,11 +198,33 @@ def predict(clf, X):
     # Remove the temp file
     os.remove(tmp_file)
 
+    return tagger
+
+
+
+
+def predict(clf, X, offsets):
+
+    """
+    predict()
+
+    @param clf.     A trained crfsuite model string (or an opened Tagger)
+    @param X.       A scipy CSR matrix of features (one row per token)
+    @param offsets. Cumulative sentence lengths (sentence i ends at row offsets[i])
+    @return         A flat list of predicted labels (one per row of X)
+    """
+
+    # Reuse an already opened Tagger when the caller has one
+    if isinstance(clf, pycrfsuite.Tagger):
+        tagger = clf
+    else:
+        tagger = open_tagger(clf)
+
 
     # Tag the sequence
     retVal = []
     Y = []
-    for xseq in pycrf_instances(feats, labeled=False):
+    for xseq in item_sequences(X, offsets):
         yseq = [ int(n) for n in tagger.tag(xseq) ]
         retVal += list(yseq)
         Y.append(list(yseq))
@@ -0,0 +1,410 @@
+######################################################################
+#  CliNER - vectorizers.py                                           #
+#                                                                    #
+#  Purpose: Alternatives to DictVectorizer for turning feature       #
+#               dictionaries into sparse matrices                    #
+######################################################################
+
+
+import hashlib
+
+import numpy as np
+import scipy.sparse as sp
+
+from sklearn.feature_extraction import FeatureHasher
+
+from features_dir.feature_keys import vocabulary
+
+
+
+def feature_name(key):
+
+    """
+    feature_name()
+
+    Purpose: Stable string name for a feature key
+
+    @param key. A feature key (a (name,value) tuple or a plain string)
+    @return     A string
+
+    >>> feature_name( ('word', 'test') )
+    'word=test'
+    >>> feature_name( ('dummy', None) )
+    'dummy=None'
+    >>> feature_name( 'dummy' )
+    'dummy'
+    """
+
+    if isinstance(key, tuple):
+        return '='.join( [ '%s' % k for k in key ] )
+    return '%s' % key
+
+
+
+# feature_name() of each interned id (ids are per process, and so is this)
+interned_names = {}
+
+def interned_name(i):
+    name = interned_names.get(i)
+    if name is None:
+        name = interned_names[i] = feature_name(vocabulary.keys[i])
+    return name
+
+def forget_interned_names(n):
+    for i in [ i for i in interned_names if i >= n ]:
+        del interned_names[i]
+
+vocabulary.on_truncate(forget_interned_names)
+
+
+
+def gather(X):
+
+    # Flatten feature dictionaries into CSR-style (ids, values, indptr) lists
+    ids    = []
+    values = []
+    indptr = [0]
+    for x in X:
+        for i,v in x.iteritems():
+            ids.append(i)
+            values.append(v)
+        indptr.append( len(ids) )
+    return ids, values, indptr
+
+
+
+class InternedVectorizer:
+
+    """
+    DictVectorizer for feature dictionaries keyed by interned ids.
+
+    Columns are assigned to the sorted feature keys, exactly as
+    DictVectorizer does, and the keys (not the ids) are what gets
+    pickled. Ids are mapped back to columns in whichever process the
+    vectorizer ends up in.
+
+    >>> X = [ {vocabulary.id('word','b'):1, vocabulary.id('word','a'):1} ]
+    >>> iv = InternedVectorizer()
+    >>> iv.fit_transform(X).toarray()
+    array([[1., 1.]])
+    >>> iv.feature_names
+    [('word', 'a'), ('word', 'b')]
+    >>> iv.transform([ {vocabulary.id('word','b'):1, vocabulary.id('word','c'):1} ]).toarray()
+    array([[0., 1.]])
+    """
+
+
+    def __init__(self):
+        self.feature_names = []     # column -> feature key
+        self.columns       = {}     # id     -> column
+
+
+    def __getstate__(self):
+        return { 'feature_names':self.feature_names }
+
+
+    def __setstate__(self, state):
+        self.feature_names = state['feature_names']
+        self.columns       = None
+
+
+    @staticmethod
+    def from_dict_vectorizer(dvect):
+        iv = InternedVectorizer()
+        iv.__setstate__( { 'feature_names':list(dvect.feature_names_) } )
+        return iv
+
+
+    def id_columns(self):
+        # Intern the keys in this process (e.g. after unpickling)
+        if self.columns is None:
+            intern = vocabulary.intern
+            self.columns = dict( [ (intern(k),c) for c,k in enumerate(self.feature_names) ] )
+        return self.columns
+
+
+    def forget(self, n):
+        # Ids from n on were dropped from the vocabulary (re-intern if used)
+        if self.columns and max(self.columns) >= n:
+            self.columns = None
+
+
+    def fit(self, X):
+        self.fit_transform(X)
+        return self
+
+
+    def fit_transform(self, X):
+
+        ids,values,indptr = gather(X)
+
+        # Same columns as DictVectorizer: sorted by feature key
+        order = sorted( set(ids), key=vocabulary.keys.__getitem__ )
+        self.feature_names = [ vocabulary.keys[i] for i in order ]
+        self.columns       = dict( zip(order, range(len(order))) )
+
+        indices = [ self.columns[i] for i in ids ]
+        X = sp.csr_matrix((np.array(values, dtype=np.float64), indices, indptr),
+                          shape=(len(indptr)-1, len(order)))
+
+        # Columns within each row in order, as DictVectorizer gives them
+        #   (crfsuite numbers attributes, and liblinear sums, in that order)
+        X.sort_indices()
+        return X
+
+
+    def transform(self, X):
+
+        """
+        InternedVectorizer::transform()
+
+        @param X. An iterable of feature dictionaries (keyed by interned ids)
+        @return   A scipy CSR matrix (features not seen in fit are dropped)
+        """
+
+        get = self.id_columns().get
+
+        indices = []
+        values  = []
+        indptr  = [0]
+        for x in X:
+            for i,v in x.iteritems():
+                c = get(i)
+                if c is not None:
+                    indices.append(c)
+                    values.append(v)
+            indptr.append( len(indices) )
+
+        X = sp.csr_matrix((np.array(values, dtype=np.float64), indices, indptr),
+                          shape=(len(indptr)-1, len(self.feature_names)))
+        X.sort_indices()
+        return X
+
+
+
+class HashingVectorizer:
+
+    """
+    Feature-hashing replacement for DictVectorizer.
+
+    Feature keys are hashed into a fixed number of columns, so there is
+    no vocabulary to grow during training or to store with the model.
+    Distinct features may share a column (a hash collision); a larger
+    n_features makes that rarer.
+
+    >>> hv = HashingVectorizer(n_features=2**10)
+    >>> X = hv.fit_transform([ {vocabulary.id('word','test'):1, vocabulary.id('dummy',None):1} ])
+    >>> X.shape
+    (1, 1024)
+    """
+
+
+    def __init__(self, n_features=2**20):
+        self.n_features = n_features
+        self.hasher = FeatureHasher(n_features=n_features, input_type='pair')
+
+
+    def fit(self, X):
+        # Nothing to learn
+        return self
+
+
+    def fit_transform(self, X):
+        return self.transform(X)
+
+
+    def transform(self, X):
+
+        """
+        HashingVectorizer::transform()
+
+        @param X. An iterable of feature dictionaries (keyed by interned ids)
+        @return   A scipy CSR matrix with n_features columns
+        """
+
+        pairs = ( [ (interned_name(k),v) for k,v in x.iteritems() ] for x in X )
+        return self.hasher.transform(pairs)
+
+
+
+def _canonical(x):
+
+    # Keys that compare equal in a dict must also have equal strings
+    if isinstance(x, tuple):
+        return tuple( [ _canonical(y) for y in x ] )
+    if isinstance(x, unicode):
+        try:
+            return x.encode('ascii')
+        except UnicodeError:
+            return x
+    if isinstance(x, bool):
+        return int(x)
+    if isinstance(x, float) and x.is_integer():
+        return int(x)
+    return x
+
+
+
+def key_string(key):
+
+    """
+    key_string()
+
+    Purpose: Byte string that stands in for a feature key in an array
+
+    @param key. A feature key (as used by DictVectorizer)
+    @return     An ascii string (equal keys give equal strings)
+
+    >>> key_string( ('word', u'test') ) == key_string( ('word', 'test') )
+    True
+    >>> key_string( ('prose', True) ) == key_string( ('prose', 1) )
+    True
+    >>> key_string( ('word', u'caf\\xe9') )
+    "('word', u'caf\\\\xe9')"
+    """
+
+    return repr(_canonical(key))
+
+
+
+def key_hash(string):
+
+    """
+    key_hash()
+
+    Purpose: Fixed-width hash of a key string (the same in every process)
+
+    @param string. A key string (see key_string)
+    @return        An unsigned 64-bit integer
+
+    >>> key_hash( key_string(('word','test')) ) == key_hash( key_string(('word',u'test')) )
+    True
+    """
+
+    return int(hashlib.md5(string).hexdigest()[:16], 16)
+
+
+
+class ArrayVectorizer:
+
+    """
+    Read-only replacement for a fitted InternedVectorizer.
+
+    The vocabulary is held in flat arrays: the key strings concatenated
+    into one byte buffer (with their offsets), sorted by a 64-bit hash of
+    each string, plus those hashes and the column numbers. All of them can
+    be memory-mapped straight from disk, so nothing needs to be unpickled
+    and the pages are shared between processes. A lookup finds the hash,
+    then checks the key string itself. Each interned id is looked up once,
+    the first time it is seen. transform() gives the same matrix as the
+    vectorizer it came from.
+
+    >>> X = [ {vocabulary.id('word','a'):1, vocabulary.id('prose',True):1},
+    ...       {vocabulary.id('word','b'):1} ]
+    >>> iv = InternedVectorizer()
+    >>> _ = iv.fit_transform(X)
+    >>> av = ArrayVectorizer.from_feature_names(iv.feature_names)
+    >>> Y = [ {vocabulary.id('word','b'):1, vocabulary.id('word','c'):1}, {},
+    ...       {vocabulary.id('prose',1):1} ]
+    >>> (av.transform(Y) != iv.transform(Y)).nnz
+    0
+    >>> av.keys.nbytes == sum( len(key_string(k)) for k in iv.feature_names )
+    True
+    """
+
+
+    def __init__(self, hashes, columns, offsets, keys, n_features):
+        self.hashes     = hashes        # sorted key hashes
+        self.columns    = columns       # their column numbers
+        self.offsets    = offsets       # key i is keys[offsets[i]:offsets[i+1]]
+        self.keys       = keys          # key strings, as one uint8 buffer
+        self.n_features = n_features
+
+        # Interned id -> column (-1 if not in the vocabulary)
+        self.id_columns = {}
+
+
+    @staticmethod
+    def from_feature_names(feature_names):
+        return ArrayVectorizer.from_key_strings( [ key_string(k) for k in feature_names ],
+                                                 range(len(feature_names)),
+                                                 len(feature_names) )
+
+
+    @staticmethod
+    def from_key_strings(strings, columns, n_features):
+
+        hashes = np.array([ key_hash(k) for k in strings ], dtype=np.uint64)
+        order  = np.argsort(hashes, kind='mergesort')
+
+        strings = [ strings[i] for i in order ]
+        lengths = np.array([ len(k) for k in strings ], dtype=np.int64)
+        offsets = np.concatenate( ([0], np.cumsum(lengths)) ).astype(np.int64)
+        keys    = np.frombuffer(''.join(strings), dtype=np.uint8)
+
+        return ArrayVectorizer(hashes[order],
+                               np.array(columns, dtype=np.int32)[order],
+                               offsets, keys, n_features)
+
+
+    def forget(self, n):
+        # Ids from n on were dropped from the vocabulary
+        for i in [ i for i in self.id_columns if i >= n ]:
+            del self.id_columns[i]
+
+
+    def key(self, p):
+        return self.keys[self.offsets[p]:self.offsets[p+1]].tostring()
+
+
+    def resolve(self, ids):
+
+        # Look up every new id at once (by hash, then check the string)
+        strings = [ key_string(vocabulary.keys[i]) for i in ids ]
+        hashes  = np.array([ key_hash(k) for k in strings ], dtype=np.uint64)
+
+        n   = len(self.hashes)
+        pos = np.searchsorted(self.hashes, hashes) if n else np.zeros(len(ids), dtype=np.int64)
+        candidates = (pos < n)
+        candidates[candidates] = (self.hashes[pos[candidates]] == hashes[candidates])
+
+        for i,k,h,p,candidate in zip(ids, strings, hashes, pos.tolist(), candidates.tolist()):
+            c = -1
+            # (distinct keys with the same hash are next to each other)
+            while candidate and p < n and self.hashes[p] == h:
+                if self.key(p) == k:
+                    c = int(self.columns[p])
+                    break
+                p += 1
+            self.id_columns[i] = c
+
+
+    def transform(self, X):
+
+        """
+        ArrayVectorizer::transform()
+
+        @param X. An iterable of feature dictionaries (keyed by interned ids)
+        @return   A scipy CSR matrix with n_features columns
+        """
+
+        ids,values,indptr = gather(X)
+
+        new = set(ids).difference(self.id_columns)
+        if new:
+            self.resolve(list(new))
+
+        # Unknown features are dropped
+        get     = self.id_columns.__getitem__
+        indices = np.array([ get(i) for i in ids ], dtype=np.int64)
+        found   = (indices >= 0)
+
+        indices = indices[found]
+        values  = np.array(values, dtype=np.float64)[found]
+        indptr  = np.concatenate( ([0], np.cumsum(found)) )[indptr]
+
+        X = sp.csr_matrix((values, indices, indptr),
+                          shape=(len(indptr)-1, self.n_features),
+                          dtype=np.float64)
+        X.sort_indices()
+        return X
@@ -1,70 +1,177 @@
 from __future__ import with_statement
 
+import os
+from itertools import chain
+
 from sklearn.feature_extraction  import DictVectorizer
 
-from features_dir.features import FeatureWrapper
-from features_dir.utilities import load_pickled_obj, is_prose_sentence
+from features_dir.features import IOB_features_for_sentences
+from features_dir.features import concept_features_for_sentences
+from features_dir.utilities import load_pickled_obj
+from features_dir.read_config import enabled_features, default_features
 
 from machine_learning import sci
 from machine_learning import crf
+from machine_learning.vectorizers import HashingVectorizer, InternedVectorizer
+from features_dir.feature_keys import vocabulary
+
+import model_format
 
 from notes.note import concept_labels, reverse_concept_labels, IOB_labels, reverse_IOB_labels
 
 class Model:
 
+    # Keys first interned while predicting (mostly features the model never
+    #   saw) are forgotten once there are more than this many of them
+    max_new_keys = 2**20
+
+
     @staticmethod
     def load(filename='awesome.model'):
 
-        model = load_pickled_obj(filename)
+        # Model directory (see model_format) or legacy pickle
+        if os.path.isdir(filename):
+            model = model_format.load(Model(), filename)
+        else:
+            model = load_pickled_obj(filename)
         model.filename = filename
 
         return model
 
 
-    def __init__(self, is_crf=True):
+    def save(self, filename):
+
+        """
+        Model::save()
+
+        Purpose: Write the trained model as a directory of compact components
+
+        @param filename. Path of the model directory to create
+        @return          None
+        """
+
+        model_format.save(self, filename)
+
+
+    def __init__(self, is_crf=True, hash_dim=None, features=None):
 
         # Use python-crfsuite
         self.crf_enabled = is_crf
 
-        # DictVectorizers
-        self.first_prose_vec    = DictVectorizer()
-        self.first_nonprose_vec = DictVectorizer()
-        self.second_vec         = DictVectorizer()
+        # Features to extract (fixed here, so prediction uses the training set)
+        self.features = features if features is not None else enabled_features()
+
+        # Feature hashing (fixed number of columns, no stored vocabulary)
+        self.hash_dim = hash_dim
+
+        # Vectorizers
+        if hash_dim:
+            self.first_prose_vec    = HashingVectorizer(hash_dim)
+            self.first_nonprose_vec = HashingVectorizer(hash_dim)
+            self.second_vec         = HashingVectorizer(hash_dim)
+        else:
+            self.first_prose_vec    = InternedVectorizer()
+            self.first_nonprose_vec = InternedVectorizer()
+            self.second_vec         = InternedVectorizer()
 
         # Classifiers
         self.first_prose_clf    = None
         self.first_nonprose_clf = None
         self.second_clf         = None
 
+        # Opened pycrfsuite Taggers (lazily created, reused across notes)
+        self._taggers = {}
+
+        # Size of the vocabulary when this process started predicting
+        self._vocabulary_mark = None
 
 
-    def train(self, notes, do_grid=False):
+
+    def __getstate__(self):
+        # Opened Taggers cannot be pickled; they are reopened on demand
+        state = self.__dict__.copy()
+        state.pop('_taggers', None)
+        state.pop('_vocabulary_mark', None)
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._taggers = {}
+        self._vocabulary_mark = None
+
+        # Models pickled before the feature set was stored with the model
+        if 'features' not in state:
+            self.features = dict( [ (g,list(names)) for g,names in default_features.items() ] )
+
+        # Models pickled before feature keys were interned
+        for name in ['first_prose_vec', 'first_nonprose_vec', 'second_vec']:
+            vec = getattr(self, name)
+            if isinstance(vec, DictVectorizer):
+                setattr(self, name, InternedVectorizer.from_dict_vectorizer(vec))
+
+
+
+    def first_tagger(self, flabel, clf):
+
+        """
+        Model::first_tagger()
+
+        Purpose: Get a long-lived Tagger for a first pass crfsuite classifier
+
+        @param flabel. 'prose' or 'nonprose'
+        @param clf.    The trained crfsuite model string for that classifier
+        @return        An opened pycrfsuite.Tagger
+
+        The Tagger is opened on first use and reused for every later note.
+        It is only reopened when the classifier itself changes.
+        """
+
+        # Reopen only if the model changed since the Tagger was opened
+        cached = self._taggers.get(flabel)
+        if (cached is None) or (cached[0] is not clf):
+            self._taggers[flabel] = (clf, crf.open_tagger(clf))
+
+        return self._taggers[flabel][1]
+
+
+
+    def train(self, notes, do_grid=False, n_jobs=1, feature_store=None):
 
         """
         Model::train()
 
         Purpose: Train a ML model on annotated data
 
-        @param notes. A list of Note objects (containing text and annotations)
-        @return       None
+        @param notes.         A list of Note objects (containing text and annotations)
+        @param do_grid.       A boolean indicating whether to perform a grid search
+        @param n_jobs.        Number of worker processes for feature extraction
+        @param feature_store. A FeatureStore to reuse (and keep) features from, or None
+        @return               None
         """
 
 
+        # Features of notes seen by an earlier run come straight off disk
+        extracted1 = extracted2 = None
+        if feature_store is not None:
+            print 'reading feature store'
+            extracted1,extracted2 = feature_store.features(notes, n_jobs)
+            print '\t%d of %d notes already extracted' % (feature_store.hits, len(notes))
+
+
         ##############
         # First pass #
         ##############
 
         # Get the data and annotations from the Note objects
-        text    = [  note.getTokenizedSentences()  for  note  in  notes  ]
-        ioblist = [  note.getIOBLabels()           for  note  in  notes  ]
-
-        data1 = reduce( concat,    text )
-        Y1    = reduce( concat, ioblist )
+        #   (flattened across notes in a single linear pass)
+        data1 = flatten(  note.getTokenizedSentences()  for  note  in  notes  )
+        Y1    = flatten(  note.getIOBLabels()           for  note  in  notes  )
 
 
         # Train classifier (side effect - saved as object's member variable)
         print 'first pass'
-        self.first_train(data1, Y1, do_grid)
+        self.first_train(data1, Y1, do_grid, n_jobs, extracted1)
 
 
 
@@ -73,23 +180,20 @@ class Model:
         ###############
 
         # Get the data and annotations from the Note objects
-        chunks  = [  note.getChunkedText()     for  note  in  notes  ]
-        indices = [  note.getConceptIndices()  for  note  in  notes  ]
-        conlist = [  note.getConceptLabels()   for  note  in  notes  ]
-
-        data2 = reduce( concat, chunks  )
-        inds  = reduce( concat, indices )
-        Y2    = reduce( concat, conlist )
+        #   (flattened across notes in a single linear pass)
+        data2 = flatten(  note.getChunkedText()     for  note  in  notes  )
+        inds  = flatten(  note.getConceptIndices()  for  note  in  notes  )
+        Y2    = flatten(  note.getConceptLabels()   for  note  in  notes  )
 
 
         # Train classifier (side effect - saved as object's member variable)
         print 'second pass'
-        self.second_train(data2, inds, Y2, do_grid)
+        self.second_train(data2, inds, Y2, do_grid, n_jobs, extracted2)
 
 
 
 
-    def first_train(self, data, Y, do_grid=False):
+    def first_train(self, data, Y, do_grid=False, n_jobs=1, extracted=None):
 
         """
         Model::first_train()
@@ -99,15 +203,16 @@ class Model:
         @param data      A list of split sentences    (1 sent = 1 line from file)
         @param Y         A list of list of IOB labels (1:1 mapping with data)
         @param do_grid   A boolean indicating whether to perform a grid search
+        @param n_jobs    Number of worker processes for feature extraction
+        @param extracted Features already extracted from data (or None)
 
         @return          None
         """
 
-        print '\textracting  features (pass one)'
-
-
-        # Create object that is a wrapper for the features
-        feat_obj = FeatureWrapper(data)
+        # Extract features for every sentence
+        if extracted is None:
+            print '\textracting  features (pass one)'
+            extracted = IOB_features_for_sentences(data, n_jobs, self.features)
 
 
         # Parition into prose v. nonprose
@@ -115,8 +220,7 @@ class Model:
         nonprose = []
         pchunks = []
         nchunks = []
-        for line,labels in zip(data,Y):
-            isProse,feats = feat_obj.extract_IOB_features(line)
+        for (isProse,feats),labels in zip(extracted,Y):
             if isProse:
                 prose.append(feats)
                 pchunks += labels
@@ -158,17 +262,13 @@ class Model:
 
             print '\ttraining classifiers (pass one) ' + flabel
 
-            # CRF needs reconstructed lists
+            # Train classifiers
+            #   (CRF reads sentence boundaries straight from the matrix)
             if self.crf_enabled:
-                X = list(X)
-                X = [ X[i:j] for i, j in zip([0] + offsets, offsets)]
                 Y = [ Y[i:j] for i, j in zip([0] + offsets, offsets)]
-                lib = crf
+                clf = crf.train(X, Y, do_grid)
             else:
-                lib = sci
-
-            # Train classifiers
-            clf  = lib.train(X, Y, do_grid)
+                clf = sci.train(X, Y, do_grid)
             classifiers.append(clf)
 
 
@@ -186,7 +286,7 @@ class Model:
     # Model::second_train()
     #
     #
-    def second_train(self, data, inds_list, Y, do_grid=False):
+    def second_train(self, data, inds_list, Y, do_grid=False, n_jobs=1, X=None):
 
         """
         Model::second_train()
@@ -204,18 +304,18 @@ class Model:
                            - assertion: there are sum(len(inds_list)) labels
                                AKA each index from inds_list maps to a label
         @param do_grid   A boolean indicating whether to perform a grid search
+        @param n_jobs    Number of worker processes for feature extraction
+        @param X         Features already extracted from data (or None)
 
         @return          None
         """
 
-        print '\textracting  features (pass two)'
-
-        # Create object that is a wrapper for the features
-        feat_o = FeatureWrapper()
-
         # Extract features
-        X = [ feat_o.concept_features(s,inds) for s,inds in zip(data,inds_list) ]
-        X = reduce(concat, X)
+        #   (streamed straight into the vectorizer, one chunk at a time)
+        if X is None:
+            print '\textracting  features (pass two)'
+            X = concept_features_for_sentences(data, inds_list, n_jobs, self.features)
+        X = chain.from_iterable(X)
 
 
         print '\tvectorizing features (pass two)'
@@ -238,8 +338,42 @@ class Model:
 
     # Model::predict()
     #
-    # @param note. A Note object that contains the data
-    def predict(self, note):
+    # @param note.   A Note object that contains the data
+    # @param n_jobs. Number of worker processes for feature extraction
+    def predict(self, note, n_jobs=1):
+        return self.predict_many([note], n_jobs)[0]
+
+
+
+
+    def predict_many(self, notes, n_jobs=1):
+
+        """
+        Model::predict_many()
+
+        Purpose: Predict concepts for many notes with one classifier call per pass
+
+        @param notes.  A list of Note objects
+        @param n_jobs. Number of worker processes for feature extraction
+        @return        A list of classifications for each note (1:1 with notes)
+
+        Sentences from every note are pooled, so each pass vectorizes and
+        classifies once for the whole batch. Labels are then scattered back
+        to the note (and line) they came from.
+        """
+
+        if self._vocabulary_mark is None:
+            # The model's own keys are not new (intern them before the mark)
+            for vec in [self.first_prose_vec, self.first_nonprose_vec, self.second_vec]:
+                if isinstance(vec, InternedVectorizer):
+                    vec.id_columns()
+            self._vocabulary_mark = len(vocabulary)
+
+        # Line offsets of each note within the pooled data
+        bounds = []
+        for note in notes:
+            n = len(note.getTokenizedSentences())
+            bounds.append( n + (bounds[-1] if bounds else 0) )
 
 
         ##############
@@ -250,12 +384,13 @@ class Model:
         print 'first pass'
 
         # Get the data and annotations from the Note objects
-        data   = note.getTokenizedSentences()
+        data   = flatten(  note.getTokenizedSentences()  for  note  in  notes  )
 
         # Predict IOB labels
-        iobs,_,__ = self.first_predict(data)
+        iobs,_,__ = self.first_predict(data, n_jobs)
 
-        note.setIOBLabels(iobs)
+        for note,i,j in zip(notes, [0] + bounds, bounds):
+            note.setIOBLabels(iobs[i:j])
 
 
 
@@ -267,41 +402,85 @@ class Model:
         print 'second pass'
 
         # Get the data and annotations from the Note objects
-        chunks = note.getChunkedText()
-        inds   = note.getConceptIndices()
+        chunks = flatten(  note.getChunkedText()     for  note  in  notes  )
+        inds   = flatten(  note.getConceptIndices()  for  note  in  notes  )
 
         # Predict concept labels
-        retVal = self.second_predict(chunks,inds)
+        classifications = self.second_predict(chunks,inds,n_jobs)
 
-        return retVal
 
+        # Scatter classifications back to their notes
+        #   (classifications are in line order; line numbers start at 1)
+        retVals = [ [] for note in notes ]
+        k = 0
+        for concept,lineno,start,end in classifications:
+            while lineno > bounds[k]:
+                k += 1
+            base = bounds[k-1] if k else 0
+            retVals[k].append( (concept,lineno-base,start,end) )
 
+        # Keep long-running prediction from growing the vocabulary forever
+        if len(vocabulary) - self._vocabulary_mark > self.max_new_keys:
+            self.forget_new_keys()
 
+        return retVals
 
-    def first_predict(self, data):
+
+
+    def forget_new_keys(self):
+
+        """
+        Model::forget_new_keys()
+
+        Purpose: Drop the feature keys interned since this process started
+                 predicting, and everything that refers to them
+
+        @return  None
+        """
+
+        n = self._vocabulary_mark
+        vocabulary.truncate(n)
+        for vec in [self.first_prose_vec, self.first_nonprose_vec, self.second_vec]:
+            forget = getattr(vec, 'forget', None)
+            if forget is not None:
+                forget(n)
+
+
+
+
+    def first_predict(self, data, n_jobs=1):
 
         """
         Model::first_predict()
 
         Purpose: Predict IOB chunks on data
 
-        @param data.  A list of split sentences    (1 sent = 1 line from file)
-        @return       A list of list of IOB labels (1:1 mapping with data)
+        @param data.   A list of split sentences    (1 sent = 1 line from file)
+        @param n_jobs. Number of worker processes for feature extraction
+        @return        A list of list of IOB labels (1:1 mapping with data)
+
+        Repeated lines (ex. template headers) are extracted and tagged once;
+        their labels are copied back out to every occurrence.
         """
 
+        # Collapse exact-duplicate sentences
+        all_data = data
+        data,index = unique_sentences(all_data)
+        print '\t%d of %d sentences are repeats' % (len(all_data)-len(data), len(all_data))
+
+
         print '\textracting  features (pass one)'
 
 
-        # Create object that is a wrapper for the features
-        feat_obj = FeatureWrapper(data)
+        # Extract features for every distinct sentence
+        extracted = IOB_features_for_sentences(data, n_jobs, self.features)
 
         # separate prose and nonprose data
         prose    = []
         nonprose = []
         plinenos = []
         nlinenos = []
-        for i,line in enumerate(data):
-            isProse,feats = feat_obj.extract_IOB_features(line)
+        for i,(isProse,feats) in enumerate(extracted):
             if isProse:
                 prose.append(feats)
                 plinenos.append(i)
@@ -339,42 +518,31 @@ class Model:
 
             print '\tpredicting    labels (pass one) ' + flabel
 
-            # CRF requires reconstruct lists
+            # Predict IOB labels
+            #   (CRF reads sentence boundaries straight from the matrix)
             if self.crf_enabled:
-                X = list(X)
-                X = [ X[i:j] for i, j in zip([0] + offsets, offsets)]
-                lib = crf
+                tagger = self.first_tagger(flabel, clf)
+                out = crf.predict(tagger, X, offsets)
             else:
-                lib = sci
-
-            # Predict IOB labels
-            out = lib.predict(clf, X)
+                out = sci.predict(clf, X)
 
             # Format labels from output
             pred = [out[i:j] for i, j in zip([0] + offsets, offsets)]
             preds.append(pred)
 
 
-        # Recover predictions
-        plist = preds[0]
-        nlist = preds[1]
-
-
         # Stitch prose and nonprose data back together
         # translate IOB labels into a readable format
-        prose_iobs    = []
-        nonprose_iobs = []
-        iobs          = []
-        trans = lambda l: reverse_IOB_labels[int(l)]
-        for sentence in data:
-            if is_prose_sentence(sentence):
-                prose_iobs.append( plist.pop(0) )
-                prose_iobs[-1] = map(trans, prose_iobs[-1])
-                iobs.append( prose_iobs[-1] )
-            else:
-                nonprose_iobs.append( nlist.pop(0) )
-                nonprose_iobs[-1] = map(trans, nonprose_iobs[-1])
-                iobs.append( nonprose_iobs[-1] )
+        prose_iobs    = translate_IOB_labels(preds[0])
+        nonprose_iobs = translate_IOB_labels(preds[1])
+        iobs = stitch_lines(len(data), [ (plinenos,    prose_iobs),
+                                         (nlinenos, nonprose_iobs) ])
+
+        # Fan labels back out to every occurrence
+        isProse       = [ isProse for isProse,_ in extracted ]
+        iobs          = [ list(iobs[j]) for j in index ]
+        prose_iobs    = [ iob for iob,j in zip(iobs,index) if     isProse[j] ]
+        nonprose_iobs = [ iob for iob,j in zip(iobs,index) if not isProse[j] ]
 
 
         # list of list of IOB labels
@@ -383,7 +551,7 @@ class Model:
 
 
 
-    def second_predict(self, data, inds_list):
+    def second_predict(self, data, inds_list, n_jobs=1):
 
         # If first pass predicted no concepts, then skip
         # NOTE: Special case because SVM cannot have empty input
@@ -392,16 +560,13 @@ class Model:
             return []
 
 
-        # Create object that is a wrapper for the features
-        feat_o = FeatureWrapper()
-
-
         print '\textracting  features (pass two)'
 
 
         # Extract features
-        X = [ feat_o.concept_features(s,inds) for s,inds in zip(data,inds_list) ]
-        X = reduce(concat, X)
+        #   (streamed straight into the vectorizer, one chunk at a time)
+        X = concept_features_for_sentences(data, inds_list, n_jobs, self.features)
+        X = chain.from_iterable(X)
 
 
         print '\tvectorizing features (pass two)'
@@ -419,39 +584,133 @@ class Model:
 
 
         # Line-by-line processing
-        o = list(out)
-        classifications = []
-        for lineno,inds in enumerate(inds_list):
+        classifications = concept_classifications(data, inds_list, out)
 
-            # Skip empty line
-            if not inds: continue
+        # Return classifications
+        return classifications
 
-            # For each concept
-            for ind in inds:
 
-                # Get next concept
-                concept = reverse_concept_labels[o.pop(0)]
 
-                # Get start position (ex. 7th word of line)
-                start = 0
-                for i in range(ind):
-                    start += len( data[lineno][i].split() )
 
-                # Length of chunk
-                length = len(data[lineno][ind].split())
 
-                # Classification token
-                classifications.append( (concept,lineno+1,start,start+length-1) )
+def flatten(lists):
+    """
+    flatten()
+
+    Purpose: Concatenate an iterable of lists in linear time
+
+    @param lists. An iterable of lists
+    @return       A single list with the elements of each list, in order
+
+    >>> flatten( [[1,2], [], [3]] )
+    [1, 2, 3]
+    """
+    return list( chain.from_iterable(lists) )
+
 
-        # Return classifications
-        return classifications
 
+def unique_sentences(data):
+    """
+    unique_sentences()
+
+    Purpose: Collapse exact-duplicate sentences
+
+    @param data. A list of split sentences
+    @return      A tuple: the distinct sentences (in order of first appearance)
+                          and, for each sentence of data, its distinct copy's index
+
+    >>> unique_sentences( [['Admission', 'Date', ':'], ['Hi'], ['Admission', 'Date', ':']] )
+    ([['Admission', 'Date', ':'], ['Hi']], [0, 1, 0])
+    """
+    first  = {}
+    unique = []
+    index  = []
+    for sentence in data:
+        key = tuple(sentence)
+        j = first.get(key)
+        if j is None:
+            j = first[key] = len(unique)
+            unique.append(sentence)
+        index.append(j)
+    return unique, index
+
+
+
+def translate_IOB_labels(preds):
+    """
+    translate_IOB_labels()
+
+    Purpose: Turn predicted IOB label ids into 'I', 'O' and 'B' strings
 
+    @param preds. A list of list of IOB label ids
+    @return       A list of list of IOB label strings
+
+    >>> translate_IOB_labels( [[0, 1], [2]] )
+    [['O', 'B'], ['I']]
+    """
+    return [ [ reverse_IOB_labels[int(l)] for l in labels ] for labels in preds ]
 
 
 
-def concat(a,b):
+def stitch_lines(n, partitions):
     """
-    list concatenation function (for reduce() purpose)
+    stitch_lines()
+
+    Purpose: Put lines that were classified in separate partitions back in order
+
+    @param n.          Total number of lines
+    @param partitions. A list of (line numbers, values) pairs, 1:1 within each pair
+    @return            A list of n values, in line order
+
+    >>> stitch_lines(3, [ ([0,2], ['a','c']), ([1], ['b']) ])
+    ['a', 'b', 'c']
     """
-    return a+b
+    lines = [ None ] * n
+    for linenos,values in partitions:
+        for lineno,value in zip(linenos, values):
+            lines[lineno] = value
+    return lines
+
+
+
+def concept_classifications(data, inds_list, labels):
+    """
+    concept_classifications()
+
+    Purpose: Build classification tuples for predicted concept labels
+
+    @param data.      A list of list of chunks
+    @param inds_list. A list of list of chunk indices (1:1 with data)
+    @param labels.    Predicted concept label ids (one per index in inds_list)
+    @return           A list of (concept, line number, start token, end token)
+
+    >>> concept_classifications( [['a', 'b c', 'd']], [[1, 2]], [2, 3] )
+    [('problem', 1, 1, 2), ('test', 1, 3, 3)]
+    """
+    labels = iter(labels)
+
+    classifications = []
+    for lineno,inds in enumerate(inds_list):
+
+        # Skip empty line
+        if not inds: continue
+
+        # Token offset where each chunk starts (ex. 7th word of line)
+        starts = [ 0 ]
+        for chunk in data[lineno]:
+            starts.append( starts[-1] + len(chunk.split()) )
+
+        # For each concept
+        for ind in inds:
+
+            # Get next concept
+            concept = reverse_concept_labels[next(labels)]
+
+            # Start position and length of chunk
+            start  = starts[ind]
+            length = starts[ind+1] - start
+
+            # Classification token
+            classifications.append( (concept,lineno+1,start,start+length-1) )
+
+    return classifications
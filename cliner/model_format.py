@@ -0,0 +1,243 @@
+######################################################################
+#  CliNER - model_format.py                                          #
+#                                                                    #
+#  Purpose: Save/load a trained Model as a directory of compact,     #
+#               memory-mappable components                           #
+######################################################################
+
+
+import os
+import json
+import shutil
+
+import numpy as np
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.svm import LinearSVC
+
+from machine_learning import crf
+from machine_learning.sci import TrivialClassifier
+from machine_learning.vectorizers import HashingVectorizer, InternedVectorizer
+from machine_learning.vectorizers import ArrayVectorizer
+from features_dir.read_config import default_features
+
+
+# Bump whenever the layout of a saved model changes
+FORMAT_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+
+# Each component is a (vectorizer, classifier) pair of Model attributes
+components = [ ('first_prose'   , 'first_prose_vec'   , 'first_prose_clf'   ),
+               ('first_nonprose', 'first_nonprose_vec', 'first_nonprose_clf'),
+               ('second'        , 'second_vec'        , 'second_clf'        ) ]
+
+
+
+def is_model_dir(path):
+    return os.path.isfile( os.path.join(path, MANIFEST) )
+
+
+
+def save(model, path):
+
+    """
+    save()
+
+    Purpose: Write a trained Model to disk
+
+    @param model. A trained Model
+    @param path.  Directory to create (a previous model there is replaced)
+    @return       None
+
+    The model is written to a temporary directory next to path, and only
+    swapped in once complete. The swap itself is two renames, so it is not
+    atomic: a crash in between leaves the previous model at
+    path.old.<pid> (and nothing at path).
+
+    Layout (every file named after its component, e.g. 'second'):
+        manifest.json          format version, feature set and how to read each component
+        <name>.hashes.npy      sorted hashes of the key strings  \
+        <name>.columns.npy     their column numbers               |  vocabulary
+        <name>.offsets.npy     where each key string starts       |
+        <name>.keys.npy        the key strings, concatenated     /
+        <name>.crfsuite        crfsuite model file
+        <name>.coef.npy        LinearSVC weights              \
+        <name>.intercept.npy                                   | LinearSVC
+        <name>.classes.npy                                    /
+    """
+
+    # Refuse to clobber anything that isn't a model
+    if os.path.isdir(path) and not is_model_dir(path):
+        raise Exception('Not a model directory: %s' % path)
+
+    # Build the new model next to the old one, then swap it in
+    tmp_dir = '%s.%d' % (path.rstrip(os.sep), os.getpid())
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    manifest = { 'format_version' : FORMAT_VERSION,
+                 'crf_enabled'    : model.crf_enabled,
+                 'hash_dim'       : model.hash_dim,
+                 'features'       : model.features,
+                 'components'     : {}                }
+
+    for name,vec_attr,clf_attr in components:
+        prefix = os.path.join(tmp_dir, name)
+        manifest['components'][name] = {
+            'vectorizer' : save_vectorizer(getattr(model,vec_attr), prefix),
+            'classifier' : save_classifier(getattr(model,clf_attr), prefix)
+        }
+
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    # Move the old model aside (not deleted until the new one is in place)
+    old_path = None
+    if os.path.lexists(path):
+        old_path = '%s.old.%d' % (path.rstrip(os.sep), os.getpid())
+        os.rename(path, old_path)
+
+    try:
+        os.rename(tmp_dir, path)
+    except OSError:
+        if old_path is not None:
+            os.rename(old_path, path)
+        raise
+
+    if old_path is not None:
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path)
+        else:
+            os.remove(old_path)
+
+
+
+def load(model, path):
+
+    """
+    load()
+
+    Purpose: Fill a Model from a directory written by save()
+
+    @param model. A (fresh) Model object
+    @param path.  A model directory
+    @return       The same Model
+
+    Arrays are memory-mapped read-only, so loading is cheap and forked or
+    concurrent processes share the pages.
+    """
+
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    version = manifest.get('format_version')
+    if version != FORMAT_VERSION:
+        raise Exception('Unsupported model format version %s in %s (expected %d)'
+                        % (version, path, FORMAT_VERSION))
+
+    model.crf_enabled = manifest['crf_enabled']
+    model.hash_dim    = manifest['hash_dim']
+
+    # Models saved before the feature set was stored with the model
+    features = manifest.get('features', default_features)
+    model.features = dict( [ (str(g),[ str(f) for f in names ]) for g,names in features.items() ] )
+
+    for name,vec_attr,clf_attr in components:
+        prefix = os.path.join(path, name)
+        info   = manifest['components'][name]
+        setattr(model, vec_attr, load_vectorizer(info['vectorizer'], prefix))
+        setattr(model, clf_attr, load_classifier(info['classifier'], prefix))
+
+    return model
+
+
+
+def save_vectorizer(vec, prefix):
+
+    if isinstance(vec, HashingVectorizer):
+        return { 'type':'hash', 'n_features':vec.n_features }
+
+    if isinstance(vec, DictVectorizer):
+        vec = InternedVectorizer.from_dict_vectorizer(vec)
+
+    if isinstance(vec, InternedVectorizer):
+        vec = ArrayVectorizer.from_feature_names(vec.feature_names)
+
+    if isinstance(vec, ArrayVectorizer):
+        np.save(prefix + '.hashes.npy' , vec.hashes )
+        np.save(prefix + '.columns.npy', vec.columns)
+        np.save(prefix + '.offsets.npy', vec.offsets)
+        np.save(prefix + '.keys.npy'   , vec.keys   )
+        return { 'type':'key_buffer', 'n_features':vec.n_features }
+
+    raise Exception('Cannot save vectorizer of type %s' % type(vec).__name__)
+
+
+
+def load_vectorizer(info, prefix):
+
+    if info['type'] == 'hash':
+        return HashingVectorizer(info['n_features'])
+
+    if info['type'] == 'key_buffer':
+        return ArrayVectorizer(np.load(prefix + '.hashes.npy' , mmap_mode='r'),
+                               np.load(prefix + '.columns.npy', mmap_mode='r'),
+                               np.load(prefix + '.offsets.npy', mmap_mode='r'),
+                               np.load(prefix + '.keys.npy'   , mmap_mode='r'),
+                               info['n_features'])
+
+    # Saved with fixed-width key strings (rebuilt in memory)
+    if info['type'] == 'array':
+        keys    = np.load(prefix + '.keys.npy'   )
+        columns = np.load(prefix + '.columns.npy')
+        return ArrayVectorizer.from_key_strings(keys.tolist(), columns, info['n_features'])
+
+    raise Exception('Unknown vectorizer type: %s' % info['type'])
+
+
+
+def save_classifier(clf, prefix):
+
+    # crfsuite model (string in memory, or already a file)
+    if isinstance(clf, crf.ModelFile):
+        shutil.copyfile(clf.path, prefix + '.crfsuite')
+        return { 'type':'crfsuite' }
+    if isinstance(clf, str):
+        with open(prefix + '.crfsuite', 'wb') as f:
+            f.write(clf)
+        return { 'type':'crfsuite' }
+
+    if isinstance(clf, TrivialClassifier):
+        return { 'type':'trivial', 'label':clf.label }
+
+    # Grid search keeps the winning estimator
+    clf = getattr(clf, 'best_estimator_', clf)
+
+    if isinstance(clf, LinearSVC):
+        np.save(prefix + '.coef.npy'     , clf.coef_     )
+        np.save(prefix + '.intercept.npy', clf.intercept_)
+        np.save(prefix + '.classes.npy'  , clf.classes_  )
+        return { 'type':'linearsvc' }
+
+    raise Exception('Cannot save classifier of type %s' % type(clf).__name__)
+
+
+
+def load_classifier(info, prefix):
+
+    if info['type'] == 'crfsuite':
+        return crf.ModelFile(prefix + '.crfsuite')
+
+    if info['type'] == 'trivial':
+        return TrivialClassifier(info['label'])
+
+    if info['type'] == 'linearsvc':
+        clf = LinearSVC()
+        clf.coef_      = np.load(prefix + '.coef.npy'     , mmap_mode='r')
+        clf.intercept_ = np.load(prefix + '.intercept.npy', mmap_mode='r')
+        clf.classes_   = np.load(prefix + '.classes.npy'  )
+        return clf
+
+    raise Exception('Unknown classifier type: %s' % info['type'])
@@ -202,6 +202,9 @@ class Note:
 
         self.iob_labels = iobs
 
+        # Chunks depend on the labels
+        self.text_chunks = []
+
 
 
     def getChunkedText(self):
@@ -210,7 +213,7 @@ class Note:
         """
 
         # Memoized?
-        if self.text_chunks: return self.text_chunks()
+        if self.text_chunks: return self.text_chunks
 
         # Line-by-line chunking
         text = self.getTokenizedSentences()
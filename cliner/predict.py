@@ -14,9 +14,13 @@ __date__   = 'Oct. 5, 2014'
 import os
 import sys
 import glob
+import time
 import argparse
+import traceback
 import helper
 
+from multiprocessing import Pool
+
 from model import Model
 from notes.note import Note
 
@@ -55,6 +59,27 @@ def main():
         default = None
     )
 
+    parser.add_argument("-j",
+        dest = "jobs",
+        help = "Number of worker processes for feature extraction",
+        type = int,
+        default = 1
+    )
+
+    parser.add_argument("-p",
+        dest = "processes",
+        help = "Batch mode: number of processes to predict files with",
+        type = int,
+        default = 1
+    )
+
+    parser.add_argument("-b",
+        dest = "batch_size",
+        help = "Number of notes to classify together (one classifier call per pass)",
+        type = int,
+        default = 1
+    )
+
     args = parser.parse_args()
 
 
@@ -65,11 +90,30 @@ def main():
 
 
     # Predict
-    predict(files, args.model, args.output, format=format)
+    failed = predict(files, args.model, args.output, format=format,
+                     n_jobs=args.jobs, processes=args.processes,
+                     batch_size=args.batch_size)
+
+    if failed:
+        exit(1)
 
 
 
-def predict(files, model_path, output_dir, format):
+def predict(files, model_path, output_dir, format, n_jobs=1, processes=1,
+            batch_size=1):
+
+    """
+    predict()
+
+    @param files.      A list of text files to predict
+    @param model_path. Path to a trained model
+    @param output_dir. Directory to write predictions to
+    @param format.     Data format of the files
+    @param n_jobs.     Number of worker processes for feature extraction
+    @param processes.  If >1, predict files in a batch across this many processes
+    @param batch_size. Number of notes to classify together
+    @return            A list of files that could not be predicted (batch mode)
+    """
 
     # Must specify output format
     if format not in Note.supportedFormats():
@@ -90,38 +134,182 @@ def predict(files, model_path, output_dir, format):
         exit()
 
 
+    # Groups of notes that are classified together
+    files = sorted(files)
+    groups = [ files[i:i+batch_size] for i in range(0,len(files),batch_size) ]
+
+
+    # Batch mode: shard files across processes
+    if processes > 1:
+        return predict_batch(model, groups, output_dir, format, processes)
+
+
     # For each file, predict concept labels
     n = len(files)
-    for i,txt in enumerate(sorted(files)):
+    done = 0
+    for group in groups:
 
-        # Read the data into a Note object
+        print '-' * 30
+        print '\n\t%d-%d of %d' % (done+1,done+len(group),n)
+        for txt in group:
+            print '\t', txt
+        print
+
+        # Predict and output the concept predictions
+        out_paths = predict_files(model, group, output_dir, format, n_jobs)
+        print
+        for out_path in out_paths:
+            print 'writing to: ', out_path
+        print
+
+        done += len(group)
+
+    return []
+
+
+
+def predict_files(model, txts, output_dir, format, n_jobs=1):
+
+    """
+    predict_files()
+
+    Purpose: Predict concept labels for a group of files and write them out
+
+    @param txts. A list of text files (classified together)
+    @return      A list of output file paths (1:1 with txts)
+    """
+
+    # Read the data into Note objects
+    notes = []
+    for txt in txts:
         note = Note(format)
         note.read(txt)
+        notes.append(note)
 
 
-        print '-' * 30
-        print '\n\t%d of %d' % (i+1,n)
-        print '\t', txt, '\n'
+    # Predict concept labels
+    labels_list = model.predict_many(notes, n_jobs)
 
 
-        # Predict concept labels
-        labels = model.predict(note)
+    out_paths = []
+    for txt,note,labels in zip(txts, notes, labels_list):
 
         # Get predictions in proper format
         extension = note.getExtension()
         output = note.write(labels)
 
-        #print output
-
         # Output file
         fname = os.path.splitext(os.path.basename(txt))[0] + '.' + extension
         out_path = os.path.join(output_dir, fname)
 
         # Output the concept predictions
-        print '\n\nwriting to: ', out_path
         with open(out_path, 'w') as f:
             print >>f, output
-        print
+
+        out_paths.append(out_path)
+
+    return out_paths
+
+
+
+
+######################################################################
+#  Batch mode                                                        #
+######################################################################
+
+
+# Model used by batch workers
+#   (loaded once by the parent, then shared with every forked worker)
+batch_model = None
+
+
+def predict_batch(model, groups, output_dir, format, processes):
+
+    """
+    predict_batch()
+
+    Purpose: Predict many files across a pool of processes
+
+    @param model.      A loaded Model
+    @param groups.     A list of groups of text files (each classified together)
+    @param output_dir. Directory to write predictions to
+    @param format.     Data format of the files
+    @param processes.  Number of worker processes
+    @return            A list of files that could not be predicted
+
+    Outputs are written by the workers as soon as each group is done.
+    A file that fails is reported and skipped; the rest of the batch
+    keeps going.
+    """
+
+    global batch_model
+    batch_model = model
+
+    tasks = [ (group, output_dir, format) for group in groups ]
+
+    pool = Pool(processes, _init_batch_worker)
+
+    n = sum( len(group) for group in groups )
+    done = 0
+    failed = []
+    start = time.time()
+    try:
+        for results in pool.imap_unordered(_predict_batch_group, tasks):
+            for txt,out_path,error in results:
+
+                done += 1
+                elapsed = time.time() - start
+                rate = done / elapsed if elapsed else 0.0
+
+                if error:
+                    failed.append(txt)
+                    print >>sys.stderr, '\n\tError: could not predict %s\n' % txt
+                    print >>sys.stderr, error
+                else:
+                    print '\t%d of %d  (%.2f notes/sec)  %s' % (done, n, rate, out_path)
+
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+    # Summary
+    elapsed = time.time() - start
+    print '\npredicted %d of %d notes in %.1f sec (%.2f notes/sec)' % \
+          (n - len(failed), n, elapsed, n / elapsed if elapsed else 0.0)
+    if failed:
+        print >>sys.stderr, '\t%d failed:' % len(failed)
+        for txt in failed:
+            print >>sys.stderr, '\t\t', txt
+
+    return failed
+
+
+
+def _init_batch_worker():
+    # Keep per-note progress messages from interleaving across workers
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _predict_batch_group(task):
+    group, output_dir, format = task
+
+    # Workers are daemonic, so they extract features serially
+    try:
+        out_paths = predict_files(batch_model, group, output_dir, format)
+        return [ (txt, out_path, None) for txt,out_path in zip(group,out_paths) ]
+    except Exception:
+        if len(group) == 1:
+            return [ (group[0], None, traceback.format_exc()) ]
+
+    # Retry one file at a time to isolate the failing file(s)
+    results = []
+    for txt in group:
+        results += _predict_batch_group( ([txt], output_dir, format) )
+    return results
 
 
 
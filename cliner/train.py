@@ -16,11 +16,13 @@ import os.path
 import glob
 import argparse
 import sys
-import cPickle as pickle
 
 import helper
 from sets import Set
 from model import Model
+from features_dir.feature_store import FeatureStore
+from features_dir import feature_profile
+from features_dir.feature_profile import FeatureProfile
 from notes.note import Note
 
 
@@ -63,6 +65,32 @@ def main():
         action = "store_true"
     )
 
+    parser.add_argument("-hash",
+        dest = "hash_dim",
+        help = "Use feature hashing with this many dimensions (instead of a vocabulary)",
+        type = int,
+        default = None
+    )
+
+    parser.add_argument("-j",
+        dest = "jobs",
+        help = "Number of worker processes for feature extraction",
+        type = int,
+        default = 1
+    )
+
+    parser.add_argument("-features",
+        dest = "feature_store",
+        help = "Directory to keep extracted features in, for reuse by later runs",
+        default = None
+    )
+
+    parser.add_argument("-profile",
+        dest = "profile",
+        help = "Report the time taken and values produced by each feature",
+        action = "store_true"
+    )
+
     # Parse the command line arguments
     args = parser.parse_args()
     is_crf = not args.nocrf
@@ -101,11 +129,14 @@ def main():
 
 
     # Train the model
-    train(training_list, args.model, format, is_crf=is_crf, grid=args.grid)
+    train(training_list, args.model, format, is_crf=is_crf, grid=args.grid,
+          n_jobs=args.jobs, hash_dim=args.hash_dim,
+          feature_store=args.feature_store, profile=args.profile)
 
 
 
-def train(training_list, model_path, format, is_crf=True, grid=False):
+def train(training_list, model_path, format, is_crf=True, grid=False, n_jobs=1,
+          hash_dim=None, feature_store=None, profile=False):
 
     # Read the data into a Note object
     notes = []
@@ -122,17 +153,33 @@ def train(training_list, model_path, format, is_crf=True, grid=False):
 
 
     # Create a Machine Learning model
-    model = Model(is_crf=is_crf)
+    model = Model(is_crf=is_crf, hash_dim=hash_dim)
+
+
+    # Reuse features from earlier runs
+    if feature_store:
+        feature_store = FeatureStore(feature_store, model.features)
+
+
+    # Measure each feature's cost
+    if profile:
+        feature_profile.profile = FeatureProfile()
 
 
     # Train the model using the Note's data
-    model.train(notes, grid)
+    model.train(notes, grid, n_jobs, feature_store)
+
+
+    # Report each feature's cost
+    if profile:
+        print '\nfeature costs (extraction only)'
+        print feature_profile.profile.report()
+        print
 
 
-    # Pickle dump
-    print 'pickle dump'
-    with open(model_path, "wb") as m_file:
-        pickle.dump(model, m_file)
+    # Save model
+    print 'saving model'
+    model.save(model_path)
 
 
 
@@ -0,0 +1,88 @@
+######################################################################
+#  CliNER - test_create_umls_db.py                                   #
+#                                                                    #
+#  Purpose: Check that the UMLS database loads every well-formed     #
+#               row, and resumes an interrupted build                #
+######################################################################
+
+
+import os
+import sys
+import sqlite3
+
+root = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..' )
+os.environ.setdefault('CLINER_DIR', root)
+
+home = os.path.join(root, 'cliner', 'features_dir', 'umls_dir')
+if home not in sys.path: sys.path.append(home)
+
+import create_sqliteDB
+
+
+
+def write_tables(tmpdir):
+    lines = {}
+    lines['MRSTY'] = [ 'C%03d|T%03d|Sign or Symptom|' % (i,i) for i in range(25) ]
+    lines['MRCON'] = [ 'C%03d|%s|P|L01|PF|S01|string %d|0|' % (i, 'ENG' if i%3 else 'SPA', i)
+                       for i in range(25) ]
+    lines['MRREL'] = [ 'C%03d|RO|C%03d|||||' % (i,i+1) for i in range(25) ]
+
+    # A malformed line
+    lines['MRCON'][7] = 'C007|ENG|P|L01'
+
+    for name in lines:
+        with open(str(tmpdir.join(name)), 'w') as f:
+            f.write( '\n'.join(lines[name]) + '\n' )
+    return lines
+
+
+
+def rows(tmpdir, table, filename='umls.db'):
+    db = sqlite3.connect(str(tmpdir.join(filename)))
+    db.text_factory = str
+    return db.execute('SELECT * FROM %s ORDER BY rowid' % table).fetchall()
+
+
+
+def test_resumed_build_matches(tmpdir, monkeypatch):
+    lines = write_tables(tmpdir)
+    monkeypatch.setattr(create_sqliteDB, 'BATCH_SIZE', 10)
+
+    # Stop after the first batch of MRCON
+    class Interrupted:
+        def __init__(self, conn):
+            self.cursor = conn.cursor
+            self.conn   = conn
+        def commit(self):
+            self.conn.commit()
+            raise KeyboardInterrupt
+
+    load_table = create_sqliteDB.load_table
+    def interrupted(conn, name, *args):
+        if name == 'MRCON':
+            conn = Interrupted(conn)
+        load_table(conn, name, *args)
+    monkeypatch.setattr(create_sqliteDB, 'load_table', interrupted)
+    try:
+        create_sqliteDB.create_db(tables_dir=str(tmpdir))
+    except KeyboardInterrupt:
+        pass
+    assert not tmpdir.join('umls.db').exists()
+    assert len(rows(tmpdir, 'MRCON', 'umls.db.partial')) == 9
+
+    monkeypatch.setattr(create_sqliteDB, 'load_table', load_table)
+    create_sqliteDB.create_db(tables_dir=str(tmpdir))
+
+    for name in lines:
+        expected = [ tuple(line.split('|')) for line in lines[name] if line != 'C007|ENG|P|L01' ]
+        assert rows(tmpdir, name) == expected
+
+
+
+def test_queried_columns_and_languages(tmpdir):
+    lines = write_tables(tmpdir)
+    create_sqliteDB.create_db(['ENG'], True, str(tmpdir))
+
+    assert rows(tmpdir, 'MRREL') == []
+    assert rows(tmpdir, 'MRCON') == [ ('C%03d' % i, None, None, None, None, None, 'string %d' % i, None, None)
+                                      for i in range(25) if i%3 and i != 7 ]
@@ -0,0 +1,86 @@
+######################################################################
+#  CliNER - test_feature_registry.py                                 #
+#                                                                    #
+#  Purpose: Check that the feature set picks which features are      #
+#               extracted, and that a model keeps its feature set    #
+######################################################################
+
+
+import os
+import sys
+
+root = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..' )
+os.environ.setdefault('CLINER_DIR', root)
+
+home = os.path.join(root, 'cliner')
+if home not in sys.path: sys.path.append(home)
+
+import pytest
+
+from features_dir.read_config import enabled_features
+from features_dir.feature_keys import vocabulary
+from features_dir.word_features import WordFeatures
+from features_dir.sentence_features import SentenceFeatures, POSTagCache
+from model import Model
+
+
+
+def names(features):
+    return set( [ vocabulary.keys[k][0] for k in features ] )
+
+
+
+def test_word_features_follow_feature_set():
+    features = enabled_features()
+    assert 'length' in names( WordFeatures(features).IOB_prose_features('Pain') )
+
+    features['IOB_prose_word'] = ['word', 'mitre']
+    assert names( WordFeatures(features).IOB_prose_features('Pain') ) == \
+           set(['dummy', 'word', 'mitre'])
+
+
+def test_sentence_features_follow_feature_set():
+    sentence = ['Patient', 'denies', 'pain', '.']
+
+    features = enabled_features()
+    features['IOB_prose_sentence'] = ['pos']
+    features_list = SentenceFeatures(None, features).IOB_prose_features(sentence)
+    assert 'pos' in names(features_list[0])
+    assert 'prev_unigrams-0' not in names(features_list[1])
+    assert not [ n for n in names(features_list[1]) if n.startswith('prev_') ]
+
+
+def test_batch_tagged_once(monkeypatch):
+    class Tagger:
+        calls = 0
+        def tag_sents(self, sents):
+            self.calls += 1
+            return [ [ (w,'NN') for w in s ] for s in sents ]
+
+    # More sentences in the batch than the cache holds
+    cache = POSTagCache(Tagger(), maxsize=2)
+    monkeypatch.setattr(SentenceFeatures, 'pos_cache', cache)
+
+    data = [ ['Patient', 'denies', 'pain', str(i), '.'] for i in range(5) ]
+    features = enabled_features()
+    features['IOB_prose_sentence'] = ['pos', 'pos_context']
+    feats = SentenceFeatures(data, features)
+    for sentence in data:
+        assert 'pos' in names( feats.IOB_prose_features(sentence)[0] )
+    assert cache.tagger.calls == 1
+
+
+def test_unknown_feature():
+    features = enabled_features()
+    features['IOB_nonprose_word'].append('no_such_feature')
+    with pytest.raises(Exception):
+        WordFeatures(features)
+
+
+def test_model_keeps_feature_set(tmpdir):
+    features = enabled_features()
+    features['concept_word'] = ['word']
+    model = Model(features=features)
+    model.first_prose_clf = model.first_nonprose_clf = model.second_clf = ''
+    model.save(str(tmpdir.join('m.model')))
+    assert Model.load(str(tmpdir.join('m.model'))).features == features
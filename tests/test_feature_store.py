@@ -0,0 +1,87 @@
+######################################################################
+#  CliNER - test_feature_store.py                                    #
+#                                                                    #
+#  Purpose: Check that stored features match fresh extraction, and   #
+#               that changing the feature set invalidates the store  #
+######################################################################
+
+
+import os
+import sys
+
+root = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..' )
+os.environ.setdefault('CLINER_DIR', root)
+
+home = os.path.join(root, 'cliner')
+if home not in sys.path: sys.path.append(home)
+
+from features_dir.feature_keys import vocabulary
+from features_dir.read_config import enabled_features
+from features_dir.features import IOB_features_for_sentences
+from features_dir.features import concept_features_for_sentences
+from features_dir.feature_store import FeatureStore
+
+
+
+class FakeNote:
+
+    def __init__(self, sentences, chunks, inds):
+        self.sentences = sentences
+        self.chunks    = chunks
+        self.inds      = inds
+
+    def getTokenizedSentences(self):
+        return self.sentences
+
+    def getChunkedText(self):
+        return self.chunks
+
+    def getConceptIndices(self):
+        return self.inds
+
+
+
+notes = [ FakeNote([['Patient', 'denies', 'chest', 'pain', '.'], ['BP', ':', '120/80']],
+                   [['Patient', 'denies', 'chest pain', '.'], ['BP', ':', '120/80']],
+                   [[2], []]),
+          FakeNote([['Started', 'on', 'aspirin', '.']],
+                   [['Started', 'on', 'aspirin', '.']],
+                   [[2]]) ]
+
+
+def keyed(features):
+    return sorted( [ (vocabulary.keys[k],v) for k,v in features.items() ] )
+
+
+
+def test_stored_features_match_extraction(tmpdir):
+    data   = [ s for note in notes for s in note.getTokenizedSentences() ]
+    chunks = [ c for note in notes for c in note.getChunkedText()        ]
+    inds   = [ i for note in notes for i in note.getConceptIndices()     ]
+    IOB     = IOB_features_for_sentences(data)
+    concept = list(concept_features_for_sentences(chunks, inds))
+
+    # Extracted on the first call, read back on the second
+    for expected_hits in [0, 2]:
+        store = FeatureStore(str(tmpdir))
+        stored_IOB,stored_concept = store.features(notes)
+        assert store.hits == expected_hits
+
+        assert len(stored_IOB) == len(IOB)
+        for (p1,f1),(p2,f2) in zip(IOB, stored_IOB):
+            assert p1 == p2
+            assert [ keyed(f) for f in f1 ] == [ keyed(f) for f in f2 ]
+
+        assert [ [ keyed(f) for f in fs ] for fs in concept        ] == \
+               [ [ keyed(f) for f in fs ] for fs in stored_concept ]
+
+
+def test_enabled_features_invalidate(tmpdir):
+    FeatureStore(str(tmpdir)).features(notes)
+    key = FeatureStore(str(tmpdir)).key(notes[0])
+
+    features = enabled_features()
+    features['IOB_prose_word'].remove('length')
+    store = FeatureStore(str(tmpdir), features)
+    assert store.key(notes[0]) != key
+    assert store.get(store.key(notes[0])) is None
@@ -0,0 +1,64 @@
+######################################################################
+#  CliNER - test_model_vocabulary.py                                 #
+#                                                                    #
+#  Purpose: Check that predicting with a loaded model only counts    #
+#               keys the model never saw as new                      #
+######################################################################
+
+
+import os
+import sys
+
+root = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..' )
+os.environ.setdefault('CLINER_DIR', root)
+
+home = os.path.join(root, 'cliner')
+if home not in sys.path: sys.path.append(home)
+
+from features_dir.feature_keys import vocabulary
+from features_dir.utilities import pickle_dump
+from notes.note import Note
+from model import Model
+
+
+
+text     = [ 'Patient denies chest pain .', 'Started on aspirin for fever .', 'BP : 120/80' ]
+concepts = [ 'c="chest pain" 1:2 1:3||t="problem"',
+             'c="aspirin" 2:2 2:2||t="treatment"',
+             'c="fever" 2:4 2:4||t="problem"'     ]
+
+
+def read_note(tmpdir, annotated=True):
+    txt = tmpdir.join('note.txt')
+    con = tmpdir.join('note.con')
+    txt.write( '\n'.join(text) + '\n' )
+    con.write( '\n'.join(concepts) + '\n' )
+
+    note = Note('i2b2')
+    if annotated:
+        note.read(str(txt), str(con))
+    else:
+        note.read(str(txt))
+    return note
+
+
+
+def test_legacy_model_keys_are_not_new(tmpdir, monkeypatch):
+    mark = len(vocabulary)
+
+    model = Model()
+    model.train( [ read_note(tmpdir) ] )
+    pickle_dump(model, str(tmpdir.join('legacy.model')))
+
+    # As in a new process: the model's keys are not interned yet
+    vocabulary.truncate(mark)
+    model = Model.load(str(tmpdir.join('legacy.model')))
+
+    forgotten = []
+    monkeypatch.setattr(Model, 'max_new_keys', 0)
+    monkeypatch.setattr(Model, 'forget_new_keys', lambda self: forgotten.append(1))
+
+    note = read_note(tmpdir, annotated=False)
+    for _ in range(2):
+        model.predict_many( [ note ] )
+    assert forgotten == []
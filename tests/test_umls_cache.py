@@ -0,0 +1,66 @@
+######################################################################
+#  CliNER - test_umls_cache.py                                       #
+#                                                                    #
+#  Purpose: Check that the UMLS cache is shared by processes, keeps  #
+#               the old pickled cache, and stays within its size     #
+######################################################################
+
+
+import os
+import sys
+import multiprocessing
+import cPickle as pickle
+
+root = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..' )
+os.environ.setdefault('CLINER_DIR', root)
+
+home = os.path.join(root, 'cliner', 'features_dir', 'umls_dir')
+if home not in sys.path: sys.path.append(home)
+
+from umls_cache import UmlsCache
+
+
+
+def fill(args):
+    filename,i = args
+    cache = UmlsCache(filename, flush_every=10)
+    for j in range(100):
+        cache.add_map('%d-%d' % (i,j), [ ('T%03d' % j,) ])
+    cache.flush()
+
+
+
+def test_processes_share_cache(tmpdir):
+    filename = str(tmpdir.join('umls_cache.db'))
+
+    pool = multiprocessing.Pool(4)
+    pool.map(fill, [ (filename,i) for i in range(8) ])
+    pool.close()
+
+    cache = UmlsCache(filename)
+    for i in range(8):
+        for j in range(100):
+            assert cache.get_map('%d-%d' % (i,j)) == [ ('T%03d' % j,) ]
+
+
+
+def test_legacy_cache_is_imported(tmpdir):
+    with open(str(tmpdir.join('umls_cache')), 'wb') as f:
+        pickle.dump({ 'chest pain':None, 'aspirin--cuis':['C0004057'] }, f)
+
+    cache = UmlsCache(str(tmpdir.join('umls_cache.db')))
+    assert cache.has_key('chest pain') and cache.get_map('chest pain') is None
+    assert cache.get_map('aspirin--cuis') == ['C0004057']
+    assert not cache.has_key('fever')
+
+
+
+def test_oldest_entries_evicted(tmpdir):
+    filename = str(tmpdir.join('umls_cache.db'))
+
+    cache = UmlsCache(filename, maxsize=50, flush_every=1)
+    for j in range(200):
+        cache.add_map(str(j), j)
+
+    cache = UmlsCache(filename)
+    assert [ j for j in range(200) if cache.has_key(str(j)) ] == range(150, 200)
@@ -0,0 +1,169 @@
+######################################################################
+#  CliNER - test_umls_lookups.py                                     #
+#                                                                    #
+#  Purpose: Check that batched UMLS lookups, only looking up spans   #
+#               found in the concept trie, and the concept index     #
+#               give the same features as one query per string       #
+######################################################################
+
+
+import os
+import sys
+import sqlite3
+import marisa_trie
+
+root = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..' )
+os.environ.setdefault('CLINER_DIR', root)
+
+home = os.path.join(root, 'cliner', 'features_dir', 'umls_dir')
+if home not in sys.path: sys.path.append(home)
+
+import interface_umls
+import interpret_umls
+from interface_umls import resources
+from umls_cache import UmlsCache
+from create_index import build_index
+from umls_features import UMLSFeatures
+
+
+
+concepts = [ ('C01', 'chest pain'     , 'Sign or Symptom'                 ),
+             ('C02', 'pain'           , 'Sign or Symptom'                 ),
+             ('C03', 'aspirin'        , 'Pharmacologic Substance'         ),
+             ('C04', 'aspirin'        , 'Organic Chemical'                ),
+             ('C05', 'coronary artery', 'Body Part, Organ, or Organ Component'),
+             ('C06', 'artery disease' , 'Disease or Syndrome'             ) ]
+
+sentences = [ [ 'He', 'had', 'chest', 'pain', 'and', 'took', 'aspirin', '.' ],
+              [ 'Coronary', 'artery', 'disease', ',', 'no', 'pain' ] ]
+
+
+
+def use_fake_umls(tmpdir):
+    db = sqlite3.connect( str(tmpdir.join('umls.db')) )
+    db.execute( "CREATE TABLE MRCON( CUI, LAT, TS, LUI, STT, SUI, STR, LRL, EMPTY ) ;" )
+    db.execute( "CREATE TABLE MRSTY( CUI, TUI, STY, EMPTY ) ;" )
+    for cui,string,sty in concepts:
+        db.execute( "INSERT INTO MRCON( CUI, STR ) VALUES ( ?, ? );", (cui,string) )
+        db.execute( "INSERT INTO MRSTY( CUI, STY ) VALUES ( ?, ? );", (cui,sty   ) )
+    db.commit()
+
+    resources.loaded['umls_db'   ] = db.cursor()
+    resources.loaded['umls_trie' ] = marisa_trie.Trie( [ unicode(s) for _,s,_ in concepts ] )
+    resources.loaded['umls_index'] = None
+
+
+
+def unload():
+    for name in ('umls_db', 'umls_trie', 'umls_index'):
+        resources.unload(name)
+
+
+
+def features(tmpdir, name):
+    interface_umls.prefetched_stys.clear()
+    interface_umls.prefetched_cuis.clear()
+
+    feat = UMLSFeatures()
+    feat.umls_lookup_cache = UmlsCache( str(tmpdir.join(name)) )
+
+    feat.prefetch(sentences)
+    IOB     = [ feat.IOB_prose_features(s) for s in sentences ]
+    concept = [ feat.concept_features_for_chunks(s, range(len(s))) for s in sentences ]
+    return IOB, concept
+
+
+
+def all_spans(sentence, max_length):
+    # Every n-gram that is a concept, without walking the trie
+    return [ (i,j) for i in range(len(sentence))
+                   for j in range(i, min(i+max_length, len(sentence)))
+                   if interface_umls.concept_exists(unicode(' '.join(sentence[i:j+1]))) ]
+
+
+
+def test_concept_spans(tmpdir):
+    use_fake_umls(tmpdir)
+    try:
+        spans = interpret_umls.concept_spans(sentences[0] + ['artery', 'disease'], 6)
+    finally:
+        unload()
+
+    assert spans == [ (2,3), (3,3), (6,6), (8,9) ]
+
+
+
+def test_batched_lookups_match(tmpdir, monkeypatch):
+    use_fake_umls(tmpdir)
+    try:
+        batched = features(tmpdir, 'batched.db')
+
+        # Without prefetching, each string is looked up on its own
+        monkeypatch.setattr(interpret_umls, 'prefetch', lambda *args: None)
+        monkeypatch.setattr(interpret_umls, 'concept_spans', all_spans)
+        unbatched = features(tmpdir, 'unbatched.db')
+    finally:
+        unload()
+
+    assert batched == unbatched
+    assert batched[0][0][6] == { ('umls_cui','C03'):1, ('umls_cui','C04'):1,
+                                 ('umls_semantic_type_word','Pharmacologic Substance'):1,
+                                 ('umls_semantic_type_word','Organic Chemical'):1 }
+
+
+
+def test_prefetch_kept_for_lookups(tmpdir, monkeypatch):
+    use_fake_umls(tmpdir)
+    monkeypatch.setattr(interface_umls, 'PREFETCH_SIZE', 4)
+    interface_umls.prefetched_stys.clear()
+    try:
+        # A batch, then lookups of its strings and of a few new ones
+        interface_umls.string_lookups( ['pain', 'aspirin', 'fever'] )
+        interface_umls.string_lookups( ['pain'] )
+        interface_umls.string_lookups( ['pain', 'cough'] )
+        assert set(interface_umls.prefetched_stys) == set(['pain', 'aspirin', 'fever', 'cough'])
+
+        # Room is made by dropping one of the oldest (the first batch's)
+        interface_umls.string_lookups( ['rash'] )
+        assert len(interface_umls.prefetched_stys) == 4
+        assert 'cough' in interface_umls.prefetched_stys and 'rash' in interface_umls.prefetched_stys
+
+        # No more of a batch is kept than fits
+        interface_umls.string_lookups( [ 'word%d' % i for i in range(10) ] )
+        assert len(interface_umls.prefetched_stys) == 4
+    finally:
+        interface_umls.prefetched_stys.clear()
+        unload()
+
+
+
+def test_index_matches_database(tmpdir):
+    with open(str(tmpdir.join('MRCON')), 'w') as f:
+        for cui,string,_ in concepts:
+            f.write( '%s|ENG|P|L01|PF|S01|%s|0|\n' % (cui,string) )
+    with open(str(tmpdir.join('MRSTY')), 'w') as f:
+        for cui,_,sty in concepts:
+            f.write( '%s|T01|%s|\n' % (cui,sty) )
+    build_index( str(tmpdir.join('MRCON')), str(tmpdir.join('MRSTY')),
+                 str(tmpdir.join('umls-concept.index')) )
+
+    use_fake_umls(tmpdir)
+    try:
+        queried = features(tmpdir, 'queried.db')
+        strings = [ 'aspirin', 'chest pain', 'fever', u'pain' ]
+        looked_up = [ ( sorted(interface_umls.string_lookup(s)),
+                        sorted(interface_umls.cui_lookup(s)) ) for s in strings ]
+
+        index = marisa_trie.BytesTrie()
+        index.mmap( str(tmpdir.join('umls-concept.index')) )
+        resources.loaded['umls_index'] = index
+
+        # The database is not needed any more
+        resources.loaded['umls_db'] = None
+        indexed = features(tmpdir, 'indexed.db')
+        assert looked_up == [ ( sorted(interface_umls.string_lookup(s)),
+                                sorted(interface_umls.cui_lookup(s)) ) for s in strings ]
+    finally:
+        unload()
+
+    assert queried == indexed
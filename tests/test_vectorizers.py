@@ -0,0 +1,91 @@
+######################################################################
+#  CliNER - test_vectorizers.py                                      #
+#                                                                    #
+#  Purpose: Check that the interned and array vectorizers build the  #
+#               same matrices as DictVectorizer, down to the order   #
+#               of the column indices within each row                #
+######################################################################
+
+
+import os
+import sys
+import random
+
+root = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..' )
+os.environ.setdefault('CLINER_DIR', root)
+
+home = os.path.join(root, 'cliner')
+if home not in sys.path: sys.path.append(home)
+
+import numpy as np
+from sklearn.feature_extraction import DictVectorizer
+
+from features_dir.feature_keys import vocabulary
+from machine_learning.vectorizers import InternedVectorizer, ArrayVectorizer
+
+
+
+def feature_dicts(n, seed):
+    rng   = random.Random(seed)
+    names = [ 'word', 'prev_word', 'next_word', 'pos', 'prose' ]
+    X = []
+    for _ in range(n):
+        x = {}
+        for _ in range(rng.randint(0, 12)):
+            x[ (rng.choice(names), 'v%d' % rng.randint(0, 40)) ] = rng.choice([1, 0.5, 2])
+        X.append(x)
+    return X
+
+
+
+def same_matrix(A, B):
+    assert A.shape == B.shape
+    assert A.has_sorted_indices and B.has_sorted_indices
+    assert (A.indptr  == B.indptr ).all()
+    assert (A.indices == B.indices).all()
+    assert (A.data    == B.data   ).all()
+
+
+
+def test_matches_dict_vectorizer():
+    train = feature_dicts(200, 0)
+    test  = feature_dicts(100, 1)
+
+    dvect = DictVectorizer()
+    expected_train = dvect.fit_transform(train)
+    expected_test  = dvect.transform(test)
+
+    iv = InternedVectorizer()
+    same_matrix( iv.fit_transform([ vocabulary.intern_dict(x) for x in train ]), expected_train )
+    same_matrix( iv.transform(    [ vocabulary.intern_dict(x) for x in test  ]), expected_test  )
+    assert iv.feature_names == dvect.feature_names_
+
+    av = ArrayVectorizer.from_feature_names(iv.feature_names)
+    same_matrix( av.transform([ vocabulary.intern_dict(x) for x in test ]), expected_test )
+
+
+
+def test_forgotten_keys_are_looked_up_again():
+    train = feature_dicts(200, 2)
+    test  = feature_dicts(100, 3)
+
+    dvect = DictVectorizer()
+    dvect.fit(train)
+    expected = dvect.transform(test)
+
+    # Forget everything interned after the mark, the vectorizers' own keys too
+    mark = len(vocabulary)
+    iv = InternedVectorizer.from_dict_vectorizer(dvect)
+    av = ArrayVectorizer.from_feature_names(iv.feature_names)
+
+    for _ in range(2):
+        X = [ vocabulary.intern_dict(x) for x in test ]
+        same_matrix( iv.transform(X), expected )
+        same_matrix( av.transform(X), expected )
+
+        vocabulary.truncate(mark)
+        iv.forget(mark)
+        av.forget(mark)
+        assert len(vocabulary) == mark
+        assert iv.columns is None or max(iv.columns) < mark
+        assert all( i < mark for i in av.id_columns )
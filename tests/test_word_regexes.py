@@ -0,0 +1,90 @@
+######################################################################
+#  CliNER - test_word_regexes.py                                     #
+#                                                                    #
+#  Purpose: Check the combined word regexes against the original     #
+#               one-pattern-at-a-time re.search() features           #
+######################################################################
+
+
+import os
+import re
+import sys
+import random
+
+home = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..', 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from features_dir.word_features import WordFeatures
+
+
+
+# Original implementations
+def old_mitre(word):
+    return [ f for f in WordFeatures.mitre_features
+               if re.search(WordFeatures.mitre_features[f], word) ]
+
+def old_QANN(word):
+    tests = [
+        ('test_result' , [r"^[A-Za-z]+( )*(-|--|:|was|of|\*|>|<|more than|less than)( )*[0-9]+(%)*",
+                          r"^[A-Za-z]+ was (positive|negative)"]),
+        ('measurement' , [r"^[0-9]*( )?(unit(s)|cc|L|mL|dL)$"]),
+        ('directive'   , [r"^(q\..*|q..|PRM|bid|prm|p\..*)$"]),
+        ('date'        , [r'^(\d\d\d\d-\d\d-\d|\d\d?-\d\d?-\d\d\d\d?|\d\d\d\d-\d\d?-\d\d?)$']),
+        ('volume'      , [r"^[0-9]*( )?(ml|mL|dL)$"]),
+        ('weight'      , [r"^[0-9]*( )?(mg|g|mcg|milligrams|grams)$"]),
+        ('size'        , [r"^[0-9]*( )?(mm|cm|millimeters|centimeters)$"]),
+        ('prog_location', [r""]),
+        ('problem_form', [r".*(ic|is)$"]),
+    ]
+    features = {}
+    for name,regexes in tests:
+        if any( [ re.search(r, word) for r in regexes ] ):
+            features[(name,None)] = 1
+    return features
+
+
+
+def corpus(n=50000, seed=0):
+
+    """ Tokens from the example notes plus random clinical-looking strings """
+
+    tokens = []
+    data = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..', 'examples' )
+    for name in sorted(os.listdir(data)):
+        if name.endswith('.txt'):
+            with open(os.path.join(data,name)) as f:
+                tokens += f.read().split()
+
+    rng = random.Random(seed)
+    pieces = ['0', '1', '9', '12', '555', '2014', 'a', 'A', 'c', 'C', 'q', 'p', 'x', 'Z',
+              '-', '/', '.', ':', '*', '>', '<', ' ', '%', '_', 'mg', 'g', 'mcg', 'mL',
+              'ml', 'dL', 'L', 'cc', 'units', 'mm', 'cm', 'grams', 'ic', 'is', 'was',
+              ' was ', 'positive', 'of', 'bid', 'PRM', 'prm', 'less than', '\n', '\xe9']
+    for _ in range(n):
+        tokens.append( ''.join( [ rng.choice(pieces) for _ in range(rng.randint(0,6)) ] ) )
+
+    return tokens
+
+
+
+def test_mitre_matches_re_search():
+    wf = WordFeatures()
+    for word in corpus():
+        assert wf.mitre_matcher.matches(word) == old_mitre(word), word
+
+
+
+def test_QANN_features_unchanged():
+    wf = WordFeatures()
+    for word in corpus():
+        assert wf.QANN_features(word) == old_QANN(word), word
+        assert wf.QANN_features(word).keys() == old_QANN(word).keys(), word
+
+
+
+def test_is_helpers_unchanged():
+    wf = WordFeatures()
+    for word in corpus(n=5000):
+        assert bool(wf.is_test_result(word)) == bool(old_QANN(word).get(('test_result',None)))
+        assert bool(wf.is_prognosis_location(word)) == \
+               bool(re.search(r"^(c|C)[0-9]+(-(c|C)[0-9]+)*$", word))
@@ -0,0 +1,62 @@
+######################################################################
+#  CliNER - test_wordshape.py                                        #
+#                                                                    #
+#  Purpose: Check the single-pass word shapes against the five       #
+#               original wordShape* functions                        #
+######################################################################
+
+
+import os
+import sys
+import random
+
+home = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..', 'cliner' )
+if home not in sys.path: sys.path.append(home)
+
+from features_dir import wordshape
+
+
+
+def original_shapes(word):
+    return [ wordshape.wordShapeChris1(word),
+             wordshape.wordShapeDan1(word),
+             wordshape.wordShapeJenny1(word),
+             wordshape.wordShapeChris2(word, False, None),
+             wordshape.wordShapeDan2(word, None) ]
+
+
+
+def corpus(n=50000, seed=0):
+
+    """ Tokens from the example notes plus random strings of tricky characters """
+
+    tokens = ['', 'alpha', 'betablocker', 'Alpha', 'rho-1', 'iota', 'A.', 'U.S.A.',
+              '-12', '+3.5', '1,000', '~~x', '_id_', u'caf\xe9', u'\u01c5x', u'\xc9T\xe9']
+    data = os.path.join( os.path.dirname(os.path.abspath(__file__)), '..', 'examples' )
+    for name in sorted(os.listdir(data)):
+        if name.endswith('.txt'):
+            with open(os.path.join(data,name)) as f:
+                tokens += f.read().split()
+
+    rng = random.Random(seed)
+    pieces = ['0', '7', 'a', 'z', 'A', 'Z', '-', '+', '.', ',', '_', '~', '/', ':',
+              'alpha', 'beta', 'rho', 'tau', 'mg', 'IV', '\xe9']
+    for _ in range(n):
+        tokens.append( ''.join( [ rng.choice(pieces) for _ in range(rng.randint(0,8)) ] ) )
+
+    return tokens
+
+
+
+def test_fused_shapes_match_originals():
+    for word in corpus():
+        assert wordshape.getWordShapes(word) == original_shapes(word), repr(word)
+
+
+
+def test_batch_shapes_match_single_words():
+    words = corpus(n=2000) * 2
+    batch = wordshape.getWordShapesBatch(words)
+    assert len(batch) == len(words)
+    for word,shapes in zip(words, batch):
+        assert shapes == original_shapes(word), repr(word)